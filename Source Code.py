@@ -1,36 +1,3496 @@
 
-import pygame
+import time
+STARTUP_STARTED = time.perf_counter()  # Inicio del proceso, para los tiempos de arranque
+
 import tkinter as tk
 from tkinter import filedialog, simpledialog, messagebox, ttk, colorchooser
 from tkinter import font as tkfont
 import json
 import os
-import threading
-import importlib.util
-import shutil
-from PIL import Image, ImageTk
+import threading
+import importlib
+import importlib.util
+import shutil
+import sys
+import math
+import hashlib
+import base64
+import bisect
+import random
+import zlib
+import queue
+import tracemalloc
+import argparse
+import ast
+import marshal
+import multiprocessing
+import py_compile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from types import SimpleNamespace
+
+
+class LazyModule:
+    """Módulo que se importa la primera vez que se accede a uno de sus atributos"""
+
+    import_times = OrderedDict()  # nombre -> ms que tardó la importación
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            started = time.perf_counter()
+            self._module = importlib.import_module(self._name)
+            LazyModule.import_times[self._name] = (time.perf_counter() - started) * 1000
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "cargado" if self._module is not None else "sin cargar"
+        return f"<LazyModule {self._name} ({state})>"
+
+
+# Las dependencias pesadas solo se importan al usarlas: pygame al pulsar Play,
+# PIL y NumPy al abrir un proyecto con imágenes
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+pygame = LazyModule("pygame")
+Image = LazyModule("PIL.Image")
+ImageTk = LazyModule("PIL.ImageTk")
+ImageChops = LazyModule("PIL.ImageChops")
+ImageDraw = LazyModule("PIL.ImageDraw")
+np = LazyModule("numpy")
+subprocess = LazyModule("subprocess")
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif")
+
+
+class AssetStore:
+    """Almacén de assets direccionado por contenido con variantes preprocesadas en caché"""
+
+    CACHE_DIR = ".spar_cache"
+    THUMBNAIL_SIZE = (100, 100)
+    MIN_MIP_SIZE = 8
+    MAX_RENDER_SIZE = 2048  # Por encima (diagonal ya transformada) solo se renderiza la parte visible
+    REGION_STEP = 256  # Las partes visibles se alinean a este paso para reutilizarlas al desplazar la vista
+
+    def __init__(self, project_path):
+        self.project_path = project_path
+        self.assets_dir = os.path.join(project_path, "assets")
+        self.cache_dir = os.path.join(project_path, self.CACHE_DIR, "assets")
+        self.manifest_path = os.path.join(project_path, self.CACHE_DIR, "asset_manifest.json")
+        self.manifest = {"by_hash": {}, "by_path": {}}
+        self.lock = threading.RLock()  # El editor y los hilos de carga comparten el manifiesto
+        self.load_manifest()
+
+    def load_manifest(self):
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, "r") as f:
+                    self.manifest = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Error al leer el manifiesto de assets: {e}")
+
+    def save_manifest(self):
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        with self.lock, open(self.manifest_path, "w") as f:
+            json.dump(self.manifest, f, indent=4)
+
+    @staticmethod
+    def hash_file(path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def import_file(self, src_path):
+        """Importa un archivo al proyecto y devuelve su ruta relativa (reutiliza copias idénticas)"""
+        digest = self.hash_file(src_path)
+
+        # Si ya existe un asset con el mismo contenido no se copia de nuevo
+        existing = self.manifest["by_hash"].get(digest)
+        entry = self.get_entry(existing) if existing else None
+        if entry and entry["hash"] == digest:
+            self.ensure_variants(existing)
+            return existing
+
+        os.makedirs(self.assets_dir, exist_ok=True)
+        file_name = os.path.basename(src_path)
+        rel_path = os.path.join("assets", file_name)
+        dest_path = os.path.join(self.project_path, rel_path)
+
+        # Un archivo distinto con el mismo nombre no se sobrescribe
+        if os.path.exists(dest_path) and self.hash_file(dest_path) != digest:
+            stem, ext = os.path.splitext(file_name)
+            rel_path = os.path.join("assets", f"{stem}_{digest[:8]}{ext}")
+            dest_path = os.path.join(self.project_path, rel_path)
+
+        if not os.path.exists(dest_path):
+            shutil.copy2(src_path, dest_path)
+
+        with self.lock:
+            self.register(rel_path, digest)
+            self.build_variants(rel_path)
+            self.save_manifest()
+        return rel_path
+
+    def register(self, rel_path, digest=None):
+        full_path = os.path.join(self.project_path, rel_path)
+        if digest is None:
+            digest = self.hash_file(full_path)
+        self.manifest["by_hash"][digest] = rel_path
+        self.manifest["by_path"][rel_path] = {
+            "hash": digest,
+            "size": os.path.getsize(full_path),
+            "mtime": os.path.getmtime(full_path)
+        }
+        return self.manifest["by_path"][rel_path]
+
+    def get_entry(self, rel_path):
+        """Devuelve la entrada del manifiesto si sigue siendo válida para el archivo en disco"""
+        entry = self.manifest["by_path"].get(rel_path)
+        full_path = os.path.join(self.project_path, rel_path)
+        if not entry or not os.path.exists(full_path):
+            return None
+        if entry.get("mtime") != os.path.getmtime(full_path) or entry.get("size") != os.path.getsize(full_path):
+            return None
+        return entry
+
+    def ensure_variants(self, rel_path):
+        """Registra y preprocesa un asset que se añadió al proyecto sin pasar por import_file"""
+        with self.lock:
+            entry = self.get_entry(rel_path)
+            if entry is None or "mips" not in entry:
+                if not os.path.exists(os.path.join(self.project_path, rel_path)):
+                    return None
+                entry = self.register(rel_path)
+                self.build_variants(rel_path)
+                self.save_manifest()
+            return entry
+
+    def variant_dir(self, digest):
+        return os.path.join(self.cache_dir, digest)
+
+    def build_variants(self, rel_path):
+        """Genera alfa premultiplicado, miniatura y niveles mip del asset"""
+        entry = self.manifest["by_path"][rel_path]
+        out_dir = self.variant_dir(entry["hash"])
+        os.makedirs(out_dir, exist_ok=True)
+
+        try:
+            img = Image.open(os.path.join(self.project_path, rel_path)).convert("RGBA")
+        except Exception as e:
+            print(f"Error al preprocesar {rel_path}: {e}")
+            return
+
+        entry["width"], entry["height"] = img.size
+
+        # Píxeles RGBA con alfa premultiplicado listos para el runtime
+        r, g, b, a = img.split()
+        premultiplied = Image.merge("RGBA", (
+            ImageChops.multiply(r, a),
+            ImageChops.multiply(g, a),
+            ImageChops.multiply(b, a),
+            a
+        ))
+        with open(os.path.join(out_dir, "premultiplied.rgba"), "wb") as f:
+            f.write(premultiplied.tobytes())
+
+        # Miniatura para el editor
+        thumb = img.copy()
+        thumb.thumbnail(self.THUMBNAIL_SIZE)
+        thumb.save(os.path.join(out_dir, "thumb.png"))
+
+        # Cadena de mips (el nivel 0 es el original)
+        level = 0
+        mip = img
+        while min(mip.size) // 2 >= self.MIN_MIP_SIZE:
+            level += 1
+            mip = mip.resize((mip.width // 2, mip.height // 2), Image.Resampling.LANCZOS)
+            mip.save(os.path.join(out_dir, f"mip_{level}.png"))
+        entry["mips"] = level
+
+    def variant_path(self, rel_path, kind, level=0):
+        """Ruta de una variante ("thumb", "mip" o "premultiplied"), o None si no está en caché"""
+        entry = self.get_entry(rel_path)
+        if entry is None or "mips" not in entry:
+            return None
+        if kind == "mip":
+            level = max(0, min(level, entry["mips"]))
+            if level == 0:
+                return os.path.join(self.project_path, rel_path)
+            name = f"mip_{level}.png"
+        elif kind == "thumb":
+            name = "thumb.png"
+        else:
+            name = "premultiplied.rgba"
+        path = os.path.join(self.variant_dir(entry["hash"]), name)
+        return path if os.path.exists(path) else None
+
+    @staticmethod
+    def mip_level_for_scale(scale):
+        """Nivel mip más pequeño que aún cubre la escala pedida"""
+        if scale <= 0 or scale >= 1:
+            return 0
+        return int(math.floor(math.log2(1 / scale)))
+
+    def clip_region(self, rel_path, scale_x, scale_y, crop, center_x, center_y, view_width, view_height):
+        """Parte visible del sprite transformado que hay que renderizar, o None si cabe entero
+
+        El rectángulo (izquierda, arriba, derecha, abajo) es relativo al centro del sprite, que está en
+        (center_x, center_y) de una vista de view_width x view_height. Puede quedar vacío.
+        """
+        if crop is not None:
+            width, height = crop[2] - crop[0], crop[3] - crop[1]
+        else:
+            entry = self.manifest["by_path"].get(rel_path)
+            if not entry or "width" not in entry:
+                return None
+            width, height = entry["width"], entry["height"]
+        radius = math.hypot(width * scale_x, height * scale_y) / 2
+        if 2 * radius <= self.MAX_RENDER_SIZE:
+            return None
+        step = self.REGION_STEP
+        left = math.floor(max(-radius, -center_x) / step) * step
+        top = math.floor(max(-radius, -center_y) / step) * step
+        right = math.ceil(min(radius, view_width - center_x) / step) * step
+        bottom = math.ceil(min(radius, view_height - center_y) / step) * step
+        return left, top, max(left, right), max(top, bottom)
+
+    def render_sprite(self, rel_path, scale_x=1, scale_y=1, rotation=0, opacity=1.0, crop=None, region=None):
+        """Imagen PIL del asset ya transformada, partiendo del nivel mip más cercano al tamaño final
+
+        crop es un rectángulo (izquierda, arriba, derecha, abajo) del original, p. ej. un fotograma de una hoja.
+        region (de clip_region) limita el resultado a ese rectángulo sin crear nunca la imagen completa.
+        """
+        full_path = os.path.join(self.project_path, rel_path)
+        entry = self.get_entry(rel_path)
+        if crop is not None:
+            mip_path = None
+            img = Image.open(full_path).crop(crop)
+        else:
+            mip_path = self.variant_path(rel_path, "mip", self.mip_level_for_scale(max(scale_x, scale_y)))
+            img = Image.open(mip_path or full_path)
+
+        # Aplicar escala (respecto al tamaño original, no al del mip)
+        if entry and mip_path and "width" in entry:
+            base_width, base_height = entry["width"], entry["height"]
+        else:
+            base_width, base_height = img.width, img.height
+        new_width = max(1, int(base_width * scale_x))
+        new_height = max(1, int(base_height * scale_y))
+        if region is not None:
+            return self.render_region(img, new_width / img.width, new_height / img.height, rotation, opacity, region)
+        if img.size != (new_width, new_height):
+            img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+
+        # Aplicar rotación
+        if rotation != 0:
+            img = img.rotate(-rotation, expand=True)
+
+        # Aplicar opacidad
+        if opacity < 1.0:
+            img = self.apply_opacity(img, opacity)
+        return img
+
+    @classmethod
+    def render_region(cls, img, scale_x, scale_y, rotation, opacity, region):
+        """Escala, rotación y recorte en una sola transformación afín (de cada píxel del resultado al origen)"""
+        left, top, right, bottom = region
+        angle = math.radians(rotation)
+        cos, sin = math.cos(angle), math.sin(angle)
+        # Cada píxel del resultado, relativo al centro del sprite, se gira de vuelta y se deshace la escala
+        data = (cos / scale_x, sin / scale_x, (cos * left + sin * top) / scale_x + img.width / 2,
+                -sin / scale_y, cos / scale_y, (-sin * left + cos * top) / scale_y + img.height / 2)
+        img = img.convert("RGBA").transform((max(1, right - left), max(1, bottom - top)), Image.Transform.AFFINE,
+                                            data, Image.Resampling.BICUBIC)
+        if opacity < 1.0:
+            img = cls.apply_opacity(img, opacity)
+        return img
+
+    @staticmethod
+    def apply_opacity(img, opacity):
+        """Aplica opacidad a una imagen PIL"""
+        if img.mode != 'RGBA':
+            img = img.convert('RGBA')
+        
+        alpha = img.split()[3]
+        alpha = alpha.point(lambda p: int(p * opacity))
+        
+        img.putalpha(alpha)
+        return img
+
+    def load_premultiplied(self, rel_path):
+        """Devuelve (bytes, tamaño) con los píxeles premultiplicados del asset"""
+        entry = self.ensure_variants(rel_path)
+        path = self.variant_path(rel_path, "premultiplied")
+        if entry is None or path is None:
+            return None
+        with open(path, "rb") as f:
+            return f.read(), (entry["width"], entry["height"])
+
+
+class ThumbnailCache:
+    """Caché persistente de miniaturas, generadas en un hilo de fondo"""
+
+    MAX_PHOTOS = 512
+    MAX_RESULTS_PER_POLL = 16
+
+    def __init__(self, project_path, size=AssetStore.THUMBNAIL_SIZE):
+        self.cache_dir = os.path.join(project_path, AssetStore.CACHE_DIR, "thumbs")
+        self.size = size
+        self.photos = OrderedDict()  # clave -> PhotoImage (LRU, solo en el hilo de Tk)
+        self.callbacks = {}  # clave -> callbacks pendientes
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.hits = 0
+        self.misses = 0
+
+        self.worker = threading.Thread(target=self._worker_loop, daemon=True)
+        self.worker.start()
+
+    def cache_key(self, path):
+        """Clave basada en la ruta, fecha de modificación y tamaño del archivo"""
+        stat = os.stat(path)
+        raw = f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}|{self.size[0]}x{self.size[1]}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def request(self, path, callback):
+        """Pide la miniatura de path; callback(photo) se llama en el hilo de Tk cuando esté lista"""
+        try:
+            key = self.cache_key(path)
+        except OSError:
+            callback(None)
+            return
+
+        photo = self.photos.get(key)
+        if photo is not None:
+            self.hits += 1
+            self.photos.move_to_end(key)
+            callback(photo)
+            return
+
+        self.misses += 1
+        if key not in self.callbacks:
+            self.callbacks[key] = []
+            self.requests.put((key, path))
+        self.callbacks[key].append(callback)
+
+    def _worker_loop(self):
+        while True:
+            job = self.requests.get()
+            if job is None:
+                break
+            key, path = job
+            thumb_path = os.path.join(self.cache_dir, f"{key}.png")
+            try:
+                if not os.path.exists(thumb_path):
+                    img = Image.open(path)
+                    img.draft("RGB", self.size)  # Decodificación reducida para JPEG
+                    img.thumbnail(self.size)
+                    os.makedirs(self.cache_dir, exist_ok=True)
+                    tmp_path = f"{thumb_path}.tmp"
+                    img.save(tmp_path, format="PNG")
+                    os.replace(tmp_path, thumb_path)
+                img = Image.open(thumb_path)
+                img.load()
+                self.results.put((key, img))
+            except Exception as e:
+                print(f"Error al generar miniatura de {path}: {e}")
+                self.results.put((key, None))
+
+    def process_results(self):
+        """Convierte las miniaturas listas en PhotoImage (debe llamarse desde el hilo de Tk)"""
+        for _ in range(self.MAX_RESULTS_PER_POLL):
+            try:
+                key, img = self.results.get_nowait()
+            except queue.Empty:
+                break
+
+            photo = ImageTk.PhotoImage(img) if img is not None else None
+            if photo is not None:
+                self.photos[key] = photo
+                while len(self.photos) > self.MAX_PHOTOS:
+                    self.photos.popitem(last=False)
+
+            for callback in self.callbacks.pop(key, []):
+                callback(photo)
+
+    def close(self):
+        self.requests.put(None)
+
+
+def copy_json(value):
+    """Copia profunda de datos JSON (dict/list/escalares), más rápida que copy.deepcopy"""
+    if isinstance(value, dict):
+        return {key: copy_json(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [copy_json(item) for item in value]
+    return value
+
+
+class SceneCache:
+    """Caché LRU de escenas ya parseadas, validada por fecha de modificación y con precarga en segundo plano"""
+
+    MAX_BYTES = 64 * 1024 * 1024
+    BYTES_PER_FILE_BYTE = 8  # Estimación del tamaño en memoria de un JSON ya parseado
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # ruta -> (mtime_ns, bytes estimados, datos)
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.requests = queue.Queue()
+        self.hits = 0
+        self.misses = 0
+
+        self.worker = threading.Thread(target=self._worker_loop, daemon=True)
+        self.worker.start()
+
+    def get(self, path):
+        """Copia de la escena guardada en path, o None si el archivo no existe"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry[0] == stat.st_mtime_ns:
+                self.hits += 1
+                self.entries.move_to_end(path)
+                return copy_json(entry[2])
+
+        self.misses += 1
+        data = self._parse(path, stat)
+        return copy_json(data)
+
+    def store(self, path, data):
+        """Actualiza la caché con lo que se acaba de escribir en path, sin volver a leerlo"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        self._put(path, stat, copy_json(data))
+
+    def prefetch(self, paths):
+        """Parsea en segundo plano las escenas que todavía no están en caché"""
+        for path in paths:
+            self.requests.put(path)
+
+    def close(self):
+        self.requests.put(None)
+
+    def _parse(self, path, stat):
+        with open(path, "r") as f:
+            data = json.load(f)
+        self._put(path, stat, data)
+        return data
+
+    def _put(self, path, stat, data):
+        size = stat.st_size * self.BYTES_PER_FILE_BYTE
+        with self.lock:
+            old = self.entries.pop(path, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+            if size > self.max_bytes:
+                return
+            self.entries[path] = (stat.st_mtime_ns, size, data)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+    def _worker_loop(self):
+        while True:
+            path = self.requests.get()
+            if path is None:
+                break
+            try:
+                stat = os.stat(path)
+                with self.lock:
+                    entry = self.entries.get(path)
+                    if entry is not None and entry[0] == stat.st_mtime_ns:
+                        continue
+                self._parse(path, stat)
+            except (OSError, ValueError) as e:
+                print(f"Error al precargar la escena {path}: {e}")
+
+
+class ProjectIndex:
+    """Índice compacto del proyecto (escenas, número de objetos, assets y scripts)
+
+    Se guarda en .spar_cache/project_index.json y se actualiza escena a escena al
+    guardar, así que abrir un proyecto solo necesita leer este archivo. Cada escena
+    guarda además qué objetos usan cada asset o script (índice de dependencias inverso).
+    """
+
+    VERSION = 3
+
+    def __init__(self, project_path):
+        self.project_path = project_path
+        self.path = os.path.join(project_path, AssetStore.CACHE_DIR, "project_index.json")
+        self.config_path = os.path.join(project_path, "project_config.json")
+        self.data = {"version": self.VERSION, "config_mtime": None, "global_script": None,
+                     "prefabs": {}, "layers": {}, "scenes": {}, "assets": {}, "scripts": []}
+
+    def scene_path(self, scene_name):
+        return os.path.join(self.project_path, "scenes", f"{scene_name}.json")
+
+    def load(self):
+        """Lee el índice; devuelve False si no existe o no corresponde al project_config.json actual"""
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get("version") != self.VERSION or data.get("config_mtime") != self._config_mtime():
+            return False
+        self.data = data
+        return True
+
+    def rebuild(self, config, asset_manifest):
+        """Reconstruye el índice a partir de project_config.json y los archivos de escena"""
+        self.data["global_script"] = config.get("global_script")
+        self.data["prefabs"] = copy_json(config.get("prefabs", {}))
+        self.data["layers"] = config.get("layers", {})
+        self.data["scenes"] = {}
+        prefabs = PrefabLibrary(config.get("prefabs", {}))
+        for name, embedded in config.get("scenes", {}).items():
+            path = self.scene_path(name)
+            if os.path.exists(path):
+                with open(path, "r") as f:
+                    stored = json.load(f)
+            else:
+                # Proyectos antiguos: la escena solo estaba embebida en project_config.json
+                stored = embedded if isinstance(embedded, list) else []
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "w") as f:
+                    json.dump(stored, f, indent=4)
+            self.update_scene(name, prefabs.resolve(stored))
+        self.update_assets(asset_manifest)
+
+    def scene_names(self):
+        return list(self.data["scenes"].keys())
+
+    @staticmethod
+    def object_dependencies(obj):
+        """Rutas de assets y scripts que usa un objeto"""
+        return [os.path.normpath(path) for path in (object_image_path(obj), obj.get("script")) if path]
+
+    def update_scene(self, scene_name, objects):
+        """Actualiza la entrada de una escena; objects son los objetos resueltos (con los campos de sus prefabs)"""
+        refs = {}
+        for obj in objects:
+            for path in self.object_dependencies(obj):
+                refs.setdefault(path, []).append(obj["name"])
+        self.data["scenes"][scene_name] = {
+            "file": os.path.relpath(self.scene_path(scene_name), self.project_path),
+            "objects": len(objects),
+            "scripts": sorted({os.path.normpath(obj["script"]) for obj in objects if obj.get("script")}),
+            "prefabs": sorted({obj["prefab"] for obj in objects if obj.get("prefab")}),
+            "refs": refs
+        }
+        self._update_scripts()
+
+    def find_usages(self, rel_path):
+        """Lista de (escena, objeto) que usan rel_path"""
+        rel_path = os.path.normpath(rel_path)
+        return [(scene_name, obj_name)
+                for scene_name, entry in self.data["scenes"].items()
+                for obj_name in entry["refs"].get(rel_path, [])]
+
+    def scene_dependencies(self, scene_name):
+        """Assets y scripts que necesita una escena, sin tener que leerla"""
+        entry = self.data["scenes"].get(scene_name)
+        return sorted(entry["refs"]) if entry else []
+
+    def used_paths(self):
+        used = set()
+        for entry in self.data["scenes"].values():
+            used.update(entry["refs"])
+        if self.data["global_script"]:
+            used.add(os.path.normpath(self.data["global_script"]))
+        return used
+
+    def unused_assets(self):
+        """Archivos de assets/ que no usa ningún objeto de ninguna escena"""
+        used = self.used_paths()
+        unused = []
+        assets_dir = os.path.join(self.project_path, "assets")
+        for folder, _, files in os.walk(assets_dir):
+            for name in files:
+                rel_path = os.path.relpath(os.path.join(folder, name), self.project_path)
+                if rel_path not in used:
+                    unused.append(rel_path)
+        return sorted(unused)
+
+    def update_assets(self, asset_manifest):
+        self.data["assets"] = {path: {"hash": entry["hash"], "size": entry["size"]}
+                               for path, entry in asset_manifest.get("by_path", {}).items()}
+
+    def update_config(self, global_script, prefabs, layers):
+        # Las escenas con instancias de un prefab que cambió heredan otros assets y scripts
+        old_prefabs = self.data["prefabs"]
+        changed = {name for name in set(old_prefabs) | set(prefabs) if old_prefabs.get(name) != prefabs.get(name)}
+        self.data["global_script"] = global_script
+        self.data["prefabs"] = copy_json(prefabs)
+        self.data["layers"] = layers
+        if changed:
+            library = PrefabLibrary(prefabs)
+            for scene_name, entry in list(self.data["scenes"].items()):
+                if changed.isdisjoint(entry.get("prefabs", ())):
+                    continue
+                try:
+                    with open(self.scene_path(scene_name), "r") as f:
+                        stored = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                self.update_scene(scene_name, library.resolve(stored))
+        self._update_scripts()
+
+    def save(self):
+        """Escribe el índice; debe llamarse justo después de escribir project_config.json"""
+        self.data["config_mtime"] = self._config_mtime()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.data, f, separators=(",", ":"))
+        os.replace(temp_path, self.path)
+
+    def _update_scripts(self):
+        scripts = set()
+        for entry in self.data["scenes"].values():
+            scripts.update(entry["scripts"])
+        if self.data["global_script"]:
+            scripts.add(os.path.normpath(self.data["global_script"]))
+        self.data["scripts"] = sorted(scripts)
+
+    def _config_mtime(self):
+        try:
+            return os.stat(self.config_path).st_mtime_ns
+        except OSError:
+            return None
+
+
+class SpriteTransformCache:
+    """Superficies ya escaladas, rotadas y con opacidad para no transformarlas cada frame
+
+    La clave usa el tamaño final en píxeles, la rotación redondeada a ROTATION_STEP grados y el alfa
+    entero, así que valores casi iguales comparten entrada. Si la superficie ya falló en el frame
+    anterior (rotación o escala animadas) la transformación solo se guarda cuando la misma clave se
+    repite en dos frames seguidos; si no, llenaría la caché de entradas que no vuelven a acertar.
+    """
+
+    MAX_BYTES = 64 * 1024 * 1024
+    ROTATION_STEP = 0.5
+
+    def __init__(self):
+        self.entries = OrderedDict()  # clave -> (superficie, medio ancho, medio alto)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.missed = set()  # (owner, transformación) que fallaron en este frame
+        self.previous_missed = set()  # ... y en el anterior
+        self.missed_owners = set()  # id de lo que falló en este frame (la superficie o su owner)
+        self.previous_owners = set()
+
+    def next_frame(self):
+        self.previous_missed, self.missed = self.missed, set()
+        self.previous_owners, self.missed_owners = self.missed_owners, set()
+
+    def get(self, surface, scale_x, scale_y, rotation, opacity, store=True, owner=None):
+        """(superficie, medio ancho, medio alto); con store=False el resultado no se guarda
+
+        owner agrupa varias superficies al contar los fallos de frames seguidos (por ejemplo, todos los
+        fotogramas de un RotationBake): la misma escala sobre fotogramas distintos cuenta como repetida.
+        """
+        width, height = surface.get_size()
+        if scale_x != 1 or scale_y != 1:
+            width, height = max(1, int(width * scale_x)), max(1, int(height * scale_y))
+        rotation = round(rotation / self.ROTATION_STEP) * self.ROTATION_STEP % 360
+        alpha = 255 if opacity >= 1.0 else int(255 * opacity)
+        if (width, height) == surface.get_size() and rotation == 0 and alpha == 255:
+            return surface, width / 2, height / 2
+        
+        key = (id(surface), width, height, rotation, alpha)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry
+        
+        self.misses += 1
+        owner_id = id(surface if owner is None else owner)
+        variant = (owner_id,) + key[1:]
+        transient = owner_id in self.previous_owners and variant not in self.previous_missed
+        self.missed.add(variant)
+        self.missed_owners.add(owner_id)
+        
+        # Aplicar escala
+        if (width, height) != surface.get_size():
+            surface = pygame.transform.scale(surface, (width, height))
+        
+        # Aplicar rotación
+        if rotation != 0:
+            surface = pygame.transform.rotate(surface, -rotation)
+        
+        # Aplicar opacidad (los píxeles están premultiplicados, se escalan todos los canales)
+        if alpha < 255:
+            surface = surface.copy()
+            surface.fill((alpha, alpha, alpha, alpha), None, pygame.BLEND_RGBA_MULT)
+        
+        entry = (surface, surface.get_width() / 2, surface.get_height() / 2)
+        size = surface.get_width() * surface.get_height() * 4
+        if transient or not store or size > self.MAX_BYTES:
+            return entry
+        self.entries[key] = entry
+        self.bytes += size
+        while self.bytes > self.MAX_BYTES:
+            old, _, _ = self.entries.popitem(last=False)[1]
+            self.bytes -= old.get_width() * old.get_height() * 4
+        return entry
+
+
+def object_image_path(obj):
+    """Ruta del asset de imagen que usa el objeto (sprite, hoja de sprites o tileset), o None"""
+    obj_type = obj.get("type")
+    if obj_type == "Sprite2D":
+        return obj.get("sprite")
+    if obj_type == "AnimatedSprite2D":
+        return obj.get("sheet")
+    if obj_type == "Tilemap":
+        return obj.get("tileset")
+    return None
+
+
+class AnimatedSprite:
+    """Datos de los objetos AnimatedSprite2D: rectángulos [x, y, ancho, alto] de cada fotograma en la hoja
+    ("frames") y clips con nombre ({"frames": [índices], "fps": n, "loop": bool}); "clip" es el que suena"""
+
+    DEFAULT_FPS = 8
+
+    @staticmethod
+    def grid(sheet_width, sheet_height, frame_width, frame_height):
+        """Rectángulos de una cuadrícula de fotogramas, fila a fila"""
+        frame_width, frame_height = max(1, frame_width), max(1, frame_height)
+        return [[x, y, frame_width, frame_height]
+                for y in range(0, sheet_height - frame_height + 1, frame_height)
+                for x in range(0, sheet_width - frame_width + 1, frame_width)]
+
+    @staticmethod
+    def parse_frames(text):
+        """ "0-3, 6" -> [0, 1, 2, 3, 6]; ValueError si el texto no es válido"""
+        frames = []
+        for part in text.replace(" ", "").split(","):
+            if not part:
+                continue
+            first, _, last = part.partition("-")
+            first = int(first)
+            last = int(last) if last else first
+            step = 1 if last >= first else -1
+            frames.extend(range(first, last + step, step))
+        return frames
+
+    @staticmethod
+    def format_frames(frames):
+        """Inverso de parse_frames, con los tramos consecutivos como rangos"""
+        parts = []
+        start = 0
+        for i in range(1, len(frames) + 1):
+            if i < len(frames) and frames[i] == frames[i - 1] + 1:
+                continue
+            run = frames[start:i]
+            parts.append(str(run[0]) if len(run) == 1 else f"{run[0]}-{run[-1]}")
+            start = i
+        return ", ".join(parts)
+
+    @classmethod
+    def preview_rect(cls, obj, index=0):
+        """Rectángulo del fotograma index del clip actual (o de la hoja), o None si no hay fotogramas"""
+        rects = obj.get("frames") or []
+        clip = obj.get("clips", {}).get(obj.get("clip"))
+        frames = [i for i in (clip or {}).get("frames", []) if 0 <= i < len(rects)] or list(range(len(rects)))
+        if not frames:
+            return None
+        x, y, width, height = rects[frames[index % len(frames)]]
+        return (x, y, x + width, y + height)
+
+
+class SpriteSheet:
+    """Fotogramas de una hoja como subsuperficies de la superficie compartida; se cortan una sola vez"""
+
+    def __init__(self, surface, rects):
+        bounds = surface.get_rect()
+        self.frames = []
+        for rect in rects:
+            rect = pygame.Rect(rect).clip(bounds)
+            if rect.width and rect.height:
+                self.frames.append(surface.subsurface(rect))
+        self.clip_tables = {}
+
+    def clip_table(self, clips):
+        """{clip: (fotogramas, segundos por fotograma, loop)}; las instancias con los mismos clips comparten tabla"""
+        key = tuple(sorted((name, tuple(clip.get("frames", ())), clip.get("fps", AnimatedSprite.DEFAULT_FPS),
+                            clip.get("loop", True)) for name, clip in clips.items()))
+        table = self.clip_tables.get(key)
+        if table is None:
+            table = {}
+            for name, frames, fps, loop in key:
+                surfaces = tuple(self.frames[i] for i in frames if 0 <= i < len(self.frames))
+                table[name] = (surfaces or tuple(self.frames), 1 / fps if fps > 0 else float("inf"), loop)
+            if not table:
+                table[None] = (tuple(self.frames), 1 / AnimatedSprite.DEFAULT_FPS, True)
+            self.clip_tables[key] = table
+        return table
+
+
+class SpriteAnimator:
+    """Reproducción de un AnimatedSprite2D en el runtime; avanzar no crea superficies ni listas
+
+    El objeto solo aporta la configuración inicial ("clip" y "playing"); el estado de la reproducción vive
+    aquí y no se escribe en el objeto, que en el Play del editor es el mismo que se guarda. Los scripts
+    lo obtienen con scene_manager.animator(nombre).
+    """
+
+    __slots__ = ("table", "clip", "frames", "frame_time", "loop", "index", "elapsed", "surface",
+                 "playing", "finished")
+
+    def __init__(self, table, clip=None, playing=True):
+        self.table = table
+        self.play(clip)
+        self.playing = playing
+
+    def play(self, clip):
+        """Empieza clip desde su primer fotograma"""
+        self.clip = clip
+        self.frames, self.frame_time, self.loop = self.table.get(clip) or next(iter(self.table.values()))
+        self.playing = True
+        self.finished = False
+        self.seek(0)
+
+    def pause(self):
+        self.playing = False
+
+    def resume(self):
+        self.playing = not self.finished
+
+    def seek(self, index):
+        self.index = min(max(0, int(index)), len(self.frames) - 1)
+        self.elapsed = 0.0
+        self.surface = self.frames[self.index]
+
+    def update(self, dt):
+        if not self.playing:
+            return
+        self.elapsed += dt
+        if self.elapsed < self.frame_time:
+            return
+        steps = int(self.elapsed / self.frame_time)
+        self.elapsed -= steps * self.frame_time
+        if self.loop:
+            self.index = (self.index + steps) % len(self.frames)
+        elif self.index + steps >= len(self.frames) - 1:
+            # Clip sin loop terminado: se queda en su último fotograma
+            self.index = len(self.frames) - 1
+            self.playing = False
+            self.finished = True
+        else:
+            self.index += steps
+        self.surface = self.frames[self.index]
+
+
+class Tilemap:
+    """Datos de los objetos Tilemap: índices de tile + 1 (0 = vacío) como uint16 codificados en base64"""
+
+    CHUNK_SIZE = 16  # Tiles por lado de cada chunk pre-renderizado
+    DEFAULT_TILE_SIZE = 32
+    DEFAULT_MAP_SIZE = 32
+    MAX_DECODED = 64
+
+    _decoded = OrderedDict()  # (texto, columnas, filas) -> array de solo lectura
+    _lock = threading.Lock()
+
+    @staticmethod
+    def encode(tiles):
+        return base64.b64encode(np.ascontiguousarray(tiles, dtype="<u2").tobytes()).decode("ascii")
+
+    @classmethod
+    def empty(cls, columns, rows):
+        return cls.encode(np.zeros((rows, columns), dtype=np.uint16))
+
+    @classmethod
+    def decode(cls, obj):
+        """Array (filas, columnas) de los tiles de obj; se cachea porque el texto no cambia entre ediciones"""
+        columns = int(obj.get("map_width", cls.DEFAULT_MAP_SIZE))
+        rows = int(obj.get("map_height", cls.DEFAULT_MAP_SIZE))
+        key = (obj.get("tiles", ""), columns, rows)
+        with cls._lock:
+            tiles = cls._decoded.get(key)
+            if tiles is not None:
+                cls._decoded.move_to_end(key)
+                return tiles
+        
+        try:
+            tiles = np.frombuffer(base64.b64decode(key[0]), dtype="<u2").reshape(rows, columns)
+        except ValueError:
+            tiles = np.zeros((rows, columns), dtype=np.uint16)
+        tiles.flags.writeable = False
+        
+        with cls._lock:
+            cls._decoded[key] = tiles
+            while len(cls._decoded) > cls.MAX_DECODED:
+                cls._decoded.popitem(last=False)
+        return tiles
+
+    @classmethod
+    def resized(cls, tiles, columns, rows):
+        """Copia de tiles con otro tamaño, conservando la parte que sigue dentro del mapa"""
+        result = np.zeros((rows, columns), dtype=np.uint16)
+        keep_rows = min(rows, tiles.shape[0])
+        keep_columns = min(columns, tiles.shape[1])
+        result[:keep_rows, :keep_columns] = tiles[:keep_rows, :keep_columns]
+        return result
+
+    @classmethod
+    def tile_size(cls, obj):
+        return (max(1, int(obj.get("tile_width", cls.DEFAULT_TILE_SIZE))),
+                max(1, int(obj.get("tile_height", cls.DEFAULT_TILE_SIZE))))
+
+    @classmethod
+    def visible_chunks(cls, tiles, tile_width, tile_height, left, top, right, bottom):
+        """(columna, fila) de los chunks que tocan el rectángulo dado, relativo al origen del mapa"""
+        chunk_width = cls.CHUNK_SIZE * tile_width
+        chunk_height = cls.CHUNK_SIZE * tile_height
+        chunk_columns = -(-tiles.shape[1] // cls.CHUNK_SIZE)
+        chunk_rows = -(-tiles.shape[0] // cls.CHUNK_SIZE)
+        first_column = int(max(0, left // chunk_width))
+        last_column = int(min(chunk_columns - 1, right // chunk_width))
+        first_row = int(max(0, top // chunk_height))
+        last_row = int(min(chunk_rows - 1, bottom // chunk_height))
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                yield column, row
+
+
+class TileChunkCache:
+    """Chunks de tilemap ya compuestos; la clave es su contenido, así que solo se rehacen los que cambian"""
+
+    MAX_CHUNKS = 512
+
+    def __init__(self, render_chunk):
+        self.render_chunk = render_chunk  # (tileset, bloque de tiles, ancho de tile, alto de tile) -> imagen
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, tileset_key, tileset, tiles, column, row, tile_width, tile_height):
+        """(clave, imagen) del chunk, o (None, None) si está vacío"""
+        size = Tilemap.CHUNK_SIZE
+        block = tiles[row * size:(row + 1) * size, column * size:(column + 1) * size]
+        if not block.any():
+            return None, None
+        
+        key = (tileset_key, tile_width, tile_height, block.shape, block.tobytes())
+        image = self.entries.get(key)
+        if image is None:
+            self.misses += 1
+            image = self.render_chunk(tileset, block, tile_width, tile_height)
+            self.entries[key] = image
+            while len(self.entries) > self.MAX_CHUNKS:
+                self.entries.popitem(last=False)
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return key, image
+
+
+def render_tile_chunk_pil(tileset, block, tile_width, tile_height):
+    """Compone un chunk como imagen PIL RGBA (editor)"""
+    image = Image.new("RGBA", (block.shape[1] * tile_width, block.shape[0] * tile_height), (0, 0, 0, 0))
+    tileset_columns = max(1, tileset.width // tile_width)
+    for row, column in zip(*np.nonzero(block)):
+        index = int(block[row, column]) - 1
+        left = (index % tileset_columns) * tile_width
+        top = (index // tileset_columns) * tile_height
+        tile = tileset.crop((left, top, left + tile_width, top + tile_height))
+        image.paste(tile, (int(column) * tile_width, int(row) * tile_height))
+    return image
+
+
+def render_tile_chunk_pygame(tileset, block, tile_width, tile_height):
+    """Compone un chunk como superficie premultiplicada (runtime) con un solo blits"""
+    surface = pygame.Surface((block.shape[1] * tile_width, block.shape[0] * tile_height), pygame.SRCALPHA)
+    tileset_columns = max(1, tileset.get_width() // tile_width)
+    surface.blits([
+        (tileset, (int(column) * tile_width, int(row) * tile_height),
+         pygame.Rect(((int(block[row, column]) - 1) % tileset_columns) * tile_width,
+                     ((int(block[row, column]) - 1) // tileset_columns) * tile_height,
+                     tile_width, tile_height),
+         pygame.BLEND_PREMULTIPLIED)
+        for row, column in zip(*np.nonzero(block))
+    ], doreturn=False)
+    return surface
+
+
+class RotationBake:
+    """Fotogramas de un sprite pre-renderizados en ángulos cuantizados"""
+
+    def __init__(self, frames, step):
+        self.frames = frames  # (superficie, medio ancho, medio alto) por ángulo
+        self.step = step
+
+    def frame_for(self, rotation):
+        """Fotograma con el ángulo más cercano a rotation"""
+        return self.frames[int(round((rotation % 360) / self.step)) % len(self.frames)]
+
+
+class RotationBaker:
+    """Genera y guarda en disco los fotogramas de rotación de los sprites que lo piden
+
+    Hay un bake por sprite y paso, siempre a escala 1: la escala del objeto (uniforme) se aplica al
+    fotograma al dibujar, así que cambiarla no genera atlas nuevos.
+    """
+
+    DEFAULT_STEP = 2.0
+    MIN_STEP = 1.0  # Como mucho 360 fotogramas
+    MIN_FRAMES = 16  # Con menos, el giro se ve a saltos y no compensa pre-renderizar
+    MAX_BYTES = 64 * 1024 * 1024  # Memoria máxima del atlas de un sprite
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.bakes = {}
+        self.pending = set()
+        self.rejected = set()  # Claves que no caben en MAX_BYTES; se dibujan transformando cada frame
+        self.lock = threading.Lock()
+
+    @classmethod
+    def frame_count(cls, step):
+        return max(1, int(round(360 / max(step, cls.MIN_STEP))))
+
+    @classmethod
+    def bounded_step(cls, width, height, step):
+        """Paso que respeta MIN_STEP y MAX_BYTES para un sprite de width x height, o None si no cabe"""
+        # Cada celda del atlas es un cuadrado con la diagonal del sprite (lo que ocupa al girar)
+        cell = math.ceil(math.hypot(width, height)) + 2
+        max_frames = cls.MAX_BYTES // (cell * cell * 4)
+        if max_frames < cls.MIN_FRAMES:
+            return None
+        step = max(step, cls.MIN_STEP)
+        if cls.frame_count(step) > max_frames:
+            step = 360 / max_frames
+        return step
+
+    def get(self, surface, asset_hash, step, background=True):
+        """Devuelve el bake del sprite o None mientras se genera (lo inicia si hace falta)"""
+        key = (id(surface), step)
+        bake = self.bakes.get(key)
+        if bake is not None or key in self.rejected:
+            return bake
+        
+        with self.lock:
+            if key in self.pending:
+                return None
+            self.pending.add(key)
+        
+        bounded = self.bounded_step(surface.get_width(), surface.get_height(), step)
+        if bounded is None:
+            print(f"Rotaciones no pre-renderizadas: el sprite es demasiado grande ({self.MAX_BYTES // 2 ** 20} MB máx.)")
+            self.rejected.add(key)
+            with self.lock:
+                self.pending.discard(key)
+            return None
+        if bounded != step:
+            print(f"Paso de rotación {step:g}° ajustado a {bounded:g}° para no pasar de {self.MAX_BYTES // 2 ** 20} MB")
+            step = bounded
+        
+        args = (key, surface, asset_hash, step)
+        if background:
+            threading.Thread(target=self._bake, args=args, daemon=True).start()
+            return None
+        self._bake(*args)
+        return self.bakes.get(key)
+
+    def _bake(self, key, surface, asset_hash, step):
+        count = self.frame_count(step)
+        cols = int(math.ceil(math.sqrt(count)))
+        rows = int(math.ceil(count / cols))
+        path = None
+        if asset_hash:
+            path = os.path.join(self.cache_dir, f"{asset_hash[:16]}_{step:g}.png")
+        
+        try:
+            if path and os.path.exists(path):
+                atlas = pygame.image.load(path).convert_alpha()
+            else:
+                rotated = [pygame.transform.rotozoom(surface, -i * 360 / count, 1) for i in range(count)]
+                cell_w = max(frame.get_width() for frame in rotated)
+                cell_h = max(frame.get_height() for frame in rotated)
+                
+                # Cada fotograma va centrado en una celda del mismo tamaño
+                atlas = pygame.Surface((cols * cell_w, rows * cell_h), pygame.SRCALPHA)
+                for i, frame in enumerate(rotated):
+                    x = (i % cols) * cell_w + (cell_w - frame.get_width()) // 2
+                    y = (i // cols) * cell_h + (cell_h - frame.get_height()) // 2
+                    atlas.blit(frame, (x, y), special_flags=pygame.BLEND_PREMULTIPLIED)
+                
+                if path:
+                    os.makedirs(self.cache_dir, exist_ok=True)
+                    tmp_path = f"{path}.tmp.png"
+                    pygame.image.save(atlas, tmp_path)
+                    os.replace(tmp_path, path)
+            
+            cell_w = atlas.get_width() // cols
+            cell_h = atlas.get_height() // rows
+            frames = []
+            for i in range(count):
+                cell = pygame.Rect((i % cols) * cell_w, (i // cols) * cell_h, cell_w, cell_h)
+                frames.append((atlas.subsurface(cell), cell_w / 2, cell_h / 2))
+            self.bakes[key] = RotationBake(frames, 360 / count)
+        except Exception as e:
+            print(f"Error al pre-renderizar rotaciones: {e}")
+        finally:
+            with self.lock:
+                self.pending.discard(key)
+
+
+class RenderQueue:
+    """Lista de dibujo por capas que se envía a la pantalla con una llamada a blits por capa"""
+
+    def __init__(self, special_flags=0):
+        self.layers = {}
+        self.special_flags = special_flags
+
+    def clear(self):
+        for items in self.layers.values():
+            items.clear()
+
+    def add(self, surface, dest, layer=0):
+        items = self.layers.get(layer)
+        if items is None:
+            items = self.layers[layer] = []
+        # blits trunca hacia cero; floor mantiene el mismo redondeo a ambos lados del borde de la pantalla
+        items.append((surface, (math.floor(dest[0]), math.floor(dest[1])), None, self.special_flags))
+
+    def submit(self, screen):
+        # Dentro de cada capa se respeta el orden de inserción para que los solapes se vean igual
+        for layer in sorted(self.layers):
+            items = self.layers[layer]
+            if items:
+                screen.blits(items, doreturn=False)
+
+
+class ParticleSystem:
+    """Partículas de un ParticleEmitter guardadas en arrays de NumPy y actualizadas de forma vectorizada"""
+
+    COLOR_STEPS = 32  # Colores distintos a lo largo de la vida de una partícula
+    STAMP_SIZE = 4  # Hasta este tamaño cada partícula se estampa píxel a píxel
+    MAX_DRAW_SIZE = 256  # Tamaño máximo en pantalla, con zoom incluido
+    DEFAULTS = {
+        "emission_rate": 200.0,
+        "max_particles": 5000,
+        "particle_lifetime": 1.5,
+        "particle_speed": 120.0,
+        "speed_variation": 0.3,
+        "direction": -90.0,
+        "spread": 30.0,
+        "gravity": 0.0,
+        "particle_size": 3,
+        "color_start": "#ffcc00",
+        "color_end": "#ff3300",
+        "fade": True
+    }
+
+    def __init__(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.position = np.empty((0, 2))
+        self.velocity = np.empty((0, 2))
+        self.age = np.empty(0)
+        self.lifetime = np.empty(0)
+        self.spawn_accumulator = 0.0
+
+    def __len__(self):
+        return len(self.age)
+
+    @classmethod
+    def param(cls, obj, name):
+        return obj.get(name, cls.DEFAULTS[name])
+
+    def update(self, obj, origin, dt):
+        """Avanza la simulación dt segundos emitiendo desde origin (posición global del emisor)"""
+        param = lambda name: self.param(obj, name)
+        
+        # Envejecer y quitar las partículas muertas
+        self.age += dt
+        alive = self.age < self.lifetime
+        if not alive.all():
+            self.position = self.position[alive]
+            self.velocity = self.velocity[alive]
+            self.age = self.age[alive]
+            self.lifetime = self.lifetime[alive]
+        
+        # Integrar
+        self.velocity[:, 1] += float(param("gravity")) * dt
+        self.position += self.velocity * dt
+        
+        # Emitir las nuevas
+        self.spawn_accumulator += float(param("emission_rate")) * dt
+        count = int(self.spawn_accumulator)
+        self.spawn_accumulator -= count
+        count = min(count, int(param("max_particles")) - len(self))
+        if count > 0:
+            spread = float(param("spread"))
+            angles = np.radians(float(param("direction")) + self.rng.uniform(-spread / 2, spread / 2, count))
+            variation = float(param("speed_variation"))
+            speeds = float(param("particle_speed")) * (1 + self.rng.uniform(-variation, variation, count))
+            velocity = np.column_stack((np.cos(angles) * speeds, np.sin(angles) * speeds))
+            self.position = np.concatenate((self.position, np.tile(np.asarray(origin, dtype=float), (count, 1))))
+            self.velocity = np.concatenate((self.velocity, velocity))
+            self.age = np.concatenate((self.age, np.zeros(count)))
+            self.lifetime = np.concatenate((self.lifetime, np.full(count, max(0.01, float(param("particle_lifetime"))))))
+
+    def color_steps(self):
+        """Índice de color de cada partícula según la fracción de vida consumida"""
+        steps = (self.age / self.lifetime * (self.COLOR_STEPS - 1)).astype(np.intp)
+        return np.clip(steps, 0, self.COLOR_STEPS - 1)
+
+    @classmethod
+    def palette(cls, obj):
+        """Colores RGBA (sin premultiplicar) de cada paso entre color_start y color_end"""
+        start = np.array([int(cls.param(obj, "color_start")[i:i + 2], 16) for i in (1, 3, 5)], dtype=float)
+        end = np.array([int(cls.param(obj, "color_end")[i:i + 2], 16) for i in (1, 3, 5)], dtype=float)
+        t = np.linspace(0, 1, cls.COLOR_STEPS)[:, None]
+        alpha = 255 * (1 - t) if cls.param(obj, "fade") else np.full_like(t, 255)
+        return np.hstack((start + (end - start) * t, alpha)).round().astype(np.uint8)
+
+    def bounds(self, obj):
+        """(izquierda, arriba, derecha, abajo) en el mundo que cubren las partículas"""
+        margin = int(self.param(obj, "particle_size"))
+        left, top = self.position.min(axis=0) - margin
+        right, bottom = self.position.max(axis=0) + margin
+        return left, top, right, bottom
+
+    @staticmethod
+    def _window_max(values, size, axis):
+        """Máximo de cada celda y las size - 1 anteriores a lo largo de axis, doblando el desplazamiento"""
+        span = 1
+        while span < size:
+            shift = min(span, size - span)
+            grown = values.copy()
+            if axis == 0:
+                np.maximum(grown[shift:], values[:-shift], out=grown[shift:])
+            else:
+                np.maximum(grown[:, shift:], values[:, :-shift], out=grown[:, shift:])
+            values = grown
+            span += shift
+        return values
+
+    def rasterize(self, obj, left, top, width, height, zoom=1.0, premultiplied=False):
+        """Dibuja todas las partículas de una vez en un array RGBA (alto, ancho, 4) con origen en (left, top)"""
+        if not len(self):
+            return np.zeros((height, width, 4), dtype=np.uint8)
+        size = max(1, min(self.MAX_DRAW_SIZE, round(int(self.param(obj, "particle_size")) * zoom)))
+        
+        # Se dibuja en un lienzo con un margen de size píxeles para no recortar cada desplazamiento
+        canvas = np.zeros((height + 2 * size, width + 2 * size), dtype=np.uint32)
+        xs = ((self.position[:, 0] - left) * zoom + size / 2).astype(np.intp)
+        ys = ((self.position[:, 1] - top) * zoom + size / 2).astype(np.intp)
+        inside = (xs >= 0) & (xs < width + size) & (ys >= 0) & (ys < height + size)
+        
+        palette = self.palette(obj)
+        if premultiplied:
+            palette[:, :3] = palette[:, :3].astype(np.uint16) * palette[:, 3:] // 255
+        # Cada color RGBA se escribe como un único uint32
+        colors = palette.view(np.uint32).ravel()[self.color_steps()[inside]]
+        xs = xs[inside]
+        ys = ys[inside]
+        if size <= self.STAMP_SIZE:
+            for dy in range(size):
+                for dx in range(size):
+                    canvas[ys + dy, xs + dx] = colors
+        else:
+            # Partículas grandes: se marca la esquina de cada una con su índice y se extiende a size x size
+            # con un máximo deslizante; la de índice mayor queda encima, como al estampar una a una
+            marks = np.zeros(canvas.shape, dtype=np.int32)
+            marks[ys, xs] = np.arange(1, len(colors) + 1, dtype=np.int32)
+            marks = self._window_max(self._window_max(marks, size, 0), size, 1)
+            canvas = np.concatenate((np.zeros(1, dtype=np.uint32), colors))[marks]
+        
+        pixels = canvas[size:size + height, size:size + width]
+        return np.ascontiguousarray(pixels).view(np.uint8).reshape(height, width, 4)
+
+
+class CollisionWorld:
+    """Colisiones entre objetos con collider: broadphase por hash espacial y narrowphase vectorizada"""
+
+    DEFAULT_SIZE = 50  # Tamaño del placeholder, usado si no hay sprite ni tamaño explícito
+    ALL_LAYERS = 0xFFFF
+
+    def __init__(self, cell_size=None):
+        self.cell_size = cell_size  # None: se ajusta cada fotograma al tamaño típico de los colliders
+        self.contacts = {}  # (id a, id b) -> (obj a, obj b, módulo a, módulo b)
+
+    def step(self, scenes):
+        """Detecta los contactos del fotograma y llama a on_collision_enter/stay/exit de los scripts"""
+        colliders = []
+        for scene in scenes:
+            positions = None
+            for obj in scene.objects:
+                if not obj.get("collider"):
+                    continue
+                if obj.get("parent"):
+                    if positions is None:
+                        positions = runtime_world_positions(scene.objects)
+                    world = positions[obj["name"]]
+                else:
+                    world = (obj["x"], obj["y"])
+                colliders.append((obj, scene.object_modules.get(obj["name"]),
+                                  scene.sprite_for(obj["name"]), world))
+        
+        current = {}
+        if len(colliders) > 1:
+            arrays = self._collider_arrays(colliders)
+            first, second = self._broadphase(arrays)
+            first, second = self._narrowphase(arrays, first, second)
+            for i, j in zip(first.tolist(), second.tolist()):
+                obj_a, module_a = colliders[i][0], colliders[i][1]
+                obj_b, module_b = colliders[j][0], colliders[j][1]
+                key = (id(obj_a), id(obj_b)) if id(obj_a) < id(obj_b) else (id(obj_b), id(obj_a))
+                current[key] = (obj_a, obj_b, module_a, module_b)
+        
+        previous, self.contacts = self.contacts, current
+        for key, contact in current.items():
+            self._notify("on_collision_stay" if key in previous else "on_collision_enter", contact)
+        for key, contact in previous.items():
+            if key not in current:
+                self._notify("on_collision_exit", contact)
+
+    def _notify(self, callback_name, contact):
+        obj_a, obj_b, module_a, module_b = contact
+        for obj, other, module in ((obj_a, obj_b, module_a), (obj_b, obj_a, module_b)):
+            callback = getattr(module, callback_name, None) if module is not None else None
+            if callback is not None:
+                try:
+                    callback(obj, other)
+                except Exception as e:
+                    print(f"Error en {callback_name} de {obj['name']}: {e}")
+
+    def _collider_arrays(self, colliders):
+        rows = []
+        for obj, _, sprite, (world_x, world_y) in colliders:
+            base_w, base_h = sprite.get_size() if sprite is not None else (self.DEFAULT_SIZE, self.DEFAULT_SIZE)
+            scale_x = abs(obj.get("scale_x", 1))
+            scale_y = abs(obj.get("scale_y", 1))
+            x = world_x + obj.get("collider_offset_x", 0)
+            y = world_y + obj.get("collider_offset_y", 0)
+            if obj["collider"] == "circle":
+                # Radio 0 = automático (mitad del lado mayor del sprite: el círculo lo cubre a lo ancho y a lo alto)
+                radius = (obj.get("collider_radius", 0) or max(base_w, base_h) / 2) * max(scale_x, scale_y)
+                half_w = half_h = radius
+                circle = 1
+            else:
+                # Ancho/alto 0 = automático (tamaño del sprite)
+                half_w = (obj.get("collider_width", 0) or base_w) * scale_x / 2
+                half_h = (obj.get("collider_height", 0) or base_h) * scale_y / 2
+                circle = 0
+            rows.append((x, y, half_w, half_h, circle,
+                         1 << int(obj.get("collider_layer", 0)), int(obj.get("collider_mask", self.ALL_LAYERS))))
+        
+        columns = np.array(rows).T
+        return {"x": columns[0], "y": columns[1], "half_w": columns[2], "half_h": columns[3],
+                "circle": columns[4] != 0, "layer": columns[5].astype(np.int64),
+                "mask": columns[6].astype(np.int64)}
+
+    def _broadphase(self, arrays):
+        """Pares candidatos (i < j) que comparten al menos una celda del hash espacial"""
+        x, y, half_w, half_h = arrays["x"], arrays["y"], arrays["half_w"], arrays["half_h"]
+        cell = self.cell_size or max(16.0, float(np.median(np.maximum(half_w, half_h))) * 4)
+        
+        min_cx = np.floor((x - half_w) / cell).astype(np.int64)
+        max_cx = np.floor((x + half_w) / cell).astype(np.int64)
+        min_cy = np.floor((y - half_h) / cell).astype(np.int64)
+        max_cy = np.floor((y + half_h) / cell).astype(np.int64)
+        span_x = max_cx - min_cx + 1
+        cells_per = span_x * (max_cy - min_cy + 1)
+        
+        # Una entrada por (collider, celda que ocupa)
+        owner = np.repeat(np.arange(len(x)), cells_per)
+        local = np.arange(len(owner)) - np.repeat(np.cumsum(cells_per) - cells_per, cells_per)
+        cell_x = min_cx[owner] + local % span_x[owner]
+        cell_y = min_cy[owner] + local // span_x[owner]
+        keys = cell_x * 0x100000000 + (cell_y & 0xFFFFFFFF)
+        
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        owner = owner[order]
+        
+        # Emparejar cada entrada con las siguientes de su misma celda
+        firsts = []
+        seconds = []
+        # (con las claves ordenadas, si no hay pares a distancia d tampoco los hay a d + 1)
+        for offset in range(1, len(keys)):
+            same = keys[offset:] == keys[:-offset]
+            if not same.any():
+                break
+            firsts.append(owner[:-offset][same])
+            seconds.append(owner[offset:][same])
+        if not firsts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        
+        first = np.concatenate(firsts)
+        second = np.concatenate(seconds)
+        low = np.minimum(first, second)
+        high = np.maximum(first, second)
+        
+        # Quitar duplicados de pares que comparten varias celdas
+        codes = np.unique(low * len(x) + high)
+        return codes // len(x), codes % len(x)
+
+    def _narrowphase(self, arrays, first, second):
+        """Filtra los pares candidatos por capas y por intersección real de las formas"""
+        if len(first) == 0:
+            return first, second
+        layer, mask = arrays["layer"], arrays["mask"]
+        
+        # Colisionan si cada uno incluye en su máscara la capa del otro
+        allowed = ((mask[first] & layer[second]) != 0) & ((mask[second] & layer[first]) != 0)
+        first = first[allowed]
+        second = second[allowed]
+        
+        x, y, half_w, half_h = arrays["x"], arrays["y"], arrays["half_w"], arrays["half_h"]
+        circle = arrays["circle"]
+        dx = x[second] - x[first]
+        dy = y[second] - y[first]
+        circle_a = circle[first]
+        circle_b = circle[second]
+        
+        # Caja-caja
+        hit_boxes = (np.abs(dx) <= half_w[first] + half_w[second]) & (np.abs(dy) <= half_h[first] + half_h[second])
+        
+        # Círculo-círculo
+        radius_sum = half_w[first] + half_w[second]
+        hit_circles = dx * dx + dy * dy <= radius_sum * radius_sum
+        
+        # Caja-círculo: punto de la caja más cercano al centro del círculo
+        box = np.where(circle_a, second, first)
+        ball = np.where(circle_a, first, second)
+        near_x = np.clip(x[ball], x[box] - half_w[box], x[box] + half_w[box]) - x[ball]
+        near_y = np.clip(y[ball], y[box] - half_h[box], y[box] + half_h[box]) - y[ball]
+        hit_mixed = near_x * near_x + near_y * near_y <= half_w[ball] * half_w[ball]
+        
+        hit = np.where(circle_a & circle_b, hit_circles,
+                       np.where(circle_a | circle_b, hit_mixed, hit_boxes))
+        return first[hit], second[hit]
+
+
+def runtime_world_positions(objects):
+    """Posiciones globales de los objetos de una escena en tiempo de ejecución"""
+    by_name = {obj["name"]: obj for obj in objects}
+    positions = {}
+    for obj in objects:
+        chain = []
+        current = obj
+        while current is not None and current["name"] not in positions and len(chain) <= len(objects):
+            chain.append(current)
+            current = by_name.get(current.get("parent"))
+        base_x, base_y = positions.get(current["name"], (0, 0)) if current is not None else (0, 0)
+        for link in reversed(chain):
+            base_x += link["x"]
+            base_y += link["y"]
+            positions[link["name"]] = (base_x, base_y)
+    return positions
+
+
+def hierarchy_order(objects):
+    """Objetos en profundidad: cada padre seguido de sus hijos, en el orden de la lista"""
+    children_map = {}
+    roots = []
+    for obj in objects:
+        if obj.get("parent"):
+            children_map.setdefault(obj["parent"], []).append(obj)
+        else:
+            roots.append(obj)
+    ordered = []
+    stack = list(reversed(roots))
+    while stack:
+        obj = stack.pop()
+        ordered.append(obj)
+        stack.extend(reversed(children_map.get(obj["name"], [])))
+    return ordered
+
+
+def render_order(objects):
+    """Orden de dibujo: por capa y z; a igualdad, el de la jerarquía"""
+    return sorted(hierarchy_order(objects), key=lambda obj: (obj.get("layer", 0), obj.get("z", 0)))
+
+
+class RenderList:
+    """Orden de dibujo de una escena en el runtime, mantenido entre fotogramas sin reordenar todo
+
+    Un cambio de capa o z mueve solo ese objeto (bisect); los cambios en la jerarquía (objetos
+    nuevos, borrados o con otro padre) recalculan el orden completo.
+    """
+
+    def __init__(self):
+        self.entries = []  # (capa, z, orden en la jerarquía, nombre), ordenada
+        self.keys = {}  # nombre -> su entrada
+        self.objects = {}  # nombre -> objeto
+        self.parents = {}  # nombre -> padre con el que se calculó el orden
+
+    def sync(self, objects):
+        """Aplica los cambios de objects y devuelve las entradas en orden de dibujo"""
+        if len(objects) != len(self.objects):
+            self._rebuild(objects)
+            return self.entries
+        for obj in objects:
+            name = obj["name"]
+            if self.objects.get(name) is not obj or self.parents[name] != obj.get("parent"):
+                self._rebuild(objects)
+                break
+            key = self.keys.get(name)
+            if key is None:
+                continue  # Cuelga de un padre que no existe: no se dibuja
+            layer, z = obj.get("layer", 0), obj.get("z", 0)
+            if key[0] != layer or key[1] != z:
+                del self.entries[bisect.bisect_left(self.entries, key)]
+                key = self.keys[name] = (layer, z, key[2], name)
+                bisect.insort(self.entries, key)
+        return self.entries
+
+    def _rebuild(self, objects):
+        self.objects = {obj["name"]: obj for obj in objects}
+        self.parents = {obj["name"]: obj.get("parent") for obj in objects}
+        self.keys = {obj["name"]: (obj.get("layer", 0), obj.get("z", 0), index, obj["name"])
+                     for index, obj in enumerate(hierarchy_order(objects))}
+        self.entries = sorted(self.keys.values())
+
+
+class StaticLayerBake:
+    """Capa estática de una escena compuesta en baldosas de TILE_SIZE píxeles del mundo
+
+    Solo existen las baldosas con algo dibujado. Si la capa necesitaría más de MAX_BYTES, tiles es None
+    y sus objetos se dibujan uno a uno.
+    """
+
+    TILE_SIZE = 512
+    MAX_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, signature, tiles):
+        self.signature = signature  # Estado de los objetos con el que se compuso
+        self.tiles = tiles  # (columna, fila) -> superficie, o None si la capa es demasiado grande
+        self.scaled = {}  # (columna, fila) -> superficie escalada al zoom de scaled_zoom
+        self.scaled_zoom = None
+
+
+class LayerView:
+    """Vista de la cámara para una capa: rectángulo visible en el mundo y paso a píxeles de pantalla"""
+
+    __slots__ = ("left", "top", "right", "bottom", "zoom", "offset_x", "offset_y")
+
+    def __init__(self, left, top, right, bottom, zoom, offset_x, offset_y):
+        self.left, self.top, self.right, self.bottom = left, top, right, bottom
+        self.zoom = zoom
+        self.offset_x = offset_x  # pantalla = mundo * zoom + offset
+        self.offset_y = offset_y
+
+    def intersects(self, left, top, right, bottom):
+        return right >= self.left and left <= self.right and bottom >= self.top and top <= self.bottom
+
+
+class Camera:
+    """Cámara del runtime; los scripts la reciben como camera
+
+    (x, y) es el punto del mundo en el centro de la pantalla. Con los valores iniciales el mundo se ve
+    como en el editor. Cada capa se desplaza según su parallax: 1 sigue a la cámara, 0 queda fija en
+    pantalla (y tampoco aplica el zoom), valores intermedios dan profundidad.
+    """
+
+    def __init__(self, resolution):
+        self.resolution = resolution
+        self.x = resolution[0] / 2
+        self.y = resolution[1] / 2
+        self.zoom = 1.0
+        self.target = None  # Nombre del objeto a seguir
+        self.offset = (0, 0)  # Desplazamiento respecto al objetivo
+        self.smoothing = 0.0  # Segundos para acercarse al objetivo; 0 lo sigue sin retraso
+        self.limits = None  # (izquierda, arriba, derecha, abajo) del mundo que no debe salirse de la vista
+
+    def move_to(self, x, y):
+        self.x, self.y = x, y
+
+    def follow(self, name, smoothing=0.0, offset=(0, 0)):
+        self.target = name
+        self.smoothing = smoothing
+        self.offset = offset
+
+    def stop_following(self):
+        self.target = None
+
+    def update(self, positions, dt):
+        """Mueve la cámara hacia el objetivo; positions es {escena: {objeto: (x, y)}} del fotograma"""
+        if self.target is not None:
+            for scene_positions in positions.values():
+                target = scene_positions.get(self.target)
+                if target is not None:
+                    target_x, target_y = target[0] + self.offset[0], target[1] + self.offset[1]
+                    factor = 1 - math.exp(-dt / self.smoothing) if self.smoothing > 0 else 1
+                    self.x += (target_x - self.x) * factor
+                    self.y += (target_y - self.y) * factor
+                    break
+        if self.limits is not None:
+            left, top, right, bottom = self.limits
+            half_width = self.resolution[0] / 2 / self.zoom
+            half_height = self.resolution[1] / 2 / self.zoom
+            self.x = (left + right) / 2 if right - left < 2 * half_width else \
+                min(max(self.x, left + half_width), right - half_width)
+            self.y = (top + bottom) / 2 if bottom - top < 2 * half_height else \
+                min(max(self.y, top + half_height), bottom - half_height)
+
+    def layer_view(self, parallax=(1, 1)):
+        width, height = self.resolution
+        parallax_x, parallax_y = parallax
+        zoom = 1 + (self.zoom - 1) * (parallax_x + parallax_y) / 2
+        offset_x = width / 2 - (width / 2 + (self.x - width / 2) * parallax_x) * zoom
+        offset_y = height / 2 - (height / 2 + (self.y - height / 2) * parallax_y) * zoom
+        # Desplazamiento en píxeles enteros: lo ya compuesto (capas estáticas) cae igual que lo dibujado suelto
+        offset_x, offset_y = math.floor(offset_x), math.floor(offset_y)
+        return LayerView(-offset_x / zoom, -offset_y / zoom, (width - offset_x) / zoom,
+                         (height - offset_y) / zoom, zoom, offset_x, offset_y)
+
+    def world_to_screen(self, x, y, parallax=(1, 1)):
+        view = self.layer_view(parallax)
+        return x * view.zoom + view.offset_x, y * view.zoom + view.offset_y
+
+    def screen_to_world(self, x, y, parallax=(1, 1)):
+        """Punto del mundo bajo una posición de pantalla (por ejemplo, la del ratón)"""
+        view = self.layer_view(parallax)
+        return (x - view.offset_x) / view.zoom, (y - view.offset_y) / view.zoom
+
+
+_job_modules = {}  # Scripts ya cargados en cada proceso del pool
+
+
+class ProcessJobGlobal:
+    """Sustituto de scene_manager, input_bus y camera en los scripts con PARALLEL_UPDATE = "process"
+
+    Esos objetos viven en el proceso del juego y no se pueden usar desde el pool: el nombre existe
+    (el script carga igual que en los otros modos) pero cualquier acceso da un error claro.
+    """
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        raise RuntimeError(f"{self._name} no está disponible en un update con PARALLEL_UPDATE = \"process\"; "
+                           f"usa \"thread\" o mueve ese código fuera del update")
+
+    def __bool__(self):
+        return False
+
+
+def run_script_job(script_path, obj, events):
+    """Ejecuta el update de un script en un proceso del pool (el módulo se carga una vez por proceso)"""
+    module = _job_modules.get(script_path)
+    if module is None:
+        module_name = os.path.splitext(os.path.basename(script_path))[0]
+        spec = importlib.util.spec_from_file_location(module_name, script_path)
+        module = importlib.util.module_from_spec(spec)
+        # Mismos nombres globales que inyecta SceneManager.load_script, pero sin acceso al juego
+        for name in ("scene_manager", "input_bus", "camera"):
+            setattr(module, name, ProcessJobGlobal(name))
+        spec.loader.exec_module(module)
+        _job_modules[script_path] = module
+    module.update(obj, events)
+    return obj
+
+
+class JobSystem:
+    """Ejecuta en paralelo los update de los scripts que lo declaran con PARALLEL_UPDATE
+
+    Cada trabajo recibe una copia profunda del objeto; los cambios de transformación se escriben en el
+    objeto real en sync(), que es el punto de sincronización antes de dibujar. Sin PARALLEL_UPDATE el
+    update sigue ejecutándose en orden en el hilo del juego. En modo "process" scene_manager, input_bus
+    y camera no están disponibles (ver ProcessJobGlobal).
+    """
+
+    WRITE_BACK_FIELDS = ("x", "y", "rotation", "scale_x", "scale_y", "opacity")
+    EVENT_VALUE_TYPES = (int, float, str, bool, tuple, type(None))
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.thread_pool = None
+        self.process_pool = None
+        self.pending = []  # (objeto real, future) en el orden en que se enviaron
+
+    @staticmethod
+    def parallel_mode(module):
+        """'thread', 'process' o None según lo que declare el script"""
+        mode = getattr(module, "PARALLEL_UPDATE", False)
+        if mode is True:
+            return "thread"
+        return mode if mode in ("thread", "process") else None
+
+    def submit(self, module, obj, events, mode):
+        # Copia profunda: las listas y dicts anidados no se comparten con el trabajo (ni entre hilos)
+        job_obj = copy_json(obj)
+        if mode == "process":
+            if self.process_pool is None:
+                # spawn y no fork: un fork copiaría los locks que tengan tomados Tk y los hilos de carga
+                self.process_pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                        mp_context=multiprocessing.get_context("spawn"))
+            # Los eventos de pygame no se pueden enviar a otro proceso: se pasan sus atributos simples
+            job_events = [SimpleNamespace(type=event.type, **{key: value for key, value in event.dict.items()
+                                                              if isinstance(value, self.EVENT_VALUE_TYPES)})
+                          for event in events]
+            future = self.process_pool.submit(run_script_job, module.__file__, job_obj, job_events)
+        else:
+            if self.thread_pool is None:
+                self.thread_pool = ThreadPoolExecutor(max_workers=self.max_workers)
+            future = self.thread_pool.submit(self._run_thread_job, module, job_obj, events)
+        self.pending.append((obj, future))
+
+    @staticmethod
+    def _run_thread_job(module, obj, events):
+        module.update(obj, events)
+        return obj
+
+    def sync(self):
+        """Espera a todos los trabajos y aplica sus cambios de transformación en orden de envío"""
+        pending, self.pending = self.pending, []
+        for obj, future in pending:
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Error en update de {obj['name']}: {e}")
+                continue
+            for field in self.WRITE_BACK_FIELDS:
+                if field in result and result[field] != obj.get(field):
+                    obj[field] = result[field]
+
+    def shutdown(self):
+        self.sync()
+        for pool in (self.thread_pool, self.process_pool):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        self.thread_pool = None
+        self.process_pool = None
+
+
+class InputState:
+    """Estado de la entrada en el fotograma actual, calculado una sola vez para todos los scripts"""
+
+    def __init__(self):
+        self.keys = ()
+        self.pressed = set()  # Teclas pulsadas en este fotograma
+        self.released = set()  # Teclas soltadas en este fotograma
+        self.mouse_pos = (0, 0)
+        self.mouse_buttons = (False, False, False)
+
+    def is_held(self, key):
+        return bool(self.keys) and bool(self.keys[key])
+
+    def was_pressed(self, key):
+        return key in self.pressed
+
+    def was_released(self, key):
+        return key in self.released
+
+
+class InputBus:
+    """Reparte los eventos de pygame una vez por fotograma a los handlers suscritos por tipo y tecla"""
+
+    def __init__(self):
+        self.handlers = {}  # (tipo de evento, tecla/botón o None) -> {token: handler}
+        self.subscriptions = {}  # token -> (clave de handlers, dueño)
+        self.next_token = 0
+        self.owner = None  # Las suscripciones nuevas se asocian a este dueño (p. ej. la escena que carga)
+        self.state = InputState()
+
+    def on(self, event_type, handler, key=None):
+        """Suscribe handler(event) a event_type; key filtra por tecla o botón. Devuelve un token para off()"""
+        self.next_token += 1
+        token = self.next_token
+        self.handlers.setdefault((event_type, key), {})[token] = handler
+        self.subscriptions[token] = ((event_type, key), self.owner)
+        return token
+
+    def on_key_down(self, key, handler):
+        return self.on(pygame.KEYDOWN, handler, key)
+
+    def on_key_up(self, key, handler):
+        return self.on(pygame.KEYUP, handler, key)
+
+    def on_mouse_down(self, handler, button=None):
+        return self.on(pygame.MOUSEBUTTONDOWN, handler, button)
+
+    def on_mouse_up(self, handler, button=None):
+        return self.on(pygame.MOUSEBUTTONUP, handler, button)
+
+    def off(self, token):
+        subscription = self.subscriptions.pop(token, None)
+        if subscription is None:
+            return
+        handlers = self.handlers.get(subscription[0])
+        if handlers is not None:
+            handlers.pop(token, None)
+            if not handlers:
+                del self.handlers[subscription[0]]
+
+    def remove_owner(self, owner):
+        """Quita todas las suscripciones hechas mientras owner era el dueño activo"""
+        for token in [token for token, (_, token_owner) in self.subscriptions.items() if token_owner is owner]:
+            self.off(token)
+
+    def dispatch(self, events, polled=None):
+        """Actualiza el estado de la entrada y llama a los handlers de cada evento
+
+        polled es (teclas, posición del ratón, botones) al reproducir una grabación; si no, se consulta a pygame.
+        """
+        state = self.state
+        state.pressed = set()
+        state.released = set()
+        if polled is None:
+            state.keys = pygame.key.get_pressed()
+            state.mouse_pos = pygame.mouse.get_pos()
+            state.mouse_buttons = pygame.mouse.get_pressed()
+        else:
+            state.keys, state.mouse_pos, state.mouse_buttons = polled
+        
+        for event in events:
+            if event.type == pygame.KEYDOWN:
+                state.pressed.add(event.key)
+                detail = event.key
+            elif event.type == pygame.KEYUP:
+                state.released.add(event.key)
+                detail = event.key
+            elif event.type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+                detail = event.button
+            else:
+                detail = None
+            
+            if self.handlers:
+                if detail is not None:
+                    self._notify((event.type, detail), event)
+                self._notify((event.type, None), event)
+
+    def _notify(self, key, event):
+        handlers = self.handlers.get(key)
+        if not handlers:
+            return
+        # Copia: un handler puede suscribirse o darse de baja durante el reparto
+        for handler in list(handlers.values()):
+            try:
+                handler(event)
+            except Exception as e:
+                print(f"Error en handler de entrada: {e}")
+
+
+class InputRecording:
+    """Entrada de una partida fotograma a fotograma, con la semilla y el dt fijo para repetirla igual
+
+    Cada fotograma guarda sus eventos y el estado de teclado y ratón que ve InputBus. El archivo es
+    marshal comprimido con zlib.
+    """
+
+    VERSION = 1
+    DEFAULT_DT = 1 / 60
+    SIMPLE_TYPES = (int, float, str, bool, type(None))
+
+    def __init__(self, scene="", seed=None, dt=DEFAULT_DT, resolution=(1024, 768)):
+        self.scene = scene
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.dt = dt
+        self.resolution = tuple(resolution)
+        self.frames = []  # (eventos, (número de teclas, teclas pulsadas), posición del ratón, botones)
+
+    def __len__(self):
+        return len(self.frames)
+
+    @classmethod
+    def _simple(cls, value):
+        if isinstance(value, tuple):
+            return all(isinstance(item, cls.SIMPLE_TYPES) for item in value)
+        return isinstance(value, cls.SIMPLE_TYPES)
+
+    def capture(self, events, state):
+        """Añade un fotograma con los eventos y el estado que se acaban de repartir"""
+        self.frames.append((
+            [(event.type, {key: value for key, value in event.dict.items() if self._simple(value)})
+             for event in events],
+            (len(state.keys), [key for key, held in enumerate(state.keys) if held]),
+            tuple(state.mouse_pos),
+            tuple(state.mouse_buttons)
+        ))
+
+    def frame(self, index):
+        """(eventos, estado para InputBus.dispatch) del fotograma index"""
+        events, (key_count, held), mouse_pos, mouse_buttons = self.frames[index]
+        keys = [False] * key_count
+        for key in held:
+            keys[key] = True
+        return [pygame.event.Event(event_type, attrs) for event_type, attrs in events], \
+            (keys, mouse_pos, mouse_buttons)
+
+    def save(self, path):
+        data = {"version": self.VERSION, "scene": self.scene, "seed": self.seed, "dt": self.dt,
+                "resolution": self.resolution, "frames": self.frames}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(zlib.compress(marshal.dumps(data)))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = marshal.loads(zlib.decompress(f.read()))
+        if data.get("version") != cls.VERSION:
+            raise ValueError(f"Versión de grabación no soportada: {data.get('version')}")
+        recording = cls(data["scene"], data["seed"], data["dt"], data["resolution"])
+        recording.frames = data["frames"]
+        return recording
+
+
+def scene_state_hash(scene_manager):
+    """Hash del estado de las escenas activas (objetos y partículas) para comparar ejecuciones"""
+    digest = hashlib.sha256()
+    for scene in scene_manager.active.values():
+        # Lo que no es JSON (valores que guardan los scripts) solo aporta su tipo
+        digest.update(json.dumps([scene.name, scene.objects], sort_keys=True,
+                                 default=lambda value: type(value).__name__).encode())
+        for name in sorted(scene.particle_systems):
+            system = scene.particle_systems[name]
+            digest.update(f"{name}:{len(system)}:{system.position.sum():.3f}".encode())
+    return digest.hexdigest()
+
+
+class RuntimeScene:
+    """Escena cargada en el runtime con sus sprites y scripts"""
+
+    def __init__(self, name, objects):
+        self.name = name
+        self.objects = objects
+        self.object_sprites = {}  # nombre del objeto -> superficie
+        self.object_modules = {}  # nombre del objeto -> módulo del script
+        self.sprite_paths = set()  # Assets que usa la escena
+        self.pending_surfaces = {}  # Superficies decodificadas en segundo plano, sin convertir aún
+        self.particle_systems = {}  # nombre del emisor -> ParticleSystem
+        self.animators = {}  # nombre del objeto -> SpriteAnimator
+        self.render_list = RenderList()
+
+    def sprite_for(self, name):
+        """Superficie que se dibuja para el objeto: el fotograma actual si está animado"""
+        animator = self.animators.get(name)
+        return animator.surface if animator is not None else self.object_sprites.get(name)
+
+    def update_animations(self, dt):
+        for animator in self.animators.values():
+            animator.update(dt)
+
+    def update_particles(self, dt, seed=None):
+        """seed hace que cada emisor tenga su propia secuencia aleatoria reproducible"""
+        emitters = [obj for obj in self.objects if obj["type"] == "ParticleEmitter"]
+        if not emitters:
+            return
+        positions = runtime_world_positions(self.objects)
+        for obj in emitters:
+            system = self.particle_systems.get(obj["name"])
+            if system is None:
+                emitter_seed = None if seed is None else [seed, zlib.crc32(obj["name"].encode())]
+                system = self.particle_systems[obj["name"]] = ParticleSystem(emitter_seed)
+            system.update(obj, positions[obj["name"]], dt)
+
+
+class SceneManager:
+    """Carga, descarga y cambio de escenas en el runtime; los scripts lo reciben como scene_manager"""
+
+    def __init__(self, project_path, asset_store, prefabs, scene_cache=None, input_bus=None):
+        self.project_path = project_path
+        self.asset_store = asset_store
+        self.prefabs = prefabs
+        self.scene_cache = scene_cache
+        self.input_bus = input_bus
+        self.active = OrderedDict()  # nombre -> RuntimeScene, en orden de dibujo
+        self.objects = []  # Objetos de todas las escenas activas
+        self.surfaces = {}  # ruta del sprite -> superficie compartida entre escenas
+        self.surface_users = {}  # ruta del sprite -> número de escenas que la usan
+        self.sprite_hashes = {}  # ruta del sprite -> hash del asset
+        self.sheets = {}  # (ruta, rectángulos) -> SpriteSheet compartida por las instancias
+        self.loading = set()
+        self.messages = queue.Queue()  # Avisos de los hilos de carga para el bucle principal
+        self.wait_for_loads = False  # Si es True, update() espera a las cargas (grabación y reproducción)
+        self.camera = None  # Cámara del GamePlayer, disponible para los scripts
+
+    def scene_path(self, name):
+        return os.path.join(self.project_path, "scenes", f"{name}.json")
+
+    def switch(self, name, on_progress=None, on_loaded=None):
+        """Carga name en segundo plano y, cuando esté lista, reemplaza a las escenas activas"""
+        self.load(name, additive=False, on_progress=on_progress, on_loaded=on_loaded)
+
+    def load_additive(self, name, on_progress=None, on_loaded=None):
+        """Carga name en segundo plano y la añade a las escenas activas"""
+        self.load(name, additive=True, on_progress=on_progress, on_loaded=on_loaded)
+
+    def load(self, name, additive=False, on_progress=None, on_loaded=None):
+        """on_progress(fracción) y on_loaded(escena) se llaman desde el bucle del juego"""
+        if name in self.loading:
+            return
+        self.loading.add(name)
+        resident = set(self.surfaces)
+        threading.Thread(target=self._load_worker, args=(name, additive, resident, on_progress, on_loaded),
+                         daemon=True).start()
+
+    def unload(self, name):
+        scene = self.active.pop(name, None)
+        if scene is not None:
+            self._release(scene)
+            self._rebuild_objects()
+
+    def is_loading(self, name=None):
+        return name in self.loading if name else bool(self.loading)
+
+    def add_scene(self, name, objects):
+        """Carga en el momento una escena cuyos objetos ya están en memoria"""
+        scene = self._prepare(name, objects, set(self.surfaces))
+        self._activate(scene, additive=True)
+        return scene
+
+    def update(self):
+        """Activa las escenas ya cargadas y avisa del progreso (se llama una vez por fotograma)"""
+        while True:
+            try:
+                if self.wait_for_loads and self.loading:
+                    # Así la escena se activa siempre en el mismo fotograma
+                    kind, name, payload = self.messages.get()
+                else:
+                    kind, name, payload = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            
+            if kind == "progress":
+                callback, fraction = payload
+                self._call(callback, fraction)
+            elif kind == "loaded":
+                scene, additive, on_loaded = payload
+                self.loading.discard(name)
+                self._activate(scene, additive)
+                if on_loaded:
+                    self._call(on_loaded, scene)
+            else:
+                self.loading.discard(name)
+
+    def _call(self, callback, arg):
+        try:
+            callback(arg)
+        except Exception as e:
+            print(f"Error en callback de carga de escena: {e}")
+
+    def read_scene(self, name):
+        """Objetos guardados de la escena (sin resolver los prefabs)"""
+        path = self.scene_path(name)
+        if self.scene_cache is not None:
+            stored = self.scene_cache.get(path)
+        elif os.path.exists(path):
+            with open(path, "r") as f:
+                stored = json.load(f)
+        else:
+            stored = None
+        if stored is None:
+            raise FileNotFoundError(path)
+        return stored
+
+    def _load_worker(self, name, additive, resident, on_progress, on_loaded):
+        try:
+            stored = self.read_scene(name)
+            
+            report = None
+            if on_progress:
+                report = lambda fraction: self.messages.put(("progress", name, (on_progress, fraction)))
+            scene = self._prepare(name, self.prefabs.resolve(stored), resident, report)
+            self.messages.put(("loaded", name, (scene, additive, on_loaded)))
+        except Exception as e:
+            print(f"Error al cargar la escena {name}: {e}")
+            self.messages.put(("failed", name, None))
+
+    def _prepare(self, name, objects, resident, report=None):
+        """Decodifica los sprites que no están ya cargados y carga los scripts de la escena"""
+        scene = RuntimeScene(name, objects)
+        for obj in objects:
+            if object_image_path(obj):
+                scene.sprite_paths.add(object_image_path(obj))
+        scripted = [obj for obj in objects if obj.get("script")]
+        total = max(1, len(scene.sprite_paths) + len(scripted))
+        done = 0
+        
+        # Los assets compartidos con las escenas activas no se vuelven a cargar
+        for rel_path in scene.sprite_paths:
+            if rel_path not in resident:
+                decoded = self._decode(rel_path)
+                if decoded is not None:
+                    scene.pending_surfaces[rel_path] = decoded
+            done += 1
+            if report:
+                report(done / total)
+        
+        # Las instancias de un prefab comparten el módulo
+        shared_modules = {}
+        for obj in scripted:
+            shared_key = (obj.get("prefab"), obj["script"])
+            if obj.get("prefab") and shared_key in shared_modules:
+                scene.object_modules[obj["name"]] = shared_modules[shared_key]
+            else:
+                module = self.load_script(obj["name"], obj["script"])
+                if module is not None:
+                    scene.object_modules[obj["name"]] = module
+                    if obj.get("prefab"):
+                        shared_modules[shared_key] = module
+            done += 1
+            if report:
+                report(done / total)
+        return scene
+
+    def script_path(self, rel_path):
+        return os.path.join(self.project_path, rel_path)
+
+    def load_script(self, module_name, rel_path):
+        script_path = self.script_path(rel_path)
+        if not os.path.exists(script_path):
+            return None
+        try:
+            spec = importlib.util.spec_from_file_location(module_name, script_path)
+            module = importlib.util.module_from_spec(spec)
+            module.scene_manager = self  # API de escenas disponible para el script
+            module.input_bus = self.input_bus
+            module.camera = self.camera
+            spec.loader.exec_module(module)
+            return module
+        except Exception as e:
+            print(f"Error al cargar script de {module_name}: {e}")
+            return None
+
+    def _decode(self, rel_path):
+        """(superficie sin convertir, premultiplicada) del asset; no necesita la ventana de pygame"""
+        try:
+            # Cargar los píxeles premultiplicados ya preprocesados
+            pixels = self.asset_store.load_premultiplied(rel_path)
+            if pixels:
+                data, size = pixels
+                return pygame.image.frombuffer(data, size, "RGBA"), True
+            sprite_path = os.path.join(self.project_path, rel_path)
+            if not os.path.exists(sprite_path):
+                return None
+            return pygame.image.load(sprite_path), False
+        except Exception as e:
+            print(f"Error al cargar sprite {rel_path}: {e}")
+            return None
+
+    def _activate(self, scene, additive):
+        # Se adquieren los assets de la escena nueva antes de soltar los de las anteriores,
+        # así los compartidos siguen cargados
+        for rel_path in scene.sprite_paths:
+            if rel_path not in self.surfaces:
+                decoded = scene.pending_surfaces.get(rel_path) or self._decode(rel_path)
+                if decoded is None:
+                    continue
+                surface, premultiplied = decoded
+                surface = surface.convert_alpha()
+                self.surfaces[rel_path] = surface if premultiplied else surface.premul_alpha()
+                entry = self.asset_store.get_entry(rel_path)
+                if entry:
+                    self.sprite_hashes[rel_path] = entry["hash"]
+            self.surface_users[rel_path] = self.surface_users.get(rel_path, 0) + 1
+        scene.pending_surfaces = {}
+        
+        for obj in scene.objects:
+            if object_image_path(obj) in self.surfaces:
+                scene.object_sprites[obj["name"]] = self.surfaces[object_image_path(obj)]
+                if obj["type"] == "AnimatedSprite2D":
+                    animator = self.create_animator(obj)
+                    if animator is not None:
+                        scene.animators[obj["name"]] = animator
+        
+        replaced = list(self.active.values()) if not additive else [self.active.get(scene.name)]
+        for old in replaced:
+            if old is not None:
+                self.active.pop(old.name, None)
+                self._release(old)
+        self.active[scene.name] = scene
+        self._rebuild_objects()
+        self._init_objects(scene)
+
+    def create_animator(self, obj):
+        """SpriteAnimator de obj sobre la hoja compartida, o None si la hoja no tiene fotogramas"""
+        rel_path = object_image_path(obj)
+        key = (rel_path, tuple(tuple(rect) for rect in obj.get("frames", ())))
+        sheet = self.sheets.get(key)
+        if sheet is None:
+            sheet = self.sheets[key] = SpriteSheet(self.surfaces[rel_path], key[1])
+        if not sheet.frames:
+            return None
+        return SpriteAnimator(sheet.clip_table(obj.get("clips", {})), obj.get("clip"), obj.get("playing", True))
+
+    def animator(self, name):
+        """SpriteAnimator del objeto name en las escenas activas, o None"""
+        for scene in self.active.values():
+            if name in scene.animators:
+                return scene.animators[name]
+        return None
+
+    def _init_objects(self, scene):
+        """Llama a init(obj) de los scripts; lo que suscriban al bus se quita al descargar la escena"""
+        if self.input_bus is not None:
+            self.input_bus.owner = scene
+        try:
+            for obj in scene.objects:
+                module = scene.object_modules.get(obj["name"])
+                if module is not None and hasattr(module, "init"):
+                    try:
+                        module.init(obj)
+                    except Exception as e:
+                        print(f"Error en init de {obj['name']}: {e}")
+        finally:
+            if self.input_bus is not None:
+                self.input_bus.owner = None
+
+    def _release(self, scene):
+        if self.input_bus is not None:
+            self.input_bus.remove_owner(scene)
+        for rel_path in scene.sprite_paths:
+            if rel_path not in self.surface_users:
+                continue
+            self.surface_users[rel_path] -= 1
+            if self.surface_users[rel_path] <= 0:
+                del self.surface_users[rel_path]
+                self.surfaces.pop(rel_path, None)
+                self.sprite_hashes.pop(rel_path, None)
+                for key in [key for key in self.sheets if key[0] == rel_path]:
+                    del self.sheets[key]
+
+    def _rebuild_objects(self):
+        self.objects = [obj for scene in self.active.values() for obj in scene.objects]
+
+
+class GamePlayer:
+    """Bucle del juego sin dependencias de Tk; lo usan el Play del editor y los juegos exportados"""
+
+    def __init__(self, scene_manager, resolution, cache_dir, bg_color=(0, 0, 0), global_script=None,
+                 caption="SparEngine Game", layers=None):
+        self.scene_manager = scene_manager
+        self.resolution = resolution
+        self.bg_color = bg_color
+        self.global_script = global_script
+        self.cache_dir = cache_dir
+        self.caption = caption
+        # Ajustes por capa ({"<capa>": {"static": bool, "parallax": [x, y]}}); las estáticas se dibujan
+        # con una sola superficie
+        self.static_layers = {int(layer) for layer, settings in (layers or {}).items() if settings.get("static")}
+        self.layer_parallax = {int(layer): tuple(settings["parallax"])
+                               for layer, settings in (layers or {}).items() if "parallax" in settings}
+        self.camera = scene_manager.camera = Camera(resolution)
+        self.culled = 0  # Objetos descartados por estar fuera de la vista en el último fotograma
+        # Mientras el zoom cambia, las versiones con zoom no se cachean: no se volverían a usar
+        self.zooming = False
+        self.drawn_zoom = self.camera.zoom
+        self.static_bakes = {}  # (escena, capa) -> StaticLayerBake
+        self.static_rebakes = 0
+        self.running = False
+        self.memory_sources = None  # (scene_manager, caché de transformaciones, caché de chunks) mientras corre
+        self.frame_times = []  # ms de trabajo de cada fotograma (sin la espera del reloj)
+        self.state_hash = None  # Hash del estado final, al grabar o reproducir
+
+    def stop(self):
+        self.running = False
+
+    def run(self, start_scene, objects=None, recording=None, replay=None):
+        """Ejecuta el juego hasta que se cierra la ventana o se llama a stop()
+
+        Con recording se graba la entrada de cada fotograma; con replay se reproduce una grabación sin
+        esperar al reloj hasta su último fotograma. En ambos casos el dt es fijo, los generadores
+        aleatorios parten de la semilla de la grabación y las escenas se activan siempre en el mismo
+        fotograma.
+        """
+        self.running = True
+        self.frame_times = []
+        self.state_hash = None
+        deterministic = recording if recording is not None else replay
+        seed = None
+        if deterministic is not None:
+            seed = deterministic.seed
+            random.seed(seed)
+            np.random.seed(seed % 2 ** 32)
+            self.scene_manager.wait_for_loads = True
+        pygame.init()
+        width, height = self.resolution
+        screen = pygame.display.set_mode((width, height))
+        pygame.display.set_caption(self.caption)
+        
+        clock = pygame.time.Clock()
+        scene_manager = self.scene_manager
+        input_bus = scene_manager.input_bus
+        if objects is None:
+            objects = scene_manager.prefabs.resolve(scene_manager.read_scene(start_scene))
+        
+        # Cargar el script global si existe
+        global_module = None
+        if self.global_script:
+            global_module = scene_manager.load_script("global_script", self.global_script)
+            if global_module is not None:
+                try:
+                    # Llamar a la función de inicialización si existe
+                    if hasattr(global_module, "init"):
+                        global_module.init(objects)
+                except Exception as e:
+                    print(f"Error al cargar script global: {e}")
+
+        # Cargar sprites y scripts de la escena inicial
+        scene_manager.add_scene(start_scene, objects)
+
+        # Pre-renderizar las rotaciones de los sprites que lo tengan activado
+        rotation_baker = self.rotation_baker = RotationBaker(os.path.join(self.cache_dir, "rotation_bakes"))
+        for scene in scene_manager.active.values():
+            for obj in scene.objects:
+                if obj.get("rotation_bake") and obj["name"] in scene.object_sprites:
+                    rotation_baker.get(scene.object_sprites[obj["name"]],
+                                       scene_manager.sprite_hashes.get(obj["sprite"]),
+                                       obj.get("rotation_bake_step", RotationBaker.DEFAULT_STEP),
+                                       background=obj.get("rotation_bake_background", True))
+        
+        collision_world = CollisionWorld()
+        job_system = JobSystem()
+        chunk_cache = self.chunk_cache = TileChunkCache(render_tile_chunk_pygame)
+        dt = deterministic.dt if deterministic is not None else 1 / 60
+        render_queue = RenderQueue(special_flags=pygame.BLEND_PREMULTIPLIED)
+        transform_cache = self.transform_cache = SpriteTransformCache()
+        self.memory_sources = (scene_manager, transform_cache, chunk_cache)
+        self.placeholder = pygame.Surface((50, 50), pygame.SRCALPHA)
+        self.placeholder.fill((100, 100, 100, 255))
+        self.static_bakes = {}
+        
+        frame = 0
+        while self.running:
+            frame_start = time.perf_counter()
+            polled = None
+            if replay is not None:
+                if frame >= len(replay):
+                    break
+                pygame.event.pump()
+                events, polled = replay.frame(frame)
+            else:
+                events = pygame.event.get()
+            for event in events:
+                if event.type == pygame.QUIT:
+                    self.running = False
+            
+            # Repartir la entrada una sola vez a los handlers suscritos
+            input_bus.dispatch(events, polled)
+            if recording is not None:
+                recording.capture(events, input_bus.state)
+
+            # Activar las escenas que terminaron de cargarse en segundo plano
+            scene_manager.update()
+
+            # Ejecutar update global si existe
+            if global_module and hasattr(global_module, "update"):
+                try:
+                    global_module.update(scene_manager.objects)
+                except Exception as e:
+                    print(f"Error en update global: {e}")
+
+            # Ejecutar updates de los objetos (los que declaran PARALLEL_UPDATE van al pool)
+            for scene in list(scene_manager.active.values()):
+                for obj in scene.objects:
+                    module = scene.object_modules.get(obj["name"])
+                    if module is not None and hasattr(module, "update"):
+                        mode = job_system.parallel_mode(module)
+                        if mode:
+                            job_system.submit(module, obj, events, mode)
+                            continue
+                        try:
+                            module.update(obj, events)
+                        except Exception as e:
+                            print(f"Error en update de {obj['name']}: {e}")
+            
+            # Punto de sincronización: los trabajos paralelos terminan y escriben sus cambios
+            job_system.sync()
+            
+            # Colisiones con las posiciones ya actualizadas
+            collision_world.step(list(scene_manager.active.values()))
+            
+            # Partículas y animaciones
+            for scene in scene_manager.active.values():
+                scene.update_particles(dt, seed)
+                scene.update_animations(dt)
+
+            # Dibujar con el color de fondo personalizado
+            screen.fill(self.bg_color)
+            
+            # La cámara sigue a su objetivo con las posiciones ya actualizadas
+            positions = {scene.name: runtime_world_positions(scene.objects)
+                         for scene in scene_manager.active.values()}
+            self.camera.update(positions, dt)
+            self.zooming = self.camera.zoom != self.drawn_zoom
+            self.drawn_zoom = self.camera.zoom
+            
+            # Dibujar objetos: primero se arma la lista de dibujo y luego se envía en bloque
+            render_queue.clear()
+            transform_cache.next_frame()
+            self.culled = 0
+            for scene in scene_manager.active.values():
+                self.queue_pygame_objects(render_queue, scene, positions[scene.name])
+            if len(self.static_bakes) > len(self.static_layers) * len(scene_manager.active):
+                # Soltar las capas compuestas de escenas descargadas
+                self.static_bakes = {key: bake for key, bake in self.static_bakes.items()
+                                     if key[0] in scene_manager.active}
+            render_queue.submit(screen)
+            
+            pygame.display.flip()
+            self.frame_times.append((time.perf_counter() - frame_start) * 1000)
+            frame += 1
+            if replay is not None:
+                continue
+            dt = min(clock.tick(60) / 1000, 0.1)
+            if deterministic is not None:
+                dt = deterministic.dt
+        
+        job_system.shutdown()
+        if deterministic is not None:
+            self.state_hash = scene_state_hash(scene_manager)
+        self.memory_sources = None
+        pygame.quit()
+
+    def queue_pygame_objects(self, render_queue, scene, positions):
+        """Encola los objetos visibles de la escena en orden de capa y z, vistos desde la cámara"""
+        static_items = {}  # capa -> [(objeto, x, y)]
+        static_emitters = {}  # capa estática -> [(emisor, x, y)], se encolan después de sus baldosas
+        views = {}  # capa -> LayerView del fotograma
+        render_list = scene.render_list
+        for layer, _, _, name in render_list.sync(scene.objects):
+            obj = render_list.objects[name]
+            x, y = positions[name]
+            if layer in self.static_layers:
+                target = static_emitters if obj["type"] == "ParticleEmitter" else static_items
+                target.setdefault(layer, []).append((obj, x, y))
+                continue
+            view = views.get(layer)
+            if view is None:
+                view = views[layer] = self.camera.layer_view(self.layer_parallax.get(layer, (1, 1)))
+            self.queue_object(render_queue, obj, x, y, layer, scene, view)
+        
+        # Cada capa estática son unas pocas baldosas ya compuestas; dentro de una capa la cola dibuja en
+        # orden de inserción, así que sus partículas se encolan después para quedar por encima
+        for layer in static_items.keys() | static_emitters.keys():
+            view = self.camera.layer_view(self.layer_parallax.get(layer, (1, 1)))
+            items = static_items.get(layer)
+            if items:
+                bake = self.bake_static_layer(scene, layer, items)
+                if bake.tiles is not None:
+                    self.queue_static_tiles(render_queue, bake, view, layer)
+                else:
+                    for obj, x, y in items:
+                        self.queue_object(render_queue, obj, x, y, layer, scene, view)
+            for obj, x, y in static_emitters.get(layer, ()):
+                self.queue_object(render_queue, obj, x, y, layer, scene, view)
+
+    def queue_static_tiles(self, render_queue, bake, view, layer):
+        """Encola las baldosas de la capa que caen en la vista; con zoom se escalan solo esas"""
+        tile_size = StaticLayerBake.TILE_SIZE
+        zoom = view.zoom
+        if bake.scaled_zoom != zoom:
+            bake.scaled = {}
+            bake.scaled_zoom = zoom
+        scaled_size = math.ceil(tile_size * zoom)  # Redondeo hacia arriba: sin huecos entre baldosas
+        for column in range(int(view.left // tile_size), int(view.right // tile_size) + 1):
+            for row in range(int(view.top // tile_size), int(view.bottom // tile_size) + 1):
+                surface = bake.tiles.get((column, row))
+                if surface is None:
+                    continue
+                if zoom != 1:
+                    scaled = bake.scaled.get((column, row))
+                    if scaled is None:
+                        scaled = bake.scaled[(column, row)] = pygame.transform.smoothscale(
+                            surface, (scaled_size, scaled_size))
+                    surface = scaled
+                render_queue.add(surface, (column * tile_size * zoom + view.offset_x,
+                                           row * tile_size * zoom + view.offset_y), layer)
+
+    def bake_static_layer(self, scene, layer, items):
+        """Baldosas con los objetos de una capa estática; se recomponen solo si alguno cambió"""
+        signature = tuple((obj["name"], x, y, id(scene.sprite_for(obj["name"])), obj.get("tiles"),
+                           obj.get("scale_x", 1), obj.get("scale_y", 1), obj.get("rotation", 0),
+                           obj.get("opacity", 1.0), obj.get("z", 0))
+                          for obj, x, y in items)
+        bake = self.static_bakes.get((scene.name, layer))
+        if bake is not None and bake.signature == signature:
+            return bake
+        self.static_rebakes += 1
+        
+        # Antes de dibujar nada se estima qué baldosas harían falta; por encima del límite no se compone
+        tile_size = StaticLayerBake.TILE_SIZE
+        needed = set()
+        for obj, x, y in items:
+            left, top, right, bottom = self.static_item_bounds(scene, obj, x, y)
+            for column in range(int(left // tile_size), int(right // tile_size) + 1):
+                for row in range(int(top // tile_size), int(bottom // tile_size) + 1):
+                    needed.add((column, row))
+                    if len(needed) * tile_size * tile_size * 4 > StaticLayerBake.MAX_BYTES:
+                        bake = self.static_bakes[(scene.name, layer)] = StaticLayerBake(signature, None)
+                        return bake
+        
+        # Sin recorte por la vista: la capa se compone entera una vez
+        baked = RenderQueue()
+        for obj, x, y in items:
+            self.queue_object(baked, obj, x, y, 0, scene, None)
+        # RenderQueue ya redondea las posiciones como al dibujar sin componer
+        tile_blits = {}
+        for item, (left, top), _, _ in baked.layers.get(0, []):
+            for column in range(left // tile_size, (left + item.get_width() - 1) // tile_size + 1):
+                for row in range(top // tile_size, (top + item.get_height() - 1) // tile_size + 1):
+                    tile_blits.setdefault((column, row), []).append(
+                        (item, (left - column * tile_size, top - row * tile_size), None, pygame.BLEND_PREMULTIPLIED))
+        tiles = {}
+        for key, blits in tile_blits.items():
+            surface = tiles[key] = pygame.Surface((tile_size, tile_size), pygame.SRCALPHA)
+            surface.blits(blits, doreturn=False)
+        bake = self.static_bakes[(scene.name, layer)] = StaticLayerBake(signature, tiles)
+        return bake
+
+    def static_item_bounds(self, scene, obj, x, y):
+        """Rectángulo del mundo que ocupa un objeto de una capa estática, sin transformarlo"""
+        if obj["type"] == "Tilemap":
+            tile_width, tile_height = Tilemap.tile_size(obj)
+            return (x, y, x + int(obj.get("map_width", Tilemap.DEFAULT_MAP_SIZE)) * tile_width,
+                    y + int(obj.get("map_height", Tilemap.DEFAULT_MAP_SIZE)) * tile_height)
+        sprite = scene.sprite_for(obj["name"])
+        if sprite is None:
+            return x - 25, y - 25, x + 25, y + 25
+        radius = math.hypot(sprite.get_width() * obj.get("scale_x", 1), sprite.get_height() * obj.get("scale_y", 1)) / 2
+        return x - radius, y - radius, x + radius, y + radius
+
+    def queue_object(self, render_queue, obj, x, y, layer, scene, view):
+        """Encola un objeto en (x, y) del mundo; view es la LayerView de la cámara o None (sin cámara ni recorte)
+
+        Lo que queda fuera de la vista se descarta antes de transformar nada.
+        """
+        if obj["type"] == "Tilemap":
+            # Solo los chunks visibles, cada uno en un solo blit
+            tileset = scene.object_sprites.get(obj["name"])
+            if tileset is not None:
+                self.queue_tilemap_chunks(render_queue, obj, x, y, tileset, self.chunk_cache, view, layer)
+        elif obj["type"] == "ParticleEmitter":
+            system = scene.particle_systems.get(obj["name"])
+            if system is not None and len(system):
+                self.queue_particles(render_queue, obj, system, view, layer)
+        elif obj["type"] in ("Sprite2D", "AnimatedSprite2D") and obj["name"] in scene.object_sprites:
+            sprite = scene.sprite_for(obj["name"])
+            zoom = 1
+            if view is not None:
+                # Radio del sprite ya escalado: cubre cualquier rotación
+                radius = math.hypot(sprite.get_width() * obj.get("scale_x", 1),
+                                    sprite.get_height() * obj.get("scale_y", 1)) / 2
+                if not view.intersects(x - radius, y - radius, x + radius, y + radius):
+                    self.culled += 1
+                    return
+                zoom = view.zoom
+                x, y = x * zoom + view.offset_x, y * zoom + view.offset_y
+            transform_cache = self.transform_cache
+            store = zoom == 1 or not self.zooming
+            bake = None
+            scale_x, scale_y = obj.get("scale_x", 1), obj.get("scale_y", 1)
+            # Con escala no uniforme escalar el fotograma girado no equivale a girar el sprite escalado
+            if obj.get("rotation_bake") and obj["type"] == "Sprite2D" and scale_x == scale_y:
+                bake = self.rotation_baker.get(
+                    sprite, self.scene_manager.sprite_hashes.get(obj.get("sprite")),
+                    obj.get("rotation_bake_step", RotationBaker.DEFAULT_STEP))
+            
+            if bake is not None:
+                # Fotograma pre-renderizado más cercano (solo falta aplicar la escala y la opacidad)
+                sprite, half_w, half_h = bake.frame_for(obj.get("rotation", 0))
+                if obj.get("opacity", 1.0) < 1.0 or scale_x * zoom != 1:
+                    sprite, half_w, half_h = transform_cache.get(sprite, scale_x * zoom, scale_x * zoom, 0,
+                                                                 obj.get("opacity", 1.0), store, bake)
+            else:
+                sprite, half_w, half_h = transform_cache.get(
+                    sprite, scale_x * zoom, scale_y * zoom, obj.get("rotation", 0), obj.get("opacity", 1.0), store)
+            render_queue.add(sprite, (x - half_w, y - half_h), layer)
+        else:
+            # Placeholder para objetos sin sprite
+            placeholder, half_w, half_h = self.placeholder, 25, 25
+            if view is not None:
+                if not view.intersects(x - 25, y - 25, x + 25, y + 25):
+                    self.culled += 1
+                    return
+                x, y = x * view.zoom + view.offset_x, y * view.zoom + view.offset_y
+                placeholder, half_w, half_h = self.transform_cache.get(placeholder, view.zoom, view.zoom, 0, 1.0,
+                                                                       not self.zooming)
+            render_queue.add(placeholder, (x - half_w, y - half_h), layer)
+
+    def queue_particles(self, render_queue, obj, system, view=None, layer=0):
+        """Rasteriza las partículas visibles con NumPy en una sola superficie y la encola como un único blit"""
+        left, top, right, bottom = system.bounds(obj)
+        zoom, offset_x, offset_y = 1, 0, 0
+        if view is not None:
+            left, top = max(left, view.left), max(top, view.top)
+            right, bottom = min(right, view.right), min(bottom, view.bottom)
+            zoom, offset_x, offset_y = view.zoom, view.offset_x, view.offset_y
+        if right < left or bottom < top:
+            self.culled += 1
+            return
+        # Rectángulo en píxeles de pantalla; rasterize recibe su esquina en el mundo
+        screen_left, screen_top = int(left * zoom + offset_x), int(top * zoom + offset_y)
+        width = int(right * zoom + offset_x) + 1 - screen_left
+        height = int(bottom * zoom + offset_y) + 1 - screen_top
+        if width <= 0 or height <= 0:
+            return
+        pixels = system.rasterize(obj, (screen_left - offset_x) / zoom, (screen_top - offset_y) / zoom,
+                                  width, height, zoom, premultiplied=True)
+        render_queue.add(pygame.image.frombuffer(pixels, (width, height), "RGBA"), (screen_left, screen_top), layer)
+
+    def queue_tilemap_chunks(self, render_queue, obj, x, y, tileset, chunk_cache, view=None, layer=0):
+        tiles = Tilemap.decode(obj)
+        tile_width, tile_height = Tilemap.tile_size(obj)
+        chunk_width = Tilemap.CHUNK_SIZE * tile_width
+        chunk_height = Tilemap.CHUNK_SIZE * tile_height
+        if view is None:
+            bounds = (float("-inf"), float("-inf"), float("inf"), float("inf"))
+            zoom, offset_x, offset_y = 1, 0, 0
+        else:
+            bounds = (view.left - x, view.top - y, view.right - x, view.bottom - y)
+            zoom, offset_x, offset_y = view.zoom, view.offset_x, view.offset_y
+        # Escala redondeada hacia arriba para que los chunks vecinos no dejen huecos de un píxel
+        scale_x = (math.ceil(chunk_width * zoom) + 0.5) / chunk_width
+        scale_y = (math.ceil(chunk_height * zoom) + 0.5) / chunk_height
+        for column, row in Tilemap.visible_chunks(tiles, tile_width, tile_height, *bounds):
+            _, chunk = chunk_cache.get(id(tileset), tileset, tiles, column, row, tile_width, tile_height)
+            if chunk is None:
+                continue
+            left, top = x + column * chunk_width, y + row * chunk_height
+            if zoom != 1:
+                # Los chunks viven en chunk_cache, así que su versión escalada se puede cachear por id
+                chunk = self.transform_cache.get(chunk, scale_x, scale_y, 0, 1.0, not self.zooming)[0]
+            render_queue.add(chunk, (left * zoom + offset_x, top * zoom + offset_y), layer)
+
+
+class PackedAssets:
+    """Assets de un juego exportado: píxeles premultiplicados listos para frombuffer"""
+
+    def __init__(self, game_dir, manifest):
+        self.game_dir = game_dir
+        self.manifest = manifest  # ruta original -> {"file", "width", "height", "hash"}
+
+    def load_premultiplied(self, rel_path):
+        entry = self.get_entry(rel_path)
+        if entry is None:
+            return None
+        with open(os.path.join(self.game_dir, entry["file"]), "rb") as f:
+            return f.read(), (entry["width"], entry["height"])
+
+    def get_entry(self, rel_path):
+        return self.manifest.get(os.path.normpath(rel_path))
+
+
+class PackedSceneManager(SceneManager):
+    """SceneManager de un juego exportado: escenas en marshal con los prefabs ya resueltos y scripts compilados"""
+
+    def scene_path(self, name):
+        return os.path.join(self.project_path, "scenes", f"{name}.scene")
+
+    def read_scene(self, name):
+        with open(self.scene_path(name), "rb") as f:
+            return marshal.load(f)
+
+    def script_path(self, rel_path):
+        return os.path.join(self.project_path, "scripts", rel_path + "c")
+
+
+def play_exported(game_dir):
+    """Punto de entrada del reproductor exportado"""
+    with open(os.path.join(game_dir, "game.json"), "r") as f:
+        game = json.load(f)
+    scene_manager = PackedSceneManager(game_dir, PackedAssets(game_dir, game["assets"]), PrefabLibrary(),
+                                       input_bus=InputBus())
+    player = GamePlayer(scene_manager, tuple(game["resolution"]), os.path.join(game_dir, AssetStore.CACHE_DIR),
+                        tuple(game["bg_color"]), game["global_script"], caption=game["title"],
+                        layers=game["layers"])
+    player.run(game["start_scene"])
+
+
+class ViewportCompositor:
+    """Compone la parte visible de la escena en una sola imagen PIL en un hilo de fondo"""
+
+    MAX_SPRITES = 512
+    GRID_SIZE = 50
+
+    def __init__(self, asset_store):
+        self.asset_store = asset_store
+        self.sprites = OrderedDict()  # Sprites transformados (solo los usa el hilo de fondo)
+        self.chunks = TileChunkCache(render_tile_chunk_pil)
+        self.tilesets = {}
+        self.condition = threading.Condition()
+        self.request = None
+        self.result = None
+        self.running = True
+        self.worker = threading.Thread(target=self._worker_loop, daemon=True)
+        self.worker.start()
+
+    def submit(self, snapshot):
+        """Pide una nueva composición; si había otra pendiente se descarta"""
+        with self.condition:
+            self.request = snapshot
+            self.condition.notify()
+
+    def take_result(self):
+        with self.condition:
+            result, self.result = self.result, None
+            return result
+
+    def close(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+    def _worker_loop(self):
+        while True:
+            with self.condition:
+                while self.request is None and self.running:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                snapshot, self.request = self.request, None
+            try:
+                image = self.compose(snapshot)
+            except Exception as e:
+                print(f"Error al componer el viewport: {e}")
+                continue
+            with self.condition:
+                self.result = (snapshot["generation"], image)
+
+    def compose(self, snapshot):
+        width, height = snapshot["size"]
+        zoom = snapshot["zoom"]
+        offset_x, offset_y = snapshot["offset"]
+        image = Image.new("RGBA", (width, height), snapshot["background"])
+        draw = ImageDraw.Draw(image)
+
+        # Cuadrícula alineada con el mundo
+        step = self.GRID_SIZE * zoom
+        while step < 8:
+            step *= 2
+        x = offset_x % step
+        while x < width:
+            draw.line([(x, 0), (x, height)], fill=snapshot["grid"])
+            x += step
+        y = offset_y % step
+        while y < height:
+            draw.line([(0, y), (width, y)], fill=snapshot["grid"])
+            y += step
+
+        for world_x, world_y, obj in snapshot["objects"]:
+            x = world_x * zoom + offset_x
+            y = world_y * zoom + offset_y
+
+            if obj["type"] in ("Sprite2D", "AnimatedSprite2D"):
+                sprite, region = self.get_sprite(obj, zoom, x, y, width, height)
+                if sprite is not None:
+                    if region is None:
+                        self.paste_clipped(image, sprite, int(x - sprite.width / 2), int(y - sprite.height / 2))
+                    else:
+                        self.paste_clipped(image, sprite, int(x + region[0]), int(y + region[1]))
+                    continue
+                if region is not None:
+                    continue  # Sprite recortado a la vista sin ninguna parte visible
+                half = 25 * zoom
+                if x + half < 0 or y + half < 0 or x - half > width or y - half > height:
+                    continue
+                draw.rectangle([x - half, y - half, x + half, y + half], fill="#888888", outline="#555555")
+                draw.text((x, y), obj["name"], fill="#ffffff", anchor="mm")
+            elif obj["type"] == "Tilemap":
+                self.compose_tilemap(image, obj, x, y, zoom)
+            elif obj["type"] == "ParticleEmitter":
+                if x + 12 < 0 or y + 12 < 0 or x - 12 > width or y - 12 > height:
+                    continue
+                draw.polygon([(x, y - 12), (x + 12, y), (x, y + 12), (x - 12, y)],
+                             fill=obj.get("color_start", ParticleSystem.DEFAULTS["color_start"]), outline="#aaaaaa")
+            elif obj["type"] == "EmptyObject":
+                if x + 15 < 0 or y + 15 < 0 or x - 15 > width or y - 15 > height:
+                    continue
+                draw.ellipse([x - 15, y - 15, x + 15, y + 15], fill="#ffffff", outline="#aaaaaa")
+                draw.text((x, y), obj["name"], fill="#000000", anchor="mm")
+        return image
+
+    @staticmethod
+    def object_bounds(obj, x, y, asset_store, entries):
+        """Rectángulo del mundo que ocupa obj sin cargar su imagen, o None si no se sabe
+
+        entries guarda las entradas del manifiesto ya consultadas (cada consulta mira el archivo en disco).
+        """
+        obj_type = obj.get("type")
+        if obj_type == "Tilemap":
+            tile_width, tile_height = Tilemap.tile_size(obj)
+            return (x, y, x + int(obj.get("map_width", Tilemap.DEFAULT_MAP_SIZE)) * tile_width,
+                    y + int(obj.get("map_height", Tilemap.DEFAULT_MAP_SIZE)) * tile_height)
+        if obj_type in ("Sprite2D", "AnimatedSprite2D"):
+            if obj_type == "AnimatedSprite2D" and AnimatedSprite.preview_rect(obj) is not None:
+                left, top, right, bottom = AnimatedSprite.preview_rect(obj)
+                width, height = right - left, bottom - top
+            else:
+                rel_path = object_image_path(obj)
+                if rel_path and rel_path not in entries:
+                    entries[rel_path] = asset_store.get_entry(rel_path)
+                entry = entries.get(rel_path)
+                if entry is None or "width" not in entry:
+                    return None if object_image_path(obj) else (x - 25, y - 25, x + 25, y + 25)
+                width, height = entry["width"], entry["height"]
+            # Radio del sprite escalado: cubre cualquier rotación
+            radius = math.hypot(width * obj.get("scale_x", 1), height * obj.get("scale_y", 1)) / 2
+            return x - radius, y - radius, x + radius, y + radius
+        half = 15 if obj_type == "EmptyObject" else 12
+        return x - half, y - half, x + half, y + half
+
+    def compose_tilemap(self, image, obj, x, y, zoom):
+        tileset = self.get_tileset(obj.get("tileset"))
+        if tileset is None:
+            return
+        tiles = Tilemap.decode(obj)
+        tile_width, tile_height = Tilemap.tile_size(obj)
+        chunk_width = Tilemap.CHUNK_SIZE * tile_width
+        chunk_height = Tilemap.CHUNK_SIZE * tile_height
+        
+        for column, row in Tilemap.visible_chunks(tiles, tile_width, tile_height, -x / zoom, -y / zoom,
+                                                  (image.width - x) / zoom, (image.height - y) / zoom):
+            key, chunk = self.chunks.get(obj["tileset"], tileset, tiles, column, row, tile_width, tile_height)
+            if chunk is None:
+                continue
+            left, top = x + column * chunk_width * zoom, y + row * chunk_height * zoom
+            crop = self.chunk_crop(chunk, left, top, zoom, image.width, image.height, tile_width, tile_height)
+            scaled_key = ("chunk", key, zoom, crop)
+            scaled = self.sprites.get(scaled_key)
+            if scaled is None:
+                scaled = self.sprites[scaled_key] = self.scale_chunk(chunk, zoom, crop)
+                while len(self.sprites) > self.MAX_SPRITES:
+                    self.sprites.popitem(last=False)
+            if scaled is not None:
+                self.paste_clipped(image, scaled, int(left + (crop[0] if crop else 0) * zoom),
+                                   int(top + (crop[1] if crop else 0) * zoom))
+
+    @staticmethod
+    def chunk_crop(chunk, left, top, zoom, width, height, tile_width, tile_height):
+        """Parte visible (en píxeles del chunk, alineada a tiles) de un chunk dibujado en (left, top) de una
+        vista de width x height, o None si el chunk escalado entero no pasa de AssetStore.MAX_RENDER_SIZE"""
+        if max(chunk.width, chunk.height) * zoom <= AssetStore.MAX_RENDER_SIZE:
+            return None
+        crop_left = math.floor(max(0, -left / zoom) / tile_width) * tile_width
+        crop_top = math.floor(max(0, -top / zoom) / tile_height) * tile_height
+        crop_right = min(chunk.width, math.ceil((width - left) / zoom / tile_width) * tile_width)
+        crop_bottom = min(chunk.height, math.ceil((height - top) / zoom / tile_height) * tile_height)
+        return crop_left, crop_top, max(crop_left, crop_right), max(crop_top, crop_bottom)
+
+    @staticmethod
+    def scale_chunk(chunk, zoom, crop=None):
+        """Chunk (o su recorte) escalado con zoom; None si el recorte está vacío"""
+        if crop is not None:
+            if crop[2] <= crop[0] or crop[3] <= crop[1]:
+                return None
+            chunk = chunk.crop(crop)
+        if zoom == 1:
+            return chunk
+        size = (max(1, round(chunk.width * zoom)), max(1, round(chunk.height * zoom)))
+        return chunk.resize(size, Image.Resampling.NEAREST)
+
+    def get_tileset(self, rel_path):
+        if not rel_path:
+            return None
+        if rel_path not in self.tilesets:
+            try:
+                self.tilesets[rel_path] = Image.open(
+                    os.path.join(self.asset_store.project_path, rel_path)).convert("RGBA")
+            except Exception:
+                self.tilesets[rel_path] = None
+        return self.tilesets[rel_path]
+
+    def get_sprite(self, obj, zoom, x, y, width, height):
+        """(sprite, region): region es None si el sprite está entero, o la parte recortada a la vista"""
+        rel_path = object_image_path(obj)
+        if not rel_path:
+            return None, None
+        # De las hojas de sprites se muestra el primer fotograma del clip actual
+        crop = AnimatedSprite.preview_rect(obj) if obj["type"] == "AnimatedSprite2D" else None
+        scale_x = obj.get("scale_x", 1) * zoom
+        scale_y = obj.get("scale_y", 1) * zoom
+        region = self.asset_store.clip_region(rel_path, scale_x, scale_y, crop, x, y, width, height)
+        if region is not None and (region[2] <= region[0] or region[3] <= region[1]):
+            return None, region
+        key = (rel_path, scale_x, scale_y, obj.get("rotation", 0), obj.get("opacity", 1.0), crop, region)
+        if key in self.sprites:
+            self.sprites.move_to_end(key)
+            return self.sprites[key], region
+        try:
+            sprite = self.asset_store.render_sprite(rel_path, *key[1:]).convert("RGBA")
+        except Exception:
+            sprite = None
+        self.sprites[key] = sprite
+        while len(self.sprites) > self.MAX_SPRITES:
+            self.sprites.popitem(last=False)
+        return sprite, region
+
+    @staticmethod
+    def paste_clipped(image, sprite, left, top):
+        """alpha_composite recortando la parte del sprite que queda fuera de la imagen"""
+        crop_left = max(0, -left)
+        crop_top = max(0, -top)
+        crop_right = min(sprite.width, image.width - left)
+        crop_bottom = min(sprite.height, image.height - top)
+        if crop_left >= crop_right or crop_top >= crop_bottom:
+            return
+        image.alpha_composite(sprite, dest=(left + crop_left, top + crop_top),
+                              source=(crop_left, crop_top, crop_right, crop_bottom))
+
+
+class PrefabLibrary:
+    """Plantillas de objetos reutilizables; las instancias solo guardan sus diferencias"""
+
+    # Campos propios de cada instancia que nunca forman parte de la plantilla
+    INSTANCE_FIELDS = ("name", "parent", "prefab", "x", "y")
+    _MISSING = object()
+
+    def __init__(self, templates=None):
+        self.templates = templates or {}
+
+    def make_template(self, obj):
+        return {key: copy_json(value) for key, value in obj.items() if key not in self.INSTANCE_FIELDS}
+
+    def resolve(self, stored_objects):
+        """Convierte los objetos guardados en objetos completos rellenando los campos del prefab"""
+        objects = []
+        for stored in stored_objects:
+            template = self.templates.get(stored.get("prefab"))
+            if template is None:
+                objects.append(stored)
+            else:
+                # Copia profunda: un script que modifique una lista o dict de la instancia no toca la plantilla
+                obj = copy_json(template)
+                obj.update(stored)
+                objects.append(obj)
+        return objects
+
+    def strip(self, objects):
+        """Versión compacta de los objetos: las instancias guardan solo los campos sobrescritos"""
+        stored_objects = []
+        for obj in objects:
+            template = self.templates.get(obj.get("prefab"))
+            if template is None:
+                stored_objects.append(obj)
+            else:
+                stored_objects.append({key: value for key, value in obj.items()
+                                       if key in self.INSTANCE_FIELDS or template.get(key, self._MISSING) != value})
+        return stored_objects
+
+    def update_template(self, prefab_name, new_template, objects, source=None):
+        """Cambia la plantilla y actualiza en objects los campos que las instancias no sobrescriben"""
+        old_template = self.templates.get(prefab_name, {})
+        self.templates[prefab_name] = new_template
+        for obj in objects:
+            if obj is source or obj.get("prefab") != prefab_name:
+                continue
+            for key in set(old_template) | set(new_template):
+                if obj.get(key, self._MISSING) != old_template.get(key, self._MISSING):
+                    continue  # Campo sobrescrito en la instancia
+                if key in new_template:
+                    obj[key] = copy_json(new_template[key])
+                else:
+                    obj.pop(key, None)
+
+
+class InspectorPanel:
+    """Widgets del inspector para un tipo de objeto, reutilizados entre selecciones"""
+
+    def __init__(self, parent):
+        self.frame = ttk.Frame(parent)
+        self.fields = {}  # campo -> (variable, valor por defecto)
+        self.traces = []  # (variable, id del trace) para poder soltarlos
+        self.binders = []  # funciones extra que se llaman al enlazar un objeto
+        self.obj = None
+        self.updating = False
+
+    def add_field(self, field, var, default, on_change=None):
+        """Enlaza var con obj[field]; on_change se llama cuando el usuario edita el valor"""
+        self.fields[field] = (var, default)
+        if on_change:
+            trace_id = var.trace_add("write", lambda *_: self._on_write(on_change))
+            self.traces.append((var, trace_id))
+
+    def _on_write(self, on_change):
+        # Ignorar las escrituras hechas por bind() y los valores a medio escribir
+        if self.updating or self.obj is None:
+            return
+        try:
+            on_change()
+        except (tk.TclError, ValueError):
+            pass
+
+    def bind(self, obj):
+        """Enlaza el panel a obj actualizando solo los campos cuyo valor cambió"""
+        self.obj = obj
+        self.updating = True
+        try:
+            for field, (var, default) in self.fields.items():
+                value = obj.get(field, default)
+                try:
+                    current = var.get()
+                except (tk.TclError, ValueError):
+                    current = None
+                if current != value:
+                    var.set(value)
+            for binder in self.binders:
+                binder(obj)
+        finally:
+            self.updating = False
+
+    def destroy(self):
+        for var, trace_id in self.traces:
+            var.trace_remove("write", trace_id)
+        self.traces = []
+        self.obj = None
+        self.frame.destroy()
+
+
+class MemoryReport:
+    """Cuenta la memoria de cachés, superficies y datos de escena y la devuelve como dict exportable a JSON"""
+
+    @staticmethod
+    def image_bytes(image):
+        """Bytes de píxeles de una superficie de pygame, imagen PIL o PhotoImage"""
+        if hasattr(image, "get_bytesize"):
+            return image.get_width() * image.get_height() * image.get_bytesize()
+        if hasattr(image, "getbands"):
+            return image.width * image.height * len(image.getbands())
+        try:
+            return image.width() * image.height() * 4  # PhotoImage: Tk guarda 4 bytes por píxel
+        except Exception:
+            return 0
+
+    @classmethod
+    def data_bytes(cls, value, seen=None):
+        """Tamaño aproximado de datos JSON (dicts, listas, cadenas y números) contando cada objeto una vez"""
+        if seen is None:
+            seen = set()
+        if id(value) in seen:
+            return 0
+        seen.add(id(value))
+        size = sys.getsizeof(value)
+        if isinstance(value, dict):
+            size += sum(cls.data_bytes(key, seen) + cls.data_bytes(item, seen) for key, item in value.items())
+        elif isinstance(value, (list, tuple)):
+            size += sum(cls.data_bytes(item, seen) for item in value)
+        return size
+
+    @staticmethod
+    def cache_stats(cache, entries, byte_count):
+        hits = getattr(cache, "hits", 0)
+        misses = getattr(cache, "misses", 0)
+        return {
+            "entries": entries,
+            "bytes": byte_count,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None
+        }
+
+    @classmethod
+    def editor_section(cls, editor):
+        by_asset = {}
+        for key, photo in list(editor.object_images.items()):
+            asset = "tilemap_chunks" if key[0] == "chunk" else os.path.relpath(key[0], editor.project_path or ".")
+            by_asset[asset] = by_asset.get(asset, 0) + cls.image_bytes(photo)
+        
+        section = {
+            "object_images": dict(cls.cache_stats(None, len(editor.object_images), sum(by_asset.values())),
+                                  by_asset=by_asset),
+            "tilesets": {path: cls.image_bytes(image) for path, (_, image) in editor.tileset_images.items()},
+            "tile_chunks": cls.cache_stats(editor.tile_chunks, len(editor.tile_chunks.entries),
+                                           sum(cls.image_bytes(image) for image in editor.tile_chunks.entries.values())),
+            "scenes": {name: cls.data_bytes(objects) for name, objects in editor.scenes.items() if objects is not None}
+        }
+        if editor.thumbnail_cache:
+            photos = list(editor.thumbnail_cache.photos.values())
+            section["thumbnails"] = cls.cache_stats(editor.thumbnail_cache, len(photos),
+                                                    sum(cls.image_bytes(photo) for photo in photos if photo))
+        if editor.scene_cache:
+            section["scene_cache"] = cls.cache_stats(editor.scene_cache, len(editor.scene_cache.entries),
+                                                     editor.scene_cache.total_bytes)
+        return section
+
+    @classmethod
+    def runtime_section(cls, scene_manager, transform_cache=None, chunk_cache=None):
+        surfaces = {path: cls.image_bytes(surface) for path, surface in list(scene_manager.surfaces.items())}
+        section = {
+            "surfaces": surfaces,
+            "surface_bytes": sum(surfaces.values()),
+            "scenes": {}
+        }
+        for name, scene in list(scene_manager.active.items()):
+            section["scenes"][name] = {
+                "objects": len(scene.objects),
+                "data_bytes": cls.data_bytes(scene.objects),
+                "particle_bytes": sum(system.position.nbytes + system.velocity.nbytes + system.age.nbytes +
+                                      system.lifetime.nbytes for system in scene.particle_systems.values())
+            }
+        if transform_cache is not None:
+            entries = list(transform_cache.entries.values())
+            section["transform_cache"] = cls.cache_stats(transform_cache, len(entries),
+                                                         sum(cls.image_bytes(entry[0]) for entry in entries))
+        if chunk_cache is not None:
+            chunks = list(chunk_cache.entries.values())
+            section["tile_chunks"] = cls.cache_stats(chunk_cache, len(chunks),
+                                                     sum(cls.image_bytes(chunk) for chunk in chunks))
+        return section
+
+
+class MemoryTracker:
+    """Snapshots de tracemalloc con nombre que se pueden comparar entre sí"""
+
+    def __init__(self, frames=1):
+        self.frames = frames
+        self.snapshots = []  # (etiqueta, snapshot)
+
+    @property
+    def active(self):
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+
+    def stop(self):
+        tracemalloc.stop()
+        self.snapshots = []
+
+    def snapshot(self, label=None):
+        self.start()
+        label = label or f"snapshot {len(self.snapshots) + 1}"
+        self.snapshots.append((label, tracemalloc.take_snapshot()))
+        return label
+
+    def diff(self, older=-2, newer=-1, limit=25):
+        """Líneas de código con más diferencia de memoria entre dos snapshots"""
+        if len(self.snapshots) < 2:
+            return []
+        (old_label, old), (new_label, new) = self.snapshots[older], self.snapshots[newer]
+        stats = new.compare_to(old, "lineno")
+        return [{
+            "from": old_label,
+            "to": new_label,
+            "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "size_diff": stat.size_diff,
+            "size": stat.size,
+            "count_diff": stat.count_diff
+        } for stat in stats[:limit]]
+
+    def summary(self):
+        current, peak = tracemalloc.get_traced_memory() if self.active else (0, 0)
+        return {"tracing": self.active, "current": current, "peak": peak,
+                "snapshots": [label for label, _ in self.snapshots], "diff": self.diff()}
+
+
+def headless_memory_report(project_path, scene_name=None, trace=False):
+    """Carga una escena del proyecto sin ventana y devuelve el informe de memoria del runtime"""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    tracker = MemoryTracker()
+    if trace:
+        tracker.snapshot("inicio")
+    
+    with open(os.path.join(project_path, "project_config.json"), "r") as f:
+        config = json.load(f)
+    scene_name = scene_name or next(iter(config.get("scenes", {})), None)
+    if scene_name is None:
+        raise ValueError("El proyecto no tiene escenas")
+    
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+    try:
+        scene_manager = SceneManager(project_path, AssetStore(project_path), PrefabLibrary(config.get("prefabs", {})))
+        with open(scene_manager.scene_path(scene_name), "r") as f:
+            scene_manager.add_scene(scene_name, scene_manager.prefabs.resolve(json.load(f)))
+        if trace:
+            tracker.snapshot(f"escena {scene_name} cargada")
+        
+        report = {"project": project_path, "time": time.time(), "runtime": MemoryReport.runtime_section(scene_manager)}
+        if trace:
+            report["tracemalloc"] = tracker.summary()
+        return report
+    finally:
+        if trace:
+            tracker.stop()
+        pygame.quit()
+
+
+def frame_time_summary(frame_times):
+    """Media, percentiles y máximo de los tiempos por fotograma en ms"""
+    if not frame_times:
+        return {"frames": 0}
+    ordered = sorted(frame_times)
+    percentile = lambda p: ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+    return {
+        "frames": len(frame_times),
+        "mean_ms": sum(frame_times) / len(frame_times),
+        "p50_ms": percentile(0.5),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": ordered[-1]
+    }
+
+
+def headless_replay(project_path, recording_path, frame_times=False):
+    """Reproduce una grabación sin ventana y devuelve tiempos por fotograma y el hash del estado final"""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    recording = InputRecording.load(recording_path)
+    with open(os.path.join(project_path, "project_config.json"), "r") as f:
+        config = json.load(f)
+    
+    scene_manager = SceneManager(project_path, AssetStore(project_path), PrefabLibrary(config.get("prefabs", {})),
+                                 input_bus=InputBus())
+    player = GamePlayer(scene_manager, recording.resolution, os.path.join(project_path, AssetStore.CACHE_DIR),
+                        global_script=config.get("global_script"), layers=config.get("layers"))
+    player.run(recording.scene, replay=recording)
+    
+    report = {"project": project_path, "recording": recording_path, "scene": recording.scene,
+              "seed": recording.seed, "dt": recording.dt, "state_hash": player.state_hash,
+              "timings": frame_time_summary(player.frame_times)}
+    if frame_times:
+        report["frame_ms"] = player.frame_times
+    return report
+
+
+# Lo que el reproductor exportado no necesita: el editor y sus herramientas
+EDITOR_ONLY_NAMES = {"SparEngineEditor", "StartupProfile", "InspectorPanel", "ViewportCompositor", "ThumbnailCache",
+                     "ProjectIndex", "MemoryReport", "MemoryTracker", "headless_memory_report",
+                     "build_player_module", "export_game", "PLAYER_LAUNCHER", "EDITOR_ONLY_NAMES"}
+
+PLAYER_LAUNCHER = """import json
+import os
 import sys
-import subprocess
-import math
-import time
+
+GAME_DIR = os.path.dirname(os.path.abspath(__file__))
+
+if __name__ == "__main__":
+    with open(os.path.join(GAME_DIR, "game.json"), "r") as f:
+        python = json.load(f)["python"]
+    if list(sys.version_info[:2]) != python:
+        sys.exit("Este juego se exporto para Python %d.%d" % tuple(python))
+    sys.path.insert(0, GAME_DIR)
+    import spar_runtime
+    spar_runtime.play_exported(GAME_DIR)
+"""
+
+
+def build_player_module(source_path=None):
+    """Código del runtime sin Tk: este mismo archivo sin el editor, sus imports ni el bloque __main__"""
+    with open(source_path or os.path.abspath(__file__), "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    body = []
+    for node in tree.body:
+        if isinstance(node, ast.Import) and any(alias.name.startswith("tkinter") for alias in node.names):
+            continue
+        if isinstance(node, ast.ImportFrom) and (node.module or "").startswith("tkinter"):
+            continue
+        if isinstance(node, (ast.ClassDef, ast.FunctionDef)) and node.name in EDITOR_ONLY_NAMES:
+            continue
+        if isinstance(node, ast.Assign) and any(isinstance(target, ast.Name) and target.id in EDITOR_ONLY_NAMES
+                                                for target in node.targets):
+            continue
+        if isinstance(node, ast.If) and "__main__" in ast.unparse(node.test):
+            continue
+        body.append(node)
+    tree.body = body
+    return ast.unparse(tree) + "\n"
+
+
+def export_game(project_path, out_dir, start_scene=None, resolution=(1024, 768), bg_color=(0, 0, 0), report=None):
+    """Escribe en out_dir un juego independiente del editor
+
+    El paquete lleva play.py, el runtime y los scripts ya compilados, las escenas en marshal con los
+    prefabs resueltos y solo los assets que usan las escenas, como píxeles premultiplicados.
+    """
+    asset_store = AssetStore(project_path)
+    index = ProjectIndex(project_path)
+    with open(index.config_path, "r") as f:
+        config = json.load(f)
+    if not index.load():
+        index.rebuild(config, asset_store.manifest)
+    scene_names = index.scene_names()
+    if not scene_names:
+        raise ValueError("El proyecto no tiene escenas")
+    start_scene = start_scene or scene_names[0]
+    prefabs = PrefabLibrary(config.get("prefabs", {}))
+    scripts = {os.path.normpath(config["global_script"])} if config.get("global_script") else set()
+    
+    for folder in ("scenes", "scripts", "assets"):
+        shutil.rmtree(os.path.join(out_dir, folder), ignore_errors=True)
+        os.makedirs(os.path.join(out_dir, folder))
+    
+    # Escenas con los prefabs ya resueltos; los assets y scripts salen de los objetos resueltos,
+    # así se incluyen también los que solo llegan a través de un prefab
+    images = set()
+    for name in scene_names:
+        with open(index.scene_path(name), "r") as f:
+            objects = prefabs.resolve(json.load(f))
+        with open(os.path.join(out_dir, "scenes", f"{name}.scene"), "wb") as f:
+            marshal.dump(objects, f)
+        for obj in objects:
+            if object_image_path(obj):
+                images.add(os.path.normpath(object_image_path(obj)))
+            if obj.get("script"):
+                scripts.add(os.path.normpath(obj["script"]))
+        if report:
+            report(f"Escena {name}")
+    
+    # Assets preprocesados: no hace falta PIL ni decodificar PNG al arrancar
+    assets = {}
+    bakes_dir = os.path.join(project_path, AssetStore.CACHE_DIR, "rotation_bakes")
+    bakes = os.listdir(bakes_dir) if os.path.isdir(bakes_dir) else []
+    for rel_path in sorted(images):
+        pixels = asset_store.load_premultiplied(rel_path)
+        if pixels is None:
+            print(f"Asset no encontrado al exportar: {rel_path}")
+            continue
+        data, (width, height) = pixels
+        digest = asset_store.get_entry(rel_path)["hash"]
+        file_name = os.path.join("assets", f"{digest}.rgba")
+        with open(os.path.join(out_dir, file_name), "wb") as f:
+            f.write(data)
+        assets[rel_path] = {"file": file_name, "width": width, "height": height, "hash": digest}
+        # Las rotaciones ya horneadas en el editor también se llevan
+        for bake in bakes:
+            if bake.startswith(digest[:16]):
+                os.makedirs(os.path.join(out_dir, AssetStore.CACHE_DIR, "rotation_bakes"), exist_ok=True)
+                shutil.copy2(os.path.join(bakes_dir, bake),
+                             os.path.join(out_dir, AssetStore.CACHE_DIR, "rotation_bakes", bake))
+        if report:
+            report(f"Asset {rel_path}")
+    
+    # Scripts compilados a bytecode
+    for rel_path in sorted(scripts):
+        if not os.path.exists(os.path.join(project_path, rel_path)):
+            print(f"Script no encontrado al exportar: {rel_path}")
+            continue
+        compiled_path = os.path.join(out_dir, "scripts", rel_path + "c")
+        os.makedirs(os.path.dirname(compiled_path), exist_ok=True)
+        py_compile.compile(os.path.join(project_path, rel_path), cfile=compiled_path, doraise=True)
+    
+    # Runtime sin Tk, también compilado; play.py es lo único que queda como código fuente
+    runtime_source = os.path.join(out_dir, "spar_runtime.py")
+    with open(runtime_source, "w", encoding="utf-8") as f:
+        f.write(build_player_module())
+    py_compile.compile(runtime_source, cfile=os.path.join(out_dir, "spar_runtime.pyc"), doraise=True)
+    os.remove(runtime_source)
+    with open(os.path.join(out_dir, "play.py"), "w") as f:
+        f.write(PLAYER_LAUNCHER)
+    
+    game = {
+        "title": os.path.basename(os.path.normpath(project_path)),
+        "python": list(sys.version_info[:2]),
+        "start_scene": start_scene,
+        "scenes": scene_names,
+        "global_script": index.data["global_script"],
+        "layers": index.data.get("layers", {}),
+        "resolution": list(resolution),
+        "bg_color": list(bg_color),
+        "assets": assets
+    }
+    with open(os.path.join(out_dir, "game.json"), "w") as f:
+        json.dump(game, f, indent=4)
+    return game
+
+
+class StartupProfile:
+    """Desglose de tiempos del arranque del editor"""
+
+    def __init__(self, started=None):
+        self.started = started if started is not None else time.perf_counter()
+        self.last = self.started
+        self.stages = []  # (etapa, ms)
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.stages.append((stage, (now - self.last) * 1000))
+        self.last = now
+
+    def total_ms(self):
+        return (self.last - self.started) * 1000
+
+    def lines(self):
+        lines = [f"{stage}: {ms:.1f} ms" for stage, ms in self.stages]
+        lines.append(f"Total: {self.total_ms():.1f} ms")
+        for name, ms in LazyModule.import_times.items():
+            lines.append(f"import {name}: {ms:.1f} ms")
+        return lines
+
 
 class SparEngineEditor:
+    MAX_OBJECT_IMAGES = 256  # Imágenes transformadas guardadas para el canvas
+    MIN_ZOOM = 0.05
+    MAX_ZOOM = 20.0
+    SAVE_DELAY_MS = 500  # Espera antes de guardar tras una ráfaga de ediciones
+
+    STARTUP_BUDGET_MS = 500  # Tiempo máximo hasta mostrar la ventana principal
+
     def __init__(self, root):
+        self.startup = StartupProfile(STARTUP_STARTED)
+        self.startup.mark("módulos")
         self.root = root
         self.current_directory = ""
         self.root.title("SparEngine Editor")
         self.project_path = None
-        self.scenes = {}
+        self.scenes = {}  # nombre -> objetos (None mientras la escena no se haya abierto)
+        self.project_index = None  # Índice compacto del proyecto abierto
+        self.layer_settings = {}  # "<capa>" -> {"static": bool, "parallax": [x, y]}, común a todo el proyecto
+        self.prefabs = PrefabLibrary()  # Prefabs del proyecto
         self.current_scene = None
         self.objects = []
-        self.selected_object_index = None
+        self.selected_object_index = None  # Objeto activo (el que muestra el inspector)
+        self.selected_names = set()  # Todos los objetos seleccionados
+        self.hierarchy_items = {}  # Nombre de objeto -> item del árbol de jerarquía
         self.dragging_object = None
-        self.drag_offset = (0, 0)
+        self.drag_start = (0, 0)
+        self.drag_origins = []  # (objeto, x, y) de los objetos arrastrados en grupo
+        self.box_select_start = None
+        self.box_select_additive = False
         self.camera_offset = [0, 0]
+        self.camera_zoom = 1.0
+        self.viewport_mode = "canvas"  # "canvas" (un item por objeto) o "composite" (imagen única)
+        self.compositor = None
+        self.composite_generation = 0
+        self.composite_photo = None
+        self.composite_poll_id = None
+        self.tile_chunks = TileChunkCache(render_tile_chunk_pil)
+        self.tileset_images = {}  # ruta -> (mtime, imagen PIL)
+        self.tile_paint_mode = False
+        self.paint_tile = 0  # Índice del tile con el que se pinta (-1 = borrar)
+        self.paint_tiles = None  # Copia editable de los tiles durante un trazo
+        self.particle_preview = None  # (emisor, ParticleSystem) de la vista previa en el viewport
+        self.particle_preview_id = None
+        self.particle_preview_photo = None
+        self.memory_tracker = MemoryTracker()
+        self.memory_window = None
+        self.game_player = None  # Bucle del juego en marcha (Play)
+        self.record_input = tk.BooleanVar(value=False)  # Grabar la entrada de cada Play para reproducirla
         self.camera_drag_start = None
         self.running_simulation = False
         self.global_script = None
-        self.object_images = {}  # Cache de imágenes para los sprites
+        self.object_images = OrderedDict()  # Cache de imágenes para los sprites
+        self.canvas_photos = {}  # Tag de cada objeto -> PhotoImages que muestran sus items ahora mismo
+        self.pending_edits = {}  # Ediciones de propiedades pendientes de aplicar
+        self.edit_flush_id = None
+        self.save_after_id = None
+        self.asset_store = None  # Assets del proyecto direccionados por contenido
+        self.thumbnail_cache = None  # Miniaturas en disco para inspector y navegador
+        self.scene_cache = None  # Escenas ya parseadas (LRU con precarga)
+        self.browser_grid_frame = None  # Vista de cuadrícula del navegador (se crea al usarla)
+        self.browser_grid_visible = False
+        self.browser_grid_path = None
+        self.browser_grid_generation = 0
         self.parenting_target = None  # Para el sistema de parenting
         self.last_update_time = 0
 
@@ -62,11 +3522,28 @@ class SparEngineEditor:
         self.current_theme = "Dark"
         self.pygame_bg_color = (0, 0, 0)  # Color de fondo de Pygame (negro por defecto)
 
-        # Configuración de la UI
+        # Configuración de la UI: lo imprescindible para mostrar la ventana
         self.setup_ui()
+        self.startup.mark("interfaz")
         self.setup_menu()
         self.load_default_icons()
+        self.startup.mark("menús e iconos")
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        # El resto se pone en marcha cuando la ventana ya está en pantalla
+        self.root.after_idle(self.finish_startup)
+
+    def finish_startup(self):
+        self.root.update_idletasks()
+        self.startup.mark("ventana visible")
+        if self.startup.total_ms() > self.STARTUP_BUDGET_MS:
+            print(f"Arranque por encima del presupuesto ({self.STARTUP_BUDGET_MS} ms):")
+            for line in self.startup.lines():
+                print("  " + line)
         self.setup_file_watcher()
+        self.poll_thumbnails()
+
+    def show_startup_timings(self):
+        messagebox.showinfo("Tiempos de arranque", "\n".join(self.startup.lines()))
 
     def setup_ui(self):
         self.root.configure(bg=self.themes[self.current_theme]["bg"])
@@ -129,17 +3606,12 @@ class SparEngineEditor:
         self.hierarchy_tree.bind("<<TreeviewSelect>>", self.on_object_select)
         self.hierarchy_tree.bind("<Button-3>", self.hierarchy_right_click)
         
-        # Navegador de proyectos
-        browser_frame = ttk.LabelFrame(self.left_panel, text="Navegador de Proyectos")
-        browser_frame.pack(fill=tk.BOTH, expand=True)
-        
-        self.path_label = ttk.Label(browser_frame, text="")
-        self.path_label.pack(fill=tk.X)
-        
-        self.project_browser = ttk.Treeview(browser_frame, show="tree")
-        self.project_browser.pack(fill=tk.BOTH, expand=True)
-        self.project_browser.bind("<Double-1>", self.project_browser_double_click)
-        self.project_browser.bind("<Button-3>", self.project_browser_right_click)
+        # Navegador de proyectos (sus widgets se crean al abrir el primer proyecto)
+        self.browser_frame = ttk.LabelFrame(self.left_panel, text="Navegador de Proyectos")
+        self.browser_frame.pack(fill=tk.BOTH, expand=True)
+        self.project_browser = None
+        self.browser_placeholder = ttk.Label(self.browser_frame, text="Ningún proyecto abierto")
+        self.browser_placeholder.pack(pady=10)
         
         # Panel central (escena)
         self.center_panel = ttk.Frame(self.main_frame)
@@ -157,6 +3629,15 @@ class SparEngineEditor:
         self.scene_canvas.bind("<B3-Motion>", self.move_camera)
         self.scene_canvas.bind("<ButtonRelease-3>", self.stop_camera_drag)
         self.scene_canvas.bind("<MouseWheel>", self.zoom_camera)
+        self.scene_canvas.bind("<Button-4>", lambda e: self.zoom_camera(e, 1))
+        self.scene_canvas.bind("<Button-5>", lambda e: self.zoom_camera(e, -1))
+        self.scene_canvas.bind("<Configure>", lambda e: self.draw_scene())
+        
+        # Atajos de selección (solo en el canvas y la jerarquía, no en los campos de texto)
+        for widget in (self.scene_canvas, self.hierarchy_tree):
+            widget.bind("<Delete>", lambda e: self.delete_selection())
+            widget.bind("<Control-d>", lambda e: self.duplicate_selection())
+            widget.bind("<Control-a>", lambda e: self.select_all())
         
         # Panel derecho (inspector)
         self.right_panel = ttk.Frame(self.main_frame, width=300)
@@ -166,8 +3647,31 @@ class SparEngineEditor:
         self.inspector_frame = ttk.LabelFrame(self.right_panel, text="Inspector")
         self.inspector_frame.pack(fill=tk.BOTH, expand=True)
         
-        # Configurar el inspector vacío (se llenará cuando se seleccione un objeto)
-        self.setup_inspector()
+        # Paneles del inspector por tipo de objeto (se construyen al seleccionar el primero)
+        self.inspector_panels = {}
+        self.active_inspector_panel = None
+        self.inspector_empty_label = ttk.Label(self.inspector_frame, text="Ningún objeto seleccionado")
+        self.inspector_empty_label.pack(pady=10)
+
+    def setup_project_browser(self):
+        """Árbol y barra del navegador de proyectos; no hacen falta hasta que se abre un proyecto"""
+        self.browser_placeholder.destroy()
+        browser_frame = self.browser_frame
+        
+        browser_toolbar = ttk.Frame(browser_frame)
+        browser_toolbar.pack(fill=tk.X)
+        self.path_label = ttk.Label(browser_toolbar, text="")
+        self.path_label.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.browser_view_btn = ttk.Button(browser_toolbar, text="Cuadrícula", width=10,
+                                           command=self.toggle_browser_view)
+        self.browser_view_btn.pack(side=tk.RIGHT)
+        
+        self.project_browser = ttk.Treeview(browser_frame, show="tree")
+        self.project_browser.pack(fill=tk.BOTH, expand=True)
+        self.project_browser.bind("<Double-1>", self.project_browser_double_click)
+        self.project_browser.bind("<<TreeviewOpen>>",
+                                  lambda e: self.expand_tree_node(self.project_browser, self.project_browser.focus()))
+        self.project_browser.bind("<Button-3>", self.project_browser_right_click)
 
     def setup_menu(self):
         menubar = tk.Menu(self.root)
@@ -186,9 +3690,42 @@ class SparEngineEditor:
             label="Cambiar color de fondo",
             command=self.change_pygame_bg_color
         )
+        pygame_menu.add_checkbutton(label="Grabar entrada al jugar", variable=self.record_input)
+        pygame_menu.add_command(label="Exportar juego...", command=self.export_project)
+        
+        # Menú de selección (operaciones en bloque)
+        selection_menu = tk.Menu(menubar, tearoff=0)
+        selection_menu.add_command(label="Seleccionar todo", command=self.select_all)
+        selection_menu.add_separator()
+        selection_menu.add_command(label="Mover selección...", command=self.ask_move_selection)
+        selection_menu.add_command(label="Rotar selección...", command=self.ask_rotate_selection)
+        selection_menu.add_command(label="Escalar selección...", command=self.ask_scale_selection)
+        selection_menu.add_separator()
+        selection_menu.add_command(label="Duplicar selección", command=self.duplicate_selection)
+        selection_menu.add_command(label="Eliminar selección", command=self.delete_selection)
+        selection_menu.add_command(label="Emparentar selección al objeto activo", command=self.parent_selection_to_active)
+        selection_menu.add_command(label="Quitar padre a la selección", command=self.unparent_selection)
         
         menubar.add_cascade(label="Temas", menu=theme_menu)
         menubar.add_cascade(label="Pygame", menu=pygame_menu)
+        menubar.add_cascade(label="Selección", menu=selection_menu)
+        
+        # Menú de vista del editor
+        view_menu = tk.Menu(menubar, tearoff=0)
+        self.viewport_mode_var = tk.StringVar(value=self.viewport_mode)
+        view_menu.add_radiobutton(label="Viewport: un item por objeto", value="canvas",
+                                  variable=self.viewport_mode_var,
+                                  command=lambda: self.set_viewport_mode("canvas"))
+        view_menu.add_radiobutton(label="Viewport: imagen compuesta", value="composite",
+                                  variable=self.viewport_mode_var,
+                                  command=lambda: self.set_viewport_mode("composite"))
+        view_menu.add_separator()
+        view_menu.add_command(label="Restablecer zoom", command=self.reset_zoom)
+        view_menu.add_separator()
+        view_menu.add_command(label="Assets sin usar...", command=self.show_unused_assets)
+        view_menu.add_command(label="Memoria...", command=self.show_memory_panel)
+        view_menu.add_command(label="Tiempos de arranque...", command=self.show_startup_timings)
+        menubar.add_cascade(label="Vista", menu=view_menu)
         
         self.root.config(menu=menubar)
     
@@ -232,159 +3769,840 @@ class SparEngineEditor:
         # Actualizar otros widgets que necesiten cambios específicos
         self.scene_canvas.configure(bg=theme["canvas_bg"])
     
+    def get_selected_object(self):
+        if self.selected_object_index is not None and self.selected_object_index < len(self.objects):
+            return self.objects[self.selected_object_index]
+        return None
+
     def setup_inspector(self):
-        # Limpiar el inspector
-        for widget in self.inspector_frame.winfo_children():
-            widget.destroy()
+        """Muestra el panel del tipo del objeto seleccionado reutilizando sus widgets"""
+        obj = self.get_selected_object()
+        panel = self.get_inspector_panel(obj["type"]) if obj else None
+        
+        # Cambiar de panel solo si cambia el tipo de objeto
+        if panel is not self.active_inspector_panel:
+            if self.active_inspector_panel:
+                self.active_inspector_panel.frame.pack_forget()
+            else:
+                self.inspector_empty_label.pack_forget()
+            
+            if panel:
+                panel.frame.pack(fill=tk.BOTH, expand=True)
+            else:
+                self.inspector_empty_label.pack(pady=10)
+            self.active_inspector_panel = panel
+        
+        if panel:
+            panel.bind(obj)
+
+    def get_inspector_panel(self, obj_type):
+        """Devuelve el panel del inspector para obj_type, construyéndolo la primera vez"""
+        if obj_type not in self.inspector_panels:
+            panel = InspectorPanel(self.inspector_frame)
+            self.build_transform_section(panel)
+            self.build_render_section(panel)
+            
+            # Propiedades específicas del tipo de objeto
+            if obj_type == "Sprite2D":
+                self.build_sprite_section(panel)
+            elif obj_type == "AnimatedSprite2D":
+                self.build_animation_section(panel)
+            elif obj_type == "Tilemap":
+                self.build_tilemap_section(panel)
+            elif obj_type == "ParticleEmitter":
+                self.build_particle_section(panel)
+            self.build_collider_section(panel)
+            
+            self.inspector_panels[obj_type] = panel
+        return self.inspector_panels[obj_type]
+
+    def reset_inspector_panels(self):
+        """Destruye los paneles del inspector liberando sus traces"""
+        for panel in self.inspector_panels.values():
+            panel.destroy()
+        self.inspector_panels = {}
+        self.active_inspector_panel = None
+        self.inspector_empty_label.pack(pady=10)
+
+    def build_transform_section(self, panel):
+        # Nombre del objeto
+        name_frame = ttk.Frame(panel.frame)
+        name_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(name_frame, text="Nombre:").pack(side=tk.LEFT)
+        name_var = tk.StringVar()
+        name_entry = ttk.Entry(name_frame, textvariable=name_var)
+        name_entry.pack(side=tk.RIGHT, expand=True, fill=tk.X)
+        name_entry.bind("<FocusOut>", lambda e: self.update_object_name(name_var.get()))
+        panel.add_field("name", name_var, "")
+        
+        # Prefab de origen (solo visible en instancias)
+        prefab_frame = ttk.Frame(panel.frame)
+        prefab_label = ttk.Label(prefab_frame)
+        prefab_label.pack(side=tk.LEFT)
+        ttk.Button(prefab_frame, text="Desvincular", command=self.unlink_prefab).pack(side=tk.RIGHT)
+        ttk.Button(prefab_frame, text="Aplicar al Prefab", command=self.apply_to_prefab).pack(side=tk.RIGHT)
+        
+        def bind_prefab(obj):
+            if obj.get("prefab"):
+                prefab_label.config(text=f"Prefab: {obj['prefab']}")
+                prefab_frame.pack(fill=tk.X, pady=2, after=name_frame)
+            else:
+                prefab_frame.pack_forget()
+        
+        panel.binders.append(bind_prefab)
+        
+        # Transformación
+        transform_frame = ttk.LabelFrame(panel.frame, text="Transformación")
+        transform_frame.pack(fill=tk.X, pady=5, padx=5)
+        
+        # Posición
+        pos_frame = ttk.Frame(transform_frame)
+        pos_frame.pack(fill=tk.X, pady=2)
+        ttk.Label(pos_frame, text="Posición:").pack(side=tk.LEFT)
+        
+        pos_x_var = tk.DoubleVar()
+        pos_y_var = tk.DoubleVar()
+        update_position = lambda: self.update_object_position(pos_x_var.get(), pos_y_var.get())
+        
+        ttk.Label(pos_frame, text="X").pack(side=tk.LEFT)
+        ttk.Spinbox(pos_frame, from_=-10000, to=10000, textvariable=pos_x_var, width=8,
+                   command=update_position).pack(side=tk.LEFT, padx=2)
+        ttk.Label(pos_frame, text="Y").pack(side=tk.LEFT)
+        ttk.Spinbox(pos_frame, from_=-10000, to=10000, textvariable=pos_y_var, width=8,
+                   command=update_position).pack(side=tk.LEFT, padx=2)
+        
+        panel.add_field("x", pos_x_var, 0, update_position)
+        panel.add_field("y", pos_y_var, 0, update_position)
+        
+        # Rotación
+        rot_frame = ttk.Frame(transform_frame)
+        rot_frame.pack(fill=tk.X, pady=2)
+        ttk.Label(rot_frame, text="Rotación:").pack(side=tk.LEFT)
+        
+        rot_var = tk.DoubleVar()
+        update_rotation = lambda: self.update_object_rotation(rot_var.get())
+        ttk.Spinbox(rot_frame, from_=0, to=360, textvariable=rot_var, width=8,
+                   command=update_rotation).pack(side=tk.RIGHT)
+        panel.add_field("rotation", rot_var, 0, update_rotation)
+        
+        # Escala
+        scale_frame = ttk.Frame(transform_frame)
+        scale_frame.pack(fill=tk.X, pady=2)
+        ttk.Label(scale_frame, text="Escala:").pack(side=tk.LEFT)
+        
+        scale_x_var = tk.DoubleVar()
+        scale_y_var = tk.DoubleVar()
+        update_scale = lambda: self.update_object_scale(scale_x_var.get(), scale_y_var.get())
+        
+        ttk.Label(scale_frame, text="X").pack(side=tk.LEFT)
+        ttk.Spinbox(scale_frame, from_=0.1, to=10, increment=0.1, textvariable=scale_x_var, width=6,
+                   command=update_scale).pack(side=tk.LEFT, padx=2)
+        ttk.Label(scale_frame, text="Y").pack(side=tk.LEFT)
+        ttk.Spinbox(scale_frame, from_=0.1, to=10, increment=0.1, textvariable=scale_y_var, width=6,
+                   command=update_scale).pack(side=tk.LEFT, padx=2)
+        
+        panel.add_field("scale_x", scale_x_var, 1, update_scale)
+        panel.add_field("scale_y", scale_y_var, 1, update_scale)
+        
+        # Parenting
+        parent_frame = ttk.Frame(transform_frame)
+        parent_frame.pack(fill=tk.X, pady=5)
+        
+        ttk.Button(parent_frame, text="Establecer como Padre", 
+                  command=self.start_parenting).pack(side=tk.LEFT, fill=tk.X, expand=True)
+        ttk.Button(parent_frame, text="Quitar Parent", 
+                  command=self.remove_parenting).pack(side=tk.RIGHT, fill=tk.X, expand=True)
+        
+        # Mostrar padre actual
+        parent_label = ttk.Label(transform_frame)
+        
+        def bind_parent(obj):
+            if obj.get("parent"):
+                parent_label.config(text=f"Padre: {obj['parent']}")
+                parent_label.pack()
+            else:
+                parent_label.pack_forget()
+        
+        panel.binders.append(bind_parent)
+
+    def build_render_section(self, panel):
+        render_frame = ttk.LabelFrame(panel.frame, text="Render")
+        render_frame.pack(fill=tk.X, pady=5, padx=5)
+        
+        # Capa y orden dentro de la capa (se dibuja de menor a mayor)
+        order_frame = ttk.Frame(render_frame)
+        order_frame.pack(fill=tk.X, pady=2)
+        ttk.Label(order_frame, text="Capa:").pack(side=tk.LEFT)
+        layer_var = tk.IntVar()
+        ttk.Spinbox(order_frame, from_=-100, to=100, textvariable=layer_var, width=5).pack(side=tk.LEFT, padx=2)
+        ttk.Label(order_frame, text="Z:").pack(side=tk.LEFT)
+        z_var = tk.IntVar()
+        ttk.Spinbox(order_frame, from_=-10000, to=10000, textvariable=z_var, width=6).pack(side=tk.LEFT, padx=2)
+        
+        # Ajuste de toda la capa: sus objetos se componen una vez en una superficie al jugar
+        static_var = tk.BooleanVar()
+        ttk.Checkbutton(render_frame, text="Capa estática", variable=static_var,
+                        command=lambda: self.set_layer_static(int(layer_var.get()), static_var.get())
+                        ).pack(anchor=tk.W, pady=2)
+        
+        # Parallax de la capa respecto a la cámara (1 la sigue, 0 queda fija en pantalla)
+        parallax_frame = ttk.Frame(render_frame)
+        parallax_frame.pack(fill=tk.X, pady=2)
+        ttk.Label(parallax_frame, text="Parallax:").pack(side=tk.LEFT)
+        parallax_x_var = tk.DoubleVar(value=1.0)
+        parallax_y_var = tk.DoubleVar(value=1.0)
         
-        if self.selected_object_index is None:
-            ttk.Label(self.inspector_frame, text="Ningún objeto seleccionado").pack(pady=10)
+        def update_parallax():
+            try:
+                self.set_layer_parallax(int(layer_var.get()), parallax_x_var.get(), parallax_y_var.get())
+            except tk.TclError:
+                pass  # Valor a medio escribir
+        
+        ttk.Label(parallax_frame, text="X").pack(side=tk.LEFT)
+        parallax_x = ttk.Spinbox(parallax_frame, from_=0, to=2, increment=0.1, textvariable=parallax_x_var,
+                                 width=5, command=update_parallax)
+        parallax_x.pack(side=tk.LEFT, padx=2)
+        ttk.Label(parallax_frame, text="Y").pack(side=tk.LEFT)
+        parallax_y = ttk.Spinbox(parallax_frame, from_=0, to=2, increment=0.1, textvariable=parallax_y_var,
+                                 width=5, command=update_parallax)
+        parallax_y.pack(side=tk.LEFT, padx=2)
+        for spinbox in (parallax_x, parallax_y):
+            spinbox.bind("<Return>", lambda e: update_parallax())
+            spinbox.bind("<FocusOut>", lambda e: update_parallax())
+        
+        def bind_layer_settings(layer):
+            static_var.set(self.layer_is_static(layer))
+            parallax_x_var.set(self.layer_parallax(layer)[0])
+            parallax_y_var.set(self.layer_parallax(layer)[1])
+        
+        def update_layer():
+            self.update_selected_fields(layer=int(layer_var.get()))
+            bind_layer_settings(int(layer_var.get()))
+        
+        panel.add_field("layer", layer_var, 0, update_layer)
+        panel.add_field("z", z_var, 0, lambda: self.update_selected_fields(z=int(z_var.get())))
+        panel.binders.append(lambda obj: bind_layer_settings(obj.get("layer", 0)))
+
+    def layer_is_static(self, layer):
+        return self.layer_settings.get(str(layer), {}).get("static", False)
+
+    def layer_parallax(self, layer):
+        return tuple(self.layer_settings.get(str(layer), {}).get("parallax", (1.0, 1.0)))
+
+    def set_layer_static(self, layer, static):
+        self.set_layer_setting(layer, "static", True if static else None)
+
+    def set_layer_parallax(self, layer, parallax_x, parallax_y):
+        parallax = [float(parallax_x), float(parallax_y)]
+        if tuple(parallax) == self.layer_parallax(layer):
             return
+        self.set_layer_setting(layer, "parallax", None if parallax == [1.0, 1.0] else parallax)
+
+    def set_layer_setting(self, layer, key, value):
+        """Cambia un ajuste de la capa; None vuelve al valor por defecto"""
+        settings = self.layer_settings.setdefault(str(layer), {})
+        if value is not None:
+            settings[key] = value
+        else:
+            settings.pop(key, None)
+            if not settings:
+                del self.layer_settings[str(layer)]
+        self.save_project_config()
+
+    def build_sprite_section(self, panel):
+        sprite_frame = ttk.LabelFrame(panel.frame, text="Sprite")
+        sprite_frame.pack(fill=tk.X, pady=5, padx=5)
+        
+        # Imagen previa (solo se vuelve a pedir si cambia el sprite)
+        img_label = ttk.Label(sprite_frame)
+        img_label.pack()
+        panel.shown_sprite = None
+        
+        def bind_sprite(obj):
+            sprite = obj.get("sprite")
+            if sprite == panel.shown_sprite:
+                return
+            panel.shown_sprite = sprite
+            img_label.configure(image="", text="")
+            img_label.image = None
+            
+            if not sprite or not os.path.exists(os.path.join(self.project_path, sprite)):
+                return
+            img_label.configure(text="Cargando...")
+            
+            def show_thumbnail(photo):
+                if photo is not None and panel.shown_sprite == sprite and img_label.winfo_exists():
+                    img_label.configure(image=photo, text="")
+                    img_label.image = photo  # Guardar referencia
+            
+            # La miniatura se genera en segundo plano; si ya está en caché se muestra al momento
+            thumb_path = self.asset_store.variant_path(sprite, "thumb")
+            self.thumbnail_cache.request(thumb_path or os.path.join(self.project_path, sprite), show_thumbnail)
+        
+        panel.binders.append(bind_sprite)
+        
+        ttk.Button(sprite_frame, text="Cambiar Sprite", 
+                  command=lambda: self.change_sprite(self.selected_object_index)).pack(fill=tk.X)
+        
+        # Opacidad
+        opacity_frame = ttk.Frame(sprite_frame)
+        opacity_frame.pack(fill=tk.X, pady=2)
+        ttk.Label(opacity_frame, text="Opacidad:").pack(side=tk.LEFT)
+        
+        opacity_var = tk.DoubleVar()
+        ttk.Scale(opacity_frame, from_=0, to=1, variable=opacity_var).pack(side=tk.RIGHT, fill=tk.X, expand=True)
+        panel.add_field("opacity", opacity_var, 1.0, lambda: self.update_object_opacity(opacity_var.get()))
+        
+        # Rotaciones pre-renderizadas para sprites que giran continuamente
+        bake_frame = ttk.Frame(sprite_frame)
+        bake_frame.pack(fill=tk.X, pady=2)
+        bake_var = tk.BooleanVar()
+        ttk.Checkbutton(bake_frame, text="Pre-renderizar rotaciones", variable=bake_var).pack(side=tk.LEFT)
+        panel.add_field("rotation_bake", bake_var, False,
+                        lambda: self.update_selected_fields(rotation_bake=bake_var.get()))
+        
+        bake_options = ttk.Frame(sprite_frame)
+        bake_options.pack(fill=tk.X, pady=2)
+        ttk.Label(bake_options, text="Paso (°):").pack(side=tk.LEFT)
+        bake_step_var = tk.DoubleVar()
+        ttk.Spinbox(bake_options, from_=RotationBaker.MIN_STEP, to=45, increment=0.5, textvariable=bake_step_var,
+                    width=6).pack(side=tk.LEFT, padx=2)
+        panel.add_field("rotation_bake_step", bake_step_var, RotationBaker.DEFAULT_STEP,
+                        lambda: self.update_selected_fields(rotation_bake_step=float(bake_step_var.get())))
+        bake_bg_var = tk.BooleanVar()
+        ttk.Checkbutton(bake_options, text="En segundo plano", variable=bake_bg_var).pack(side=tk.LEFT)
+        panel.add_field("rotation_bake_background", bake_bg_var, True,
+                        lambda: self.update_selected_fields(rotation_bake_background=bake_bg_var.get()))
+        
+    def build_animation_section(self, panel):
+        animation_frame = ttk.LabelFrame(panel.frame, text="Animación")
+        animation_frame.pack(fill=tk.X, pady=5, padx=5)
+        
+        # Vista previa: los fotogramas del clip se recortan una vez de la hoja y se van alternando
+        preview_label = ttk.Label(animation_frame)
+        preview_label.pack()
+        preview = {"key": None, "photos": [], "index": 0, "after": None}
+        
+        ttk.Button(animation_frame, text="Cambiar Hoja", command=self.change_sprite_sheet).pack(fill=tk.X)
+        
+        # Tamaño de los fotogramas y corte de la hoja en cuadrícula
+        size_frame = ttk.Frame(animation_frame)
+        size_frame.pack(fill=tk.X, pady=2)
+        ttk.Label(size_frame, text="Fotograma:").pack(side=tk.LEFT)
+        frame_width_var = tk.IntVar()
+        frame_height_var = tk.IntVar()
+        ttk.Label(size_frame, text="W").pack(side=tk.LEFT)
+        ttk.Spinbox(size_frame, from_=1, to=4096, textvariable=frame_width_var, width=5).pack(side=tk.LEFT, padx=2)
+        ttk.Label(size_frame, text="H").pack(side=tk.LEFT)
+        ttk.Spinbox(size_frame, from_=1, to=4096, textvariable=frame_height_var, width=5).pack(side=tk.LEFT, padx=2)
+        panel.add_field("frame_width", frame_width_var, Tilemap.DEFAULT_TILE_SIZE,
+                        lambda: self.update_selected_fields(frame_width=max(1, int(frame_width_var.get()))))
+        panel.add_field("frame_height", frame_height_var, Tilemap.DEFAULT_TILE_SIZE,
+                        lambda: self.update_selected_fields(frame_height=max(1, int(frame_height_var.get()))))
+        
+        count_label = ttk.Label(animation_frame)
+        
+        def slice_sheet():
+            obj = self.get_selected_object()
+            sheet = self.get_tileset_image(obj.get("sheet")) if obj else None
+            if sheet is None:
+                return
+            frames = AnimatedSprite.grid(sheet.width, sheet.height, obj.get("frame_width", Tilemap.DEFAULT_TILE_SIZE),
+                                         obj.get("frame_height", Tilemap.DEFAULT_TILE_SIZE))
+            edit_and_rebind(obj, frames=frames)
+        
+        ttk.Button(size_frame, text="Cortar", command=slice_sheet).pack(side=tk.LEFT, padx=2)
+        count_label.pack(anchor=tk.W)
+        
+        # Clips con nombre; el elegido es el que suena al empezar
+        clip_frame = ttk.Frame(animation_frame)
+        clip_frame.pack(fill=tk.X, pady=2)
+        ttk.Label(clip_frame, text="Clip:").pack(side=tk.LEFT)
+        clip_var = tk.StringVar()
+        clip_combo = ttk.Combobox(clip_frame, textvariable=clip_var, state="readonly", width=12)
+        clip_combo.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=2)
+        
+        def edit_and_rebind(obj, **fields):
+            # Los cambios se aplican al vaciar la cola de ediciones; luego se refresca el panel
+            self.queue_property_edit(obj, **fields)
+            self.root.after_idle(lambda: panel.obj is obj and panel.bind(obj))
+        
+        def select_clip(event=None):
+            obj = self.get_selected_object()
+            if obj is not None:
+                edit_and_rebind(obj, clip=clip_var.get())
+        
+        def add_clip():
+            obj = self.get_selected_object()
+            name = simpledialog.askstring("Nuevo Clip", "Nombre del clip:")
+            if obj is None or not name or name in obj.get("clips", {}):
+                return
+            clips = dict(obj.get("clips", {}))
+            clips[name] = {"frames": [0], "fps": AnimatedSprite.DEFAULT_FPS, "loop": True}
+            edit_and_rebind(obj, clips=clips, clip=name)
+        
+        def remove_clip():
+            obj = self.get_selected_object()
+            if obj is None or obj.get("clip") not in obj.get("clips", {}):
+                return
+            clips = dict(obj["clips"])
+            del clips[obj["clip"]]
+            edit_and_rebind(obj, clips=clips, clip=next(iter(clips), None))
+        
+        clip_combo.bind("<<ComboboxSelected>>", select_clip)
+        ttk.Button(clip_frame, text="+", width=2, command=add_clip).pack(side=tk.LEFT)
+        ttk.Button(clip_frame, text="−", width=2, command=remove_clip).pack(side=tk.LEFT)
+        
+        # Fotogramas, velocidad y loop del clip elegido
+        clip_frames_var = tk.StringVar()
+        fps_var = tk.DoubleVar()
+        loop_var = tk.BooleanVar()
+        
+        def update_clip(event=None):
+            obj = self.get_selected_object()
+            if obj is None or obj.get("clip") not in obj.get("clips", {}):
+                return
+            try:
+                clip = {"frames": AnimatedSprite.parse_frames(clip_frames_var.get()),
+                        "fps": float(fps_var.get()), "loop": loop_var.get()}
+            except (tk.TclError, ValueError):
+                return
+            if clip != obj["clips"][obj["clip"]]:
+                clips = dict(obj["clips"])
+                clips[obj["clip"]] = clip
+                edit_and_rebind(obj, clips=clips)
+        
+        frames_row = ttk.Frame(animation_frame)
+        frames_row.pack(fill=tk.X, pady=2)
+        ttk.Label(frames_row, text="Fotogramas:").pack(side=tk.LEFT)
+        frames_entry = ttk.Entry(frames_row, textvariable=clip_frames_var)
+        frames_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=2)
+        
+        fps_row = ttk.Frame(animation_frame)
+        fps_row.pack(fill=tk.X, pady=2)
+        ttk.Label(fps_row, text="FPS:").pack(side=tk.LEFT)
+        fps_spinbox = ttk.Spinbox(fps_row, from_=0.5, to=120, increment=1, textvariable=fps_var, width=6,
+                                  command=update_clip)
+        fps_spinbox.pack(side=tk.LEFT, padx=2)
+        ttk.Checkbutton(fps_row, text="Loop", variable=loop_var, command=update_clip).pack(side=tk.LEFT)
+        for widget in (frames_entry, fps_spinbox):
+            widget.bind("<Return>", update_clip)
+            widget.bind("<FocusOut>", update_clip)
+        
+        playing_var = tk.BooleanVar()
+        ttk.Checkbutton(animation_frame, text="Reproducir al iniciar", variable=playing_var).pack(anchor=tk.W)
+        panel.add_field("playing", playing_var, True, lambda: self.update_selected_fields(playing=playing_var.get()))
+        
+        # Opacidad
+        opacity_frame = ttk.Frame(animation_frame)
+        opacity_frame.pack(fill=tk.X, pady=2)
+        ttk.Label(opacity_frame, text="Opacidad:").pack(side=tk.LEFT)
+        opacity_var = tk.DoubleVar()
+        ttk.Scale(opacity_frame, from_=0, to=1, variable=opacity_var).pack(side=tk.RIGHT, fill=tk.X, expand=True)
+        panel.add_field("opacity", opacity_var, 1.0, lambda: self.update_object_opacity(opacity_var.get()))
+        
+        preview_var = tk.BooleanVar()
+        
+        def show_preview_frame():
+            if preview["photos"]:
+                photo = preview["photos"][preview["index"] % len(preview["photos"])]
+                preview_label.configure(image=photo)
+                preview_label.image = photo  # Guardar referencia
+            else:
+                preview_label.configure(image="")
+                preview_label.image = None
+        
+        def animate_preview():
+            preview["after"] = None
+            obj = panel.obj
+            if not preview_var.get() or obj is None or self.active_inspector_panel is not panel \
+                    or not preview_label.winfo_exists():
+                return
+            preview["index"] += 1
+            show_preview_frame()
+            fps = obj.get("clips", {}).get(obj.get("clip"), {}).get("fps", AnimatedSprite.DEFAULT_FPS)
+            preview["after"] = self.root.after(max(16, int(1000 / max(fps, 0.1))), animate_preview)
+        
+        def toggle_preview():
+            if preview["after"] is not None:
+                self.root.after_cancel(preview["after"])
+                preview["after"] = None
+            preview["index"] = 0
+            show_preview_frame()
+            if preview_var.get():
+                animate_preview()
+        
+        ttk.Checkbutton(animation_frame, text="Vista previa", variable=preview_var,
+                        command=toggle_preview).pack(anchor=tk.W)
+        
+        def bind_animation(obj):
+            clips = obj.get("clips", {})
+            clip_combo["values"] = list(clips)
+            clip_var.set(obj.get("clip") or "")
+            clip = clips.get(obj.get("clip"), {})
+            clip_frames_var.set(AnimatedSprite.format_frames(clip.get("frames", [])))
+            fps_var.set(clip.get("fps", AnimatedSprite.DEFAULT_FPS))
+            loop_var.set(clip.get("loop", True))
+            count_label.configure(text=f"{len(obj.get('frames', []))} fotogramas")
             
-        obj = self.objects[self.selected_object_index]
+            # Recortar los fotogramas del clip solo si cambió la hoja o el clip
+            rects = obj.get("frames") or []
+            indices = [i for i in clip.get("frames", []) if 0 <= i < len(rects)] or list(range(len(rects)))
+            key = (obj.get("sheet"), tuple(tuple(rects[i]) for i in indices))
+            if key != preview["key"]:
+                preview["key"] = key
+                preview["photos"] = []
+                preview["index"] = 0
+                sheet = self.get_tileset_image(obj.get("sheet"))
+                if sheet is not None:
+                    for x, y, width, height in key[1]:
+                        scale = min(4.0, 96 / max(width, height))
+                        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+                        frame = sheet.crop((x, y, x + width, y + height)).resize(size, Image.Resampling.NEAREST)
+                        preview["photos"].append(ImageTk.PhotoImage(frame))
+                show_preview_frame()
+        
+        panel.binders.append(bind_animation)
+
+    def build_tilemap_section(self, panel):
+        tilemap_frame = ttk.LabelFrame(panel.frame, text="Tilemap")
+        tilemap_frame.pack(fill=tk.X, pady=5, padx=5)
+        
+        ttk.Button(tilemap_frame, text="Cambiar Tileset", command=self.change_tileset).pack(fill=tk.X)
+        
+        # Tamaño de cada tile en píxeles
+        tile_frame = ttk.Frame(tilemap_frame)
+        tile_frame.pack(fill=tk.X, pady=2)
+        ttk.Label(tile_frame, text="Tile:").pack(side=tk.LEFT)
+        tile_width_var = tk.IntVar()
+        tile_height_var = tk.IntVar()
+        ttk.Label(tile_frame, text="W").pack(side=tk.LEFT)
+        ttk.Spinbox(tile_frame, from_=1, to=1024, textvariable=tile_width_var, width=5).pack(side=tk.LEFT, padx=2)
+        ttk.Label(tile_frame, text="H").pack(side=tk.LEFT)
+        ttk.Spinbox(tile_frame, from_=1, to=1024, textvariable=tile_height_var, width=5).pack(side=tk.LEFT, padx=2)
+        panel.add_field("tile_width", tile_width_var, Tilemap.DEFAULT_TILE_SIZE,
+                        lambda: self.update_selected_fields(tile_width=max(1, int(tile_width_var.get()))))
+        panel.add_field("tile_height", tile_height_var, Tilemap.DEFAULT_TILE_SIZE,
+                        lambda: self.update_selected_fields(tile_height=max(1, int(tile_height_var.get()))))
+        
+        # Tamaño del mapa en tiles
+        map_frame = ttk.Frame(tilemap_frame)
+        map_frame.pack(fill=tk.X, pady=2)
+        ttk.Label(map_frame, text="Mapa:").pack(side=tk.LEFT)
+        columns_var = tk.IntVar()
+        rows_var = tk.IntVar()
+        resize_map = lambda: self.resize_tilemap(int(columns_var.get()), int(rows_var.get()))
+        ttk.Spinbox(map_frame, from_=1, to=4096, textvariable=columns_var, width=5).pack(side=tk.LEFT, padx=2)
+        ttk.Label(map_frame, text="x").pack(side=tk.LEFT)
+        ttk.Spinbox(map_frame, from_=1, to=4096, textvariable=rows_var, width=5).pack(side=tk.LEFT, padx=2)
+        panel.add_field("map_width", columns_var, Tilemap.DEFAULT_MAP_SIZE, resize_map)
+        panel.add_field("map_height", rows_var, Tilemap.DEFAULT_MAP_SIZE, resize_map)
+        
+        # Modo pintura y goma
+        paint_frame = ttk.Frame(tilemap_frame)
+        paint_frame.pack(fill=tk.X, pady=2)
+        paint_var = tk.BooleanVar(value=self.tile_paint_mode)
+        erase_var = tk.BooleanVar()
+        
+        def toggle_paint():
+            self.tile_paint_mode = paint_var.get()
+            self.scene_canvas.config(cursor="pencil" if self.tile_paint_mode else "")
+        
+        def toggle_erase():
+            self.paint_tile = -1 if erase_var.get() else max(0, palette.selected)
+            draw_palette_selection()
+        
+        ttk.Checkbutton(paint_frame, text="Modo pintura", variable=paint_var,
+                        command=toggle_paint).pack(side=tk.LEFT)
+        ttk.Checkbutton(paint_frame, text="Goma", variable=erase_var, command=toggle_erase).pack(side=tk.LEFT)
+        
+        # Paleta: el tileset reducido al ancho del inspector; un clic elige el tile
+        palette = tk.Canvas(tilemap_frame, width=200, height=100, highlightthickness=0,
+                            bg=self.themes[self.current_theme]["canvas_bg"])
+        palette.pack(fill=tk.X, pady=2)
+        palette.selected = 0
+        palette.shown = None
+        palette.scale = 1
         
-        # Nombre del objeto
-        name_frame = ttk.Frame(self.inspector_frame)
-        name_frame.pack(fill=tk.X, pady=5)
-        ttk.Label(name_frame, text="Nombre:").pack(side=tk.LEFT)
-        name_var = tk.StringVar(value=obj["name"])
-        name_entry = ttk.Entry(name_frame, textvariable=name_var)
-        name_entry.pack(side=tk.RIGHT, expand=True, fill=tk.X)
-        name_entry.bind("<FocusOut>", lambda e: self.update_object_name(name_var.get()))
+        def draw_palette_selection():
+            palette.delete("selected")
+            obj = self.get_selected_object()
+            tileset = self.get_tileset_image(obj.get("tileset")) if obj else None
+            if tileset is None or erase_var.get():
+                return
+            tile_width, tile_height = Tilemap.tile_size(obj)
+            columns = max(1, tileset.width // tile_width)
+            left = (palette.selected % columns) * tile_width * palette.scale
+            top = (palette.selected // columns) * tile_height * palette.scale
+            palette.create_rectangle(left, top, left + tile_width * palette.scale, top + tile_height * palette.scale,
+                                     outline=self.themes[self.current_theme]["accent"], width=2, tags=("selected",))
         
-        # Transformación
-        transform_frame = ttk.LabelFrame(self.inspector_frame, text="Transformación")
-        transform_frame.pack(fill=tk.X, pady=5, padx=5)
+        def pick_tile(event):
+            obj = self.get_selected_object()
+            tileset = self.get_tileset_image(obj.get("tileset")) if obj else None
+            if tileset is None:
+                return
+            tile_width, tile_height = Tilemap.tile_size(obj)
+            columns = max(1, tileset.width // tile_width)
+            column = int(event.x / palette.scale // tile_width)
+            row = int(event.y / palette.scale // tile_height)
+            if column < columns and row < tileset.height // tile_height:
+                palette.selected = row * columns + column
+                erase_var.set(False)
+                self.paint_tile = palette.selected
+                draw_palette_selection()
         
-        # Posición
-        pos_frame = ttk.Frame(transform_frame)
-        pos_frame.pack(fill=tk.X, pady=2)
-        ttk.Label(pos_frame, text="Posición:").pack(side=tk.LEFT)
+        palette.bind("<Button-1>", pick_tile)
         
-        pos_x_var = tk.DoubleVar(value=obj["x"])
-        pos_y_var = tk.DoubleVar(value=obj["y"])
+        def bind_palette(obj):
+            shown = (obj.get("tileset"), Tilemap.tile_size(obj))
+            if shown != palette.shown:
+                palette.shown = shown
+                palette.delete("all")
+                palette.image = None
+                tileset = self.get_tileset_image(obj.get("tileset"))
+                if tileset is not None:
+                    palette.scale = min(2.0, 200 / tileset.width)
+                    size = (max(1, int(tileset.width * palette.scale)), max(1, int(tileset.height * palette.scale)))
+                    palette.image = ImageTk.PhotoImage(tileset.resize(size, Image.Resampling.NEAREST))
+                    palette.config(height=size[1])
+                    palette.create_image(0, 0, image=palette.image, anchor=tk.NW)
+            draw_palette_selection()
         
-        ttk.Label(pos_frame, text="X").pack(side=tk.LEFT)
-        ttk.Spinbox(pos_frame, from_=-10000, to=10000, textvariable=pos_x_var, width=8,
-                   command=lambda: self.update_object_position(pos_x_var.get(), pos_y_var.get())).pack(side=tk.LEFT, padx=2)
-        ttk.Label(pos_frame, text="Y").pack(side=tk.LEFT)
-        ttk.Spinbox(pos_frame, from_=-10000, to=10000, textvariable=pos_y_var, width=8,
-                   command=lambda: self.update_object_position(pos_x_var.get(), pos_y_var.get())).pack(side=tk.LEFT, padx=2)
+        panel.binders.append(bind_palette)
+
+    def build_particle_section(self, panel):
+        particle_frame = ttk.LabelFrame(panel.frame, text="Partículas")
+        particle_frame.pack(fill=tk.X, pady=5, padx=5)
         
-        pos_x_var.trace_add("write", lambda *_: self.update_object_position(pos_x_var.get(), pos_y_var.get()))
-        pos_y_var.trace_add("write", lambda *_: self.update_object_position(pos_x_var.get(), pos_y_var.get()))
+        # (campo, etiqueta, mínimo, máximo, incremento, tipo)
+        numeric_fields = [
+            ("emission_rate", "Emisión (/s):", 0, 100000, 10, float),
+            ("max_particles", "Máximo:", 1, 200000, 100, int),
+            ("particle_lifetime", "Vida (s):", 0.01, 60, 0.1, float),
+            ("particle_speed", "Velocidad:", 0, 10000, 10, float),
+            ("speed_variation", "Variación:", 0, 1, 0.05, float),
+            ("direction", "Dirección (°):", -360, 360, 5, float),
+            ("spread", "Apertura (°):", 0, 360, 5, float),
+            ("gravity", "Gravedad:", -10000, 10000, 10, float),
+            ("particle_size", "Tamaño:", 1, 64, 1, int),
+        ]
+        for field, label, low, high, step, kind in numeric_fields:
+            row = ttk.Frame(particle_frame)
+            row.pack(fill=tk.X, pady=1)
+            ttk.Label(row, text=label).pack(side=tk.LEFT)
+            var = tk.DoubleVar() if kind is float else tk.IntVar()
+            ttk.Spinbox(row, from_=low, to=high, increment=step, textvariable=var, width=8).pack(side=tk.RIGHT)
+            panel.add_field(field, var, ParticleSystem.DEFAULTS[field],
+                            lambda field=field, var=var, kind=kind: self.update_selected_fields(**{field: kind(var.get())}))
         
-        # Rotación
-        rot_frame = ttk.Frame(transform_frame)
-        rot_frame.pack(fill=tk.X, pady=2)
-        ttk.Label(rot_frame, text="Rotación:").pack(side=tk.LEFT)
+        # Colores inicial y final
+        color_frame = ttk.Frame(particle_frame)
+        color_frame.pack(fill=tk.X, pady=2)
+        color_buttons = {}
         
-        rot_var = tk.DoubleVar(value=obj.get("rotation", 0))
-        ttk.Spinbox(rot_frame, from_=0, to=360, textvariable=rot_var, width=8,
-                   command=lambda: self.update_object_rotation(rot_var.get())).pack(side=tk.RIGHT)
-        rot_var.trace_add("write", lambda *_: self.update_object_rotation(rot_var.get()))
+        def pick_color(field):
+            obj = self.get_selected_object()
+            if obj is None:
+                return
+            color = colorchooser.askcolor(color=ParticleSystem.param(obj, field), title="Color de las partículas")
+            if color[1]:
+                self.update_selected_fields(**{field: color[1]})
+                color_buttons[field].config(bg=color[1])
         
-        # Escala
-        scale_frame = ttk.Frame(transform_frame)
-        scale_frame.pack(fill=tk.X, pady=2)
-        ttk.Label(scale_frame, text="Escala:").pack(side=tk.LEFT)
+        for field, label in (("color_start", "Color inicial"), ("color_end", "Color final")):
+            color_buttons[field] = tk.Button(color_frame, text=label, command=lambda f=field: pick_color(f))
+            color_buttons[field].pack(side=tk.LEFT, expand=True, fill=tk.X, padx=2)
         
-        scale_x_var = tk.DoubleVar(value=obj.get("scale_x", 1))
-        scale_y_var = tk.DoubleVar(value=obj.get("scale_y", 1))
+        fade_var = tk.BooleanVar()
+        ttk.Checkbutton(particle_frame, text="Desvanecer", variable=fade_var).pack(anchor=tk.W)
+        panel.add_field("fade", fade_var, True, lambda: self.update_selected_fields(fade=fade_var.get()))
         
-        ttk.Label(scale_frame, text="X").pack(side=tk.LEFT)
-        ttk.Spinbox(scale_frame, from_=0.1, to=10, increment=0.1, textvariable=scale_x_var, width=6,
-                   command=lambda: self.update_object_scale(scale_x_var.get(), scale_y_var.get())).pack(side=tk.LEFT, padx=2)
-        ttk.Label(scale_frame, text="Y").pack(side=tk.LEFT)
-        ttk.Spinbox(scale_frame, from_=0.1, to=10, increment=0.1, textvariable=scale_y_var, width=6,
-                   command=lambda: self.update_object_scale(scale_x_var.get(), scale_y_var.get())).pack(side=tk.LEFT, padx=2)
+        # Vista previa en el viewport
+        preview_var = tk.BooleanVar()
+        ttk.Checkbutton(particle_frame, text="Vista previa", variable=preview_var,
+                        command=lambda: self.toggle_particle_preview(preview_var.get())).pack(anchor=tk.W)
         
-        scale_x_var.trace_add("write", lambda *_: self.update_object_scale(scale_x_var.get(), scale_y_var.get()))
-        scale_y_var.trace_add("write", lambda *_: self.update_object_scale(scale_x_var.get(), scale_y_var.get()))
+        def bind_particles(obj):
+            for field, button in color_buttons.items():
+                button.config(bg=ParticleSystem.param(obj, field))
+            preview_var.set(self.particle_preview is not None and self.particle_preview[0] is obj)
         
-        # Parenting
-        parent_frame = ttk.Frame(transform_frame)
-        parent_frame.pack(fill=tk.X, pady=5)
+        panel.binders.append(bind_particles)
+
+    def build_collider_section(self, panel):
+        collider_frame = ttk.LabelFrame(panel.frame, text="Collider")
+        collider_frame.pack(fill=tk.X, pady=5, padx=5)
         
-        ttk.Button(parent_frame, text="Establecer como Padre", 
-                  command=self.start_parenting).pack(side=tk.LEFT, fill=tk.X, expand=True)
-        ttk.Button(parent_frame, text="Quitar Parent", 
-                  command=self.remove_parenting).pack(side=tk.RIGHT, fill=tk.X, expand=True)
+        # Forma (en el objeto se guarda "", "aabb" o "circle")
+        shapes = {"Ninguno": "", "Caja": "aabb", "Círculo": "circle"}
+        shape_frame = ttk.Frame(collider_frame)
+        shape_frame.pack(fill=tk.X, pady=2)
+        ttk.Label(shape_frame, text="Forma:").pack(side=tk.LEFT)
+        shape_var = tk.StringVar()
+        shape_combo = ttk.Combobox(shape_frame, textvariable=shape_var, values=list(shapes),
+                                   state="readonly", width=10)
+        shape_combo.pack(side=tk.RIGHT)
         
-        # Mostrar padre actual
-        if "parent" in obj:
-            ttk.Label(transform_frame, text=f"Padre: {obj['parent']}").pack()
+        def select_shape(event):
+            self.update_selected_fields(collider=shapes[shape_var.get()])
+            show_shape_fields(shapes[shape_var.get()])
         
-        # Propiedades específicas del tipo de objeto
-        if obj["type"] == "Sprite2D":
-            self.setup_sprite_inspector(obj)
-            
-    def setup_sprite_inspector(self, obj):
-        sprite_frame = ttk.LabelFrame(self.inspector_frame, text="Sprite")
-        sprite_frame.pack(fill=tk.X, pady=5, padx=5)
+        shape_combo.bind("<<ComboboxSelected>>", select_shape)
         
-        # Mostrar imagen previa si existe
-        if obj.get("sprite"):
-            img_path = os.path.join(self.project_path, obj["sprite"])
-            if os.path.exists(img_path):
-                try:
-                    img = Image.open(img_path)
-                    img.thumbnail((100, 100))
-                    photo = ImageTk.PhotoImage(img)
-                    
-                    img_label = ttk.Label(sprite_frame, image=photo)
-                    img_label.image = photo  # Guardar referencia
-                    img_label.pack()
-                except:
-                    pass
+        # Tamaño (0 = tamaño del sprite)
+        size_frame = ttk.Frame(collider_frame)
+        ttk.Label(size_frame, text="Tamaño:").pack(side=tk.LEFT)
+        width_var = tk.DoubleVar()
+        height_var = tk.DoubleVar()
+        ttk.Label(size_frame, text="W").pack(side=tk.LEFT)
+        ttk.Spinbox(size_frame, from_=0, to=10000, textvariable=width_var, width=6).pack(side=tk.LEFT, padx=2)
+        ttk.Label(size_frame, text="H").pack(side=tk.LEFT)
+        ttk.Spinbox(size_frame, from_=0, to=10000, textvariable=height_var, width=6).pack(side=tk.LEFT, padx=2)
+        panel.add_field("collider_width", width_var, 0,
+                        lambda: self.update_selected_fields(collider_width=float(width_var.get())))
+        panel.add_field("collider_height", height_var, 0,
+                        lambda: self.update_selected_fields(collider_height=float(height_var.get())))
         
-        ttk.Button(sprite_frame, text="Cambiar Sprite", 
-                  command=lambda: self.change_sprite(self.selected_object_index)).pack(fill=tk.X)
+        radius_frame = ttk.Frame(collider_frame)
+        ttk.Label(radius_frame, text="Radio:").pack(side=tk.LEFT)
+        radius_var = tk.DoubleVar()
+        ttk.Spinbox(radius_frame, from_=0, to=10000, textvariable=radius_var, width=6).pack(side=tk.LEFT, padx=2)
+        panel.add_field("collider_radius", radius_var, 0,
+                        lambda: self.update_selected_fields(collider_radius=float(radius_var.get())))
         
-        # Opacidad
-        opacity_frame = ttk.Frame(sprite_frame)
-        opacity_frame.pack(fill=tk.X, pady=2)
-        ttk.Label(opacity_frame, text="Opacidad:").pack(side=tk.LEFT)
+        # Capa (0-15) y máscara de capas con las que colisiona
+        layer_frame = ttk.Frame(collider_frame)
+        ttk.Label(layer_frame, text="Capa:").pack(side=tk.LEFT)
+        layer_var = tk.IntVar()
+        ttk.Spinbox(layer_frame, from_=0, to=15, textvariable=layer_var, width=4).pack(side=tk.LEFT, padx=2)
+        ttk.Label(layer_frame, text="Máscara:").pack(side=tk.LEFT)
+        mask_var = tk.IntVar()
+        ttk.Spinbox(layer_frame, from_=0, to=CollisionWorld.ALL_LAYERS, textvariable=mask_var,
+                    width=7).pack(side=tk.LEFT, padx=2)
+        panel.add_field("collider_layer", layer_var, 0,
+                        lambda: self.update_selected_fields(collider_layer=int(layer_var.get())))
+        panel.add_field("collider_mask", mask_var, CollisionWorld.ALL_LAYERS,
+                        lambda: self.update_selected_fields(collider_mask=int(mask_var.get())))
         
-        opacity_var = tk.DoubleVar(value=obj.get("opacity", 1.0))
-        ttk.Scale(opacity_frame, from_=0, to=1, variable=opacity_var, 
-                 command=lambda v: self.update_object_opacity(float(v))).pack(side=tk.RIGHT, fill=tk.X, expand=True)
-        opacity_var.trace_add("write", lambda *_: self.update_object_opacity(opacity_var.get()))
+        def show_shape_fields(shape):
+            size_frame.pack_forget()
+            radius_frame.pack_forget()
+            layer_frame.pack_forget()
+            if shape == "aabb":
+                size_frame.pack(fill=tk.X, pady=2)
+            elif shape == "circle":
+                radius_frame.pack(fill=tk.X, pady=2)
+            if shape:
+                layer_frame.pack(fill=tk.X, pady=2)
         
+        def bind_collider(obj):
+            shape = obj.get("collider", "")
+            shape_var.set(next(label for label, value in shapes.items() if value == shape))
+            show_shape_fields(shape)
+        
+        panel.binders.append(bind_collider)
+
     def update_object_name(self, new_name):
         if self.selected_object_index is not None:
-            self.objects[self.selected_object_index]["name"] = new_name
-            self.save_scene()
+            obj = self.objects[self.selected_object_index]
+            old_name = obj["name"]
+            if new_name == old_name:
+                return
+            obj["name"] = new_name
+            
+            # Mantener a los hijos y la selección apuntando al nuevo nombre
+            for child in self.objects:
+                if child.get("parent") == old_name:
+                    child["parent"] = new_name
+            if old_name in self.selected_names:
+                self.selected_names.discard(old_name)
+                self.selected_names.add(new_name)
+            self.schedule_save()
             self.update_hierarchy()
             
     def update_object_position(self, x, y):
         if self.selected_object_index is not None:
             try:
-                self.objects[self.selected_object_index]["x"] = float(x)
-                self.objects[self.selected_object_index]["y"] = float(y)
-                self.save_scene()
-                self.draw_scene()
+                self.queue_property_edit(self.objects[self.selected_object_index], x=float(x), y=float(y))
             except ValueError:
                 pass
                 
     def update_object_rotation(self, rotation):
         if self.selected_object_index is not None:
-            self.objects[self.selected_object_index]["rotation"] = float(rotation)
-            self.save_scene()
-            self.draw_scene()
+            self.queue_property_edit(self.objects[self.selected_object_index], rotation=float(rotation))
             
     def update_object_scale(self, scale_x, scale_y):
         if self.selected_object_index is not None:
-            self.objects[self.selected_object_index]["scale_x"] = float(scale_x)
-            self.objects[self.selected_object_index]["scale_y"] = float(scale_y)
-            self.save_scene()
-            self.draw_scene()
+            self.queue_property_edit(self.objects[self.selected_object_index],
+                                     scale_x=float(scale_x), scale_y=float(scale_y))
             
     def update_object_opacity(self, opacity):
         if self.selected_object_index is not None:
-            self.objects[self.selected_object_index]["opacity"] = float(opacity)
+            self.queue_property_edit(self.objects[self.selected_object_index], opacity=float(opacity))
+
+    def update_selected_fields(self, **fields):
+        """Encola cambios de campos arbitrarios del objeto activo"""
+        obj = self.get_selected_object()
+        if obj is not None:
+            self.queue_property_edit(obj, **fields)
+
+    def queue_property_edit(self, obj, **fields):
+        """Acumula cambios de propiedades y los aplica juntos cuando Tk queda inactivo"""
+        pending = self.pending_edits.setdefault(id(obj), (obj, {}))
+        pending[1].update(fields)
+        if self.edit_flush_id is None:
+            self.edit_flush_id = self.root.after_idle(self.flush_property_edits)
+
+    def flush_property_edits(self):
+        """Aplica la transacción de ediciones pendientes: un redibujado parcial y un guardado diferido"""
+        self.edit_flush_id = None
+        if not self.pending_edits:
+            return
+        
+        edits, self.pending_edits = self.pending_edits, {}
+        for _, fields in edits.values():
+            if "tiles" in fields and not isinstance(fields["tiles"], str):
+                fields["tiles"] = Tilemap.encode(fields["tiles"])  # Array de un trazo de pintura
+        live = {id(obj) for obj in self.objects}
+        changed = []
+        for obj, fields in edits.values():
+            if id(obj) in live and any(obj.get(field) != value for field, value in fields.items()):
+                obj.update(fields)
+                changed.append(obj)
+        
+        if changed:
+            if any(field in ("layer", "z") for _, fields in edits.values() for field in fields):
+                # Cambia el orden de dibujo: hay que rehacer el canvas entero
+                self.draw_scene()
+            else:
+                self.redraw_objects(changed)
+            self.schedule_save()
+
+    def schedule_save(self):
+        """Programa un guardado de la escena, agrupando los que lleguen antes de que venza"""
+        if self.save_after_id is not None:
+            self.root.after_cancel(self.save_after_id)
+        self.save_after_id = self.root.after(self.SAVE_DELAY_MS, self.flush_pending_save)
+
+    def flush_pending_save(self):
+        """Aplica las ediciones pendientes y guarda ya si había un guardado programado"""
+        if self.edit_flush_id is not None:
+            self.root.after_cancel(self.edit_flush_id)
+            self.flush_property_edits()
+        if self.save_after_id is not None:
+            self.root.after_cancel(self.save_after_id)
+            self.save_after_id = None
             self.save_scene()
-            self.draw_scene()
+
+    def on_close(self):
+        self.flush_pending_save()
+        self.running_simulation = False
+        if self.game_player:
+            self.game_player.stop()
+        if self.compositor:
+            self.compositor.close()
+        self.root.destroy()
             
     def start_parenting(self):
         if self.selected_object_index is not None:
@@ -456,15 +4674,16 @@ class SparEngineEditor:
     def on_object_select(self, event):
         selection = self.hierarchy_tree.selection()
         if selection:
-            item = self.hierarchy_tree.item(selection[0])
-            obj_name = item["text"]
+            names = [self.hierarchy_tree.item(item, "text") for item in selection]
+            focus = self.hierarchy_tree.focus()
+            obj_name = self.hierarchy_tree.item(focus, "text") if focus in selection else names[0]
             
-            for i, obj in enumerate(self.objects):
-                if obj["name"] == obj_name:
-                    self.selected_object_index = i
-                    break
-                    
-            self.setup_inspector()
+            # Ignorar el evento que genera nuestra propia sincronización del árbol
+            active = self.get_selected_object()
+            if set(names) == self.selected_names and active and active["name"] == obj_name:
+                return
+            
+            self.set_selection(names, obj_name, sync_hierarchy=False)
             
             # Si estamos en modo parenting, completar la operación
             if self.parenting_target and self.parenting_target != obj_name:
@@ -474,50 +4693,96 @@ class SparEngineEditor:
         # Crear iconos por defecto para los objetos
         self.default_icons = {
             "EmptyObject": self.create_default_icon("#ffffff"),
-            "Sprite2D": self.create_default_icon("#888888")
+            "Sprite2D": self.create_default_icon("#888888"),
+            "AnimatedSprite2D": self.create_default_icon("#b388ff"),
+            "Tilemap": self.create_default_icon("#6fbf73"),
+            "ParticleEmitter": self.create_default_icon("#ffaa33")
         }
         
     def create_default_icon(self, color):
-        from PIL import Image, ImageDraw
-        img = Image.new("RGBA", (16, 16), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(img)
-        draw.rectangle([2, 2, 14, 14], fill=color)
-        return ImageTk.PhotoImage(img)
+        # Sin PIL: los iconos se crean durante el arranque
+        img = tk.PhotoImage(width=16, height=16)
+        img.put(color, to=(2, 2, 15, 15))
+        return img
         
     def select_project(self):
         path = filedialog.askdirectory(title="Seleccionar Carpeta de Proyecto")
         if path:
+            self.flush_pending_save()
             self.project_path = path
+            self.asset_store = AssetStore(path)
+            if self.compositor:
+                self.compositor.close()
+                self.compositor = None
+            if self.viewport_mode == "composite":
+                self.set_viewport_mode("composite")
+            if self.thumbnail_cache:
+                self.thumbnail_cache.close()
+            self.thumbnail_cache = ThumbnailCache(path)
+            if self.scene_cache:
+                self.scene_cache.close()
+            self.scene_cache = SceneCache()
+            self.browser_grid_path = path
+            self.selected_object_index = None
+            self.selected_names = set()
+            self.prefabs = PrefabLibrary()
+            self.reset_inspector_panels()
+            if self.project_browser is None:
+                self.setup_project_browser()
             self.load_project_files()
             self.load_project_config()
             self.path_label.config(text=path)
             
     def load_project_config(self):
-        config_path = os.path.join(self.project_path, "project_config.json")
-        if os.path.exists(config_path):
+        self.project_index = ProjectIndex(self.project_path)
+        self.scenes = {}
+        self.layer_settings = {}
+        self.current_scene = None
+        self.objects = []
+        rebuilt = not self.project_index.load()
+        if rebuilt:
+            # Sin índice válido: se reconstruye una vez leyendo la configuración y las escenas
+            config_path = os.path.join(self.project_path, "project_config.json")
+            if not os.path.exists(config_path):
+                return
             with open(config_path, "r") as f:
                 config = json.load(f)
-                self.scenes = config.get("scenes", {})
-                self.global_script = config.get("global_script")
-                
-                if self.scenes:
-                    self.scene_combo["values"] = list(self.scenes.keys())
-                    self.current_scene = list(self.scenes.keys())[0]
-                    self.scene_combo.set(self.current_scene)
-                    self.load_scene(self.current_scene)
+            self.project_index.rebuild(config, self.asset_store.manifest)
+        
+        index = self.project_index.data
+        # Los objetos de cada escena se leen al abrirla
+        self.scenes = {name: None for name in self.project_index.scene_names()}
+        self.global_script = index["global_script"]
+        self.prefabs = PrefabLibrary(index["prefabs"])
+        self.layer_settings = index.get("layers", {})
+        if rebuilt:
+            self.save_project_config()
+        
+        self.scene_combo["values"] = list(self.scenes.keys())
+        if self.scenes:
+            self.current_scene = list(self.scenes.keys())[0]
+            self.scene_combo.set(self.current_scene)
+            self.load_scene(self.current_scene)
 
     def save_project_config(self):
         if not self.project_path:
             return
             
+        # Los objetos viven en scenes/<escena>.json; la configuración solo los enumera
         config_path = os.path.join(self.project_path, "project_config.json")
         config = {
-            "scenes": self.scenes,
-            "global_script": self.global_script
+            "scenes": {name: os.path.relpath(self.get_scene_path(name), self.project_path) for name in self.scenes},
+            "global_script": self.global_script,
+            "prefabs": self.prefabs.templates,
+            "layers": self.layer_settings
         }
         
         with open(config_path, "w") as f:
             json.dump(config, f, indent=4)
+        
+        self.project_index.update_config(self.global_script, self.prefabs.templates, self.layer_settings)
+        self.project_index.update_assets(self.asset_store.manifest)
+        self.project_index.save()
 
     def create_new_scene(self):
         if not self.project_path:
@@ -530,17 +4795,22 @@ class SparEngineEditor:
                 messagebox.showerror("Error", "Ya existe una escena con ese nombre.")
                 return
                 
+            self.flush_pending_save()
             self.scenes[scene_name] = []
+            self.project_index.update_scene(scene_name, [])
             self.scene_combo["values"] = list(self.scenes.keys())
             self.scene_combo.set(scene_name)
             self.current_scene = scene_name
             self.objects = []
-            self.update_hierarchy()
+            self.selected_names = set()
+            self.selected_object_index = None
+            self.update_hierarchy(reset=True)
+            self.setup_inspector()
             self.draw_scene()
             self.save_project_config()
             
             # Crear archivo de escena
-            scene_path = os.path.join(self.project_path, "scenes", f"{scene_name}.json")
+            scene_path = self.get_scene_path(scene_name)
             os.makedirs(os.path.dirname(scene_path), exist_ok=True)
             with open(scene_path, "w") as f:
                 json.dump([], f, indent=4)
@@ -548,52 +4818,92 @@ class SparEngineEditor:
     def change_scene(self, event=None):
         selected_scene = self.scene_combo.get()
         if selected_scene and selected_scene != self.current_scene:
+            self.flush_pending_save()
             self.current_scene = selected_scene
             self.load_scene(selected_scene)
 
+    def get_scene_path(self, scene_name):
+        return os.path.join(self.project_path, "scenes", f"{scene_name}.json")
+
     def load_scene(self, scene_name):
         if scene_name in self.scenes:
-            scene_path = os.path.join(self.project_path, "scenes", f"{scene_name}.json")
-            if os.path.exists(scene_path):
-                with open(scene_path, "r") as f:
-                    self.objects = json.load(f)
-                    self.scenes[scene_name] = self.objects
+            stored = self.scene_cache.get(self.get_scene_path(scene_name))
+            if stored is not None:
+                self.objects = self.prefabs.resolve(stored)
+                self.project_index.update_scene(scene_name, self.objects)  # Por si se editó fuera del editor
             else:
                 self.objects = []
+            self.scenes[scene_name] = self.objects
                 
-            self.update_hierarchy()
+            self.selected_names = set()
+            self.selected_object_index = None
+            self.update_hierarchy(reset=True)
+            self.setup_inspector()
             self.draw_scene()
+            self.prefetch_neighbour_scenes(scene_name)
+
+    def prefetch_neighbour_scenes(self, scene_name, radius=2):
+        """Precarga las escenas cercanas a scene_name en la lista de escenas"""
+        names = list(self.scene_combo["values"])
+        if scene_name not in names:
+            return
+        index = names.index(scene_name)
+        neighbours = []
+        for distance in range(1, radius + 1):
+            for i in (index - distance, index + distance):
+                if 0 <= i < len(names):
+                    neighbours.append(self.get_scene_path(names[i]))
+        self.scene_cache.prefetch(neighbours)
 
     def save_scene(self):
         if not self.project_path or not self.current_scene:
             return
             
-        scene_path = os.path.join(self.project_path, "scenes", f"{self.current_scene}.json")
+        scene_path = self.get_scene_path(self.current_scene)
         os.makedirs(os.path.dirname(scene_path), exist_ok=True)
         
+        stored = self.prefabs.strip(self.objects)
         with open(scene_path, "w") as f:
-            json.dump(self.objects, f, indent=4)
+            json.dump(stored, f, indent=4)
+        self.scene_cache.store(scene_path, stored)
             
-        # Actualizar en el diccionario de escenas
+        # Actualizar en el diccionario de escenas y en el índice
         self.scenes[self.current_scene] = self.objects
+        self.project_index.update_scene(self.current_scene, self.objects)
         self.save_project_config()
 
-    def update_hierarchy(self):
-        self.hierarchy_tree.delete(*self.hierarchy_tree.get_children())
+    def update_hierarchy(self, reset=False):
+        """Sincroniza el árbol con los objetos aplicando solo las diferencias"""
+        tree = self.hierarchy_tree
+        if reset:
+            tree.delete(*tree.get_children())
+            self.hierarchy_items = {}
         
-        # Primero añadir objetos sin parent
-        for obj in self.objects:
-            if "parent" not in obj:
-                self.hierarchy_tree.insert("", "end", text=obj["name"], 
-                                         image=self.default_icons.get(obj["type"]))
+        names = {obj["name"] for obj in self.objects}
+        children_map = self.get_children_map()
         
-        # Luego añadir hijos recursivamente
-        for obj in self.objects:
-            if "parent" in obj:
-                parent_id = self.find_item_by_text(self.hierarchy_tree, obj["parent"])
-                if parent_id:
-                    self.hierarchy_tree.insert(parent_id, "end", text=obj["name"], 
-                                            image=self.default_icons.get(obj["type"]))
+        # Recorrer los padres antes que los hijos para poder insertar o mover debajo de ellos
+        ordered = [obj for obj in self.objects if obj.get("parent") not in names]
+        i = 0
+        while i < len(ordered):
+            ordered.extend(children_map.get(ordered[i]["name"], []))
+            i += 1
+        
+        for obj in ordered:
+            parent = obj.get("parent")
+            parent_item = self.hierarchy_items[parent] if parent in names else ""
+            item = self.hierarchy_items.get(obj["name"])
+            if item is None or not tree.exists(item):
+                self.hierarchy_items[obj["name"]] = tree.insert(parent_item, "end", text=obj["name"], 
+                                                                image=self.default_icons.get(obj["type"]))
+            elif tree.parent(item) != parent_item:
+                tree.move(item, parent_item, "end")
+        
+        # Quitar los que ya no existen (después de mover, para no arrastrar a hijos reubicados)
+        for name in [n for n in self.hierarchy_items if n not in names]:
+            item = self.hierarchy_items.pop(name)
+            if tree.exists(item):
+                tree.delete(item)
     
     def find_item_by_text(self, tree, text, parent_item=None):
         for item in tree.get_children(parent_item):
@@ -605,6 +4915,11 @@ class SparEngineEditor:
                 return child_item
         return None
 
+    def poll_thumbnails(self):
+        if self.thumbnail_cache:
+            self.thumbnail_cache.process_results()
+        self.root.after(50, self.poll_thumbnails)
+
     def setup_file_watcher(self):
         # Verificar cambios cada segundo
         self.root.after(1000, self.check_for_files_changes)
@@ -621,6 +4936,9 @@ class SparEngineEditor:
         self.root.after(1000, self.check_for_files_changes)
 
     def load_project_files(self):
+        if self.project_browser is None:
+            return
+        
         # Guardar el estado de expansión de los nodos
         expanded = set()
         for item in self.project_browser.get_children():
@@ -633,7 +4951,119 @@ class SparEngineEditor:
             
             # Restaurar el estado de expansión
             for item in self.find_items_by_text(self.project_browser, expanded):
+                self.expand_tree_node(self.project_browser, item)
                 self.project_browser.item(item, open=True)
+        
+        if self.browser_grid_visible:
+            self.draw_browser_grid()
+
+    def toggle_browser_view(self):
+        """Alterna el navegador de proyectos entre árbol y cuadrícula de miniaturas"""
+        if self.browser_grid_visible:
+            self.browser_grid_frame.pack_forget()
+            self.project_browser.pack(fill=tk.BOTH, expand=True)
+            self.browser_view_btn.config(text="Cuadrícula")
+            self.browser_grid_visible = False
+        else:
+            if self.browser_grid_frame is None:
+                self.setup_browser_grid()
+            self.project_browser.pack_forget()
+            self.browser_grid_frame.pack(fill=tk.BOTH, expand=True)
+            self.browser_view_btn.config(text="Árbol")
+            self.browser_grid_visible = True
+            self.draw_browser_grid()
+
+    def setup_browser_grid(self):
+        self.browser_grid_frame = ttk.Frame(self.browser_frame)
+        scrollbar = ttk.Scrollbar(self.browser_grid_frame, orient=tk.VERTICAL)
+        self.browser_grid = tk.Canvas(self.browser_grid_frame, bg=self.themes[self.current_theme]["canvas_bg"],
+                                      bd=0, highlightthickness=0, yscrollcommand=scrollbar.set)
+        scrollbar.config(command=self.browser_grid.yview)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.browser_grid.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        self.browser_grid.bind("<Configure>", lambda e: self.draw_browser_grid())
+        self.browser_grid.bind("<Double-1>", self.browser_grid_double_click)
+        self.browser_grid.bind("<MouseWheel>",
+                               lambda e: self.browser_grid.yview_scroll(-1 if e.delta > 0 else 1, "units"))
+
+    def draw_browser_grid(self):
+        """Dibuja el contenido de la carpeta actual como una cuadrícula de miniaturas"""
+        canvas = self.browser_grid
+        canvas.delete("all")
+        self.browser_grid_generation += 1
+        self.browser_grid_photos = []  # Referencias a las miniaturas mostradas
+        self.browser_grid_items = {}
+        
+        folder = self.browser_grid_path
+        if not folder or not os.path.isdir(folder):
+            return
+        
+        try:
+            names = [n for n in os.listdir(folder) if not n.startswith(".")]
+        except OSError as e:
+            print(f"Error al cargar archivos: {e}")
+            return
+        
+        # Carpetas primero, luego archivos
+        names.sort(key=lambda n: (not os.path.isdir(os.path.join(folder, n)), n.lower()))
+        if os.path.normpath(folder) != os.path.normpath(self.project_path):
+            names.insert(0, "..")
+        
+        theme = self.themes[self.current_theme]
+        cell_w, cell_h, thumb_h = 110, 125, 100
+        cols = max(1, canvas.winfo_width() // cell_w)
+        generation = self.browser_grid_generation
+        
+        for i, name in enumerate(names):
+            item_path = os.path.normpath(os.path.join(folder, name))
+            cx = (i % cols) * cell_w + cell_w // 2
+            top = (i // cols) * cell_h + 5
+            tag = f"cell{i}"
+            self.browser_grid_items[tag] = item_path
+            
+            if os.path.isdir(item_path):
+                canvas.create_rectangle(cx - 40, top + 20, cx + 40, top + 80,
+                                        fill="#c8a040", outline="#8a6d2a", tags=(tag,))
+            elif name.lower().endswith(IMAGE_EXTENSIONS):
+                canvas.create_rectangle(cx - 40, top + 10, cx + 40, top + 90,
+                                        fill="#3c3c3c", outline="#555555", tags=(tag, f"{tag}_img"))
+                
+                def show_thumbnail(photo, tag=tag, cx=cx, top=top):
+                    if photo is None or generation != self.browser_grid_generation:
+                        return
+                    self.browser_grid_photos.append(photo)
+                    canvas.delete(f"{tag}_img")
+                    canvas.create_image(cx, top + thumb_h // 2, image=photo, tags=(tag,))
+                
+                self.thumbnail_cache.request(item_path, show_thumbnail)
+            else:
+                canvas.create_rectangle(cx - 30, top + 15, cx + 30, top + 85,
+                                        fill="#3c3c3c", outline="#555555", tags=(tag,))
+                canvas.create_text(cx, top + 50, text=os.path.splitext(name)[1] or "?",
+                                   fill=theme["fg"], font=("Arial", 9), tags=(tag,))
+            
+            canvas.create_text(cx, top + thumb_h + 8, text=name, width=cell_w - 6,
+                               fill=theme["fg"], font=("Arial", 8), tags=(tag,))
+        
+        rows = (len(names) + cols - 1) // cols
+        canvas.configure(scrollregion=(0, 0, cols * cell_w, rows * cell_h + 10))
+
+    def browser_grid_double_click(self, event):
+        current = self.browser_grid.find_withtag("current")
+        if not current:
+            return
+        tag = next((t for t in self.browser_grid.gettags(current[0]) if t in self.browser_grid_items), None)
+        if tag is None:
+            return
+        
+        path = self.browser_grid_items[tag]
+        if os.path.isdir(path):
+            self.browser_grid_path = path
+            self.browser_grid.yview_moveto(0)
+            self.draw_browser_grid()
+        elif path.endswith(".py"):
+            self.set_global_script(path)
 
     def find_items_by_text(self, tree, texts):
         """Encuentra items en el árbol por su texto"""
@@ -644,14 +5074,24 @@ class SparEngineEditor:
                 items.append(item)
         return items
 
+    def expand_tree_node(self, tree, item):
+        """Lista el contenido de una carpeta del navegador la primera vez que se despliega"""
+        children = tree.get_children(item)
+        if len(children) == 1 and tree.tag_has("placeholder", children[0]):
+            tree.delete(children[0])
+            self.populate_tree(tree, tree.item(item, "values")[0], item)
+
     def populate_tree(self, tree, path, parent=""):
         try:
             for item in os.listdir(path):
+                # Ocultar carpetas internas como la caché de assets
+                if item.startswith("."):
+                    continue
                 item_path = os.path.join(path, item)
                 if os.path.isdir(item_path):
-                    # Es una carpeta
+                    # Es una carpeta: su contenido se lista al desplegarla
                     node = tree.insert(parent, "end", text=item, values=[item_path], open=False)
-                    self.populate_tree(tree, item_path, node)
+                    tree.insert(node, "end", text="", tags=("placeholder",))
                 else:
                     # Es un archivo
                     tree.insert(parent, "end", text=item, values=[item_path])
@@ -666,9 +5106,8 @@ class SparEngineEditor:
             # Actualizar el árbol para mostrar/ocultar contenido
             if self.project_browser.item(item, "open"):
                 self.project_browser.item(item, open=False)
-                self.project_browser.delete(*self.project_browser.get_children(item))
             else:
-                self.populate_tree(self.project_browser, path, item)
+                self.expand_tree_node(self.project_browser, item)
                 self.project_browser.item(item, open=True)
         else:
             # Si es un archivo .py, podríamos asignarlo como script global
@@ -710,6 +5149,8 @@ class SparEngineEditor:
             is_dir = os.path.isdir(path)
             
             menu.add_command(label="Abrir", command=lambda: self.open_file(path))
+            if not is_dir and self.project_index:
+                menu.add_command(label="Buscar usos", command=lambda: self.show_usages(path))
             
             if path.endswith(".py"):
                 menu.add_command(label="Establecer como Script Global", 
@@ -805,32 +5246,72 @@ class SparEngineEditor:
         
         menu.add_command(label="Crear EmptyObject", command=self.create_empty)
         menu.add_command(label="Crear Sprite2D", command=self.create_sprite2d)
+        menu.add_command(label="Crear AnimatedSprite2D", command=self.create_animated_sprite2d)
+        menu.add_command(label="Crear Tilemap", command=self.create_tilemap)
+        menu.add_command(label="Crear ParticleEmitter", command=self.create_particle_emitter)
         
-        if item:
+        if self.prefabs.templates:
+            prefab_menu = tk.Menu(menu, tearoff=0)
+            for prefab_name in sorted(self.prefabs.templates):
+                prefab_menu.add_command(label=prefab_name,
+                                        command=lambda p=prefab_name: self.instantiate_prefab(p))
+            menu.add_cascade(label="Instanciar Prefab", menu=prefab_menu)
+        
+        if item and len(self.selected_names) > 1 and self.hierarchy_tree.item(item, "text") in self.selected_names:
+            # Operaciones sobre toda la selección
+            count = len(self.selected_names)
+            menu.add_separator()
+            menu.add_command(label=f"Eliminar selección ({count})", command=self.delete_selection)
+            menu.add_command(label=f"Duplicar selección ({count})", command=self.duplicate_selection)
+            menu.add_command(label="Emparentar selección al objeto activo", command=self.parent_selection_to_active)
+            menu.add_command(label="Quitar padre a la selección", command=self.unparent_selection)
+        elif item:
             menu.add_separator()
             menu.add_command(label="Eliminar", command=lambda: self.delete_object_by_name(self.hierarchy_tree.item(item, "text")))
             menu.add_command(label="Asignar Script", command=lambda: self.assign_script_to_object(self.hierarchy_tree.item(item, "text")))
             menu.add_command(label="Duplicar", command=lambda: self.duplicate_object(self.hierarchy_tree.item(item, "text")))
+            menu.add_command(label="Crear Prefab", command=lambda: self.create_prefab_from_object(self.hierarchy_tree.item(item, "text")))
             
         menu.tk_popup(event.x_root, event.y_root)
         
     def delete_object_by_name(self, name):
         confirm = messagebox.askyesno("Confirmar", f"¿Eliminar el objeto '{name}'?")
         if confirm:
-            # Eliminar también todos los hijos
-            def delete_children(parent_name):
-                children = [obj for obj in self.objects if obj.get("parent") == parent_name]
-                for child in children:
-                    delete_children(child["name"])
-                    self.objects.remove(child)
-            
-            delete_children(name)
-            
-            # Eliminar el objeto principal
-            self.objects = [obj for obj in self.objects if obj["name"] != name]
-            self.save_scene()
-            self.update_hierarchy()
-            self.draw_scene()
+            self.delete_objects([name])
+
+    def delete_selection(self):
+        if not self.selected_names:
+            return
+        confirm = messagebox.askyesno("Confirmar", f"¿Eliminar {len(self.selected_names)} objeto(s) seleccionado(s)?")
+        if confirm:
+            self.delete_objects(self.selected_names)
+
+    def delete_objects(self, names):
+        """Elimina los objetos indicados y todos sus descendientes en una sola operación"""
+        self.flush_property_edits()
+        doomed = self.expand_with_descendants(names)
+        active = self.get_selected_object()
+        
+        # Un único filtrado de la lista en lugar de un remove() por objeto
+        self.objects = [obj for obj in self.objects if obj["name"] not in doomed]
+        
+        self.update_hierarchy()
+        self.set_selection(self.selected_names - doomed, active["name"] if active else None)
+        self.save_scene()
+        self.draw_scene()
+
+    def expand_with_descendants(self, names):
+        """Conjunto con los nombres dados y los de todos sus descendientes"""
+        children_map = self.get_children_map()
+        result = set()
+        pending = list(names)
+        while pending:
+            name = pending.pop()
+            if name in result:
+                continue
+            result.add(name)
+            pending.extend(child["name"] for child in children_map.get(name, []))
+        return result
             
     def assign_script_to_object(self, obj_name):
         script_path = filedialog.askopenfilename(
@@ -848,27 +5329,103 @@ class SparEngineEditor:
             self.save_scene()
 
     def duplicate_object(self, obj_name):
-        original = next((obj for obj in self.objects if obj["name"] == obj_name), None)
-        if original:
+        self.duplicate_objects([obj_name])
+
+    def duplicate_selection(self):
+        if self.selected_names:
+            self.duplicate_objects(self.selected_names)
+
+    def duplicate_objects(self, names):
+        """Duplica varios objetos en una sola operación; los hijos duplicados cuelgan de la copia del padre"""
+        self.flush_property_edits()
+        names = set(names)
+        originals = [obj for obj in self.objects if obj["name"] in names]
+        if not originals:
+            return
+        
+        new_names = self.get_unique_names([obj["name"] for obj in originals])
+        renamed = {obj["name"]: new_name for obj, new_name in zip(originals, new_names)}
+        
+        for original, new_name in zip(originals, new_names):
             new_obj = original.copy()
-            new_obj["name"] = self.get_unique_name(original["name"])
-            new_obj["x"] += 30  # Desplazar un poco para que no se solape
-            new_obj["y"] += 30
-            
+            new_obj["name"] = new_name
+            if original.get("parent") in renamed:
+                new_obj["parent"] = renamed[original["parent"]]
+            else:
+                new_obj["x"] += 30  # Desplazar un poco para que no se solape
+                new_obj["y"] += 30
             self.objects.append(new_obj)
-            self.save_scene()
-            self.update_hierarchy()
-            self.draw_scene()
+        
+        self.update_hierarchy()
+        self.set_selection(new_names, new_names[0])
+        self.save_scene()
+        self.draw_scene()
             
     def get_unique_name(self, base_name):
-        counter = 1
-        new_name = f"{base_name}_{counter}"
-        
-        while any(obj["name"] == new_name for obj in self.objects):
-            counter += 1
+        return self.get_unique_names([base_name])[0]
+
+    def get_unique_names(self, base_names):
+        """Genera nombres únicos para varias bases recorriendo los objetos una sola vez"""
+        taken = {obj["name"] for obj in self.objects}
+        counters = {}
+        result = []
+        for base_name in base_names:
+            counter = counters.get(base_name, 1)
             new_name = f"{base_name}_{counter}"
-            
-        return new_name
+            while new_name in taken:
+                counter += 1
+                new_name = f"{base_name}_{counter}"
+            taken.add(new_name)
+            counters[base_name] = counter + 1
+            result.append(new_name)
+        return result
+
+    def create_prefab_from_object(self, obj_name):
+        """Guarda el objeto como prefab y lo convierte en su primera instancia"""
+        obj = next((o for o in self.objects if o["name"] == obj_name), None)
+        if obj is None:
+            return
+        prefab_name = simpledialog.askstring("Nuevo Prefab", "Nombre del prefab:", initialvalue=obj_name)
+        if not prefab_name:
+            return
+        if prefab_name in self.prefabs.templates:
+            messagebox.showerror("Error", "Ya existe un prefab con ese nombre.")
+            return
+        
+        self.prefabs.templates[prefab_name] = self.prefabs.make_template(obj)
+        obj["prefab"] = prefab_name
+        self.save_scene()
+        self.setup_inspector()
+
+    def instantiate_prefab(self, prefab_name):
+        if prefab_name not in self.prefabs.templates:
+            return
+        stored = {"prefab": prefab_name, "name": self.get_unique_name(prefab_name), "x": 100, "y": 100}
+        self.objects.extend(self.prefabs.resolve([stored]))
+        self.save_scene()
+        self.update_hierarchy()
+        self.draw_scene()
+
+    def apply_to_prefab(self):
+        """Copia los valores del objeto activo a su prefab y los propaga al resto de instancias"""
+        obj = self.get_selected_object()
+        if obj is None or obj.get("prefab") not in self.prefabs.templates:
+            return
+        self.flush_property_edits()
+        
+        # Las instancias de otras escenas toman los valores nuevos al cargarse desde disco
+        self.prefabs.update_template(obj["prefab"], self.prefabs.make_template(obj), self.objects, source=obj)
+        self.save_scene()
+        self.object_images.clear()
+        self.draw_scene()
+
+    def unlink_prefab(self):
+        """Convierte la instancia activa en un objeto independiente"""
+        obj = self.get_selected_object()
+        if obj is not None and "prefab" in obj:
+            del obj["prefab"]
+            self.save_scene()
+            self.setup_inspector()
 
     def create_empty(self):
         name = self.get_unique_name("EmptyObject")
@@ -894,20 +5451,14 @@ class SparEngineEditor:
         if sprite_file:
             name = self.get_unique_name("Sprite")
             
-            # Copiar el sprite al proyecto
-            assets_dir = os.path.join(self.project_path, "assets")
-            os.makedirs(assets_dir, exist_ok=True)
-            
-            sprite_name = os.path.basename(sprite_file)
-            dest_path = os.path.join(assets_dir, sprite_name)
-            
             try:
-                shutil.copy2(sprite_file, dest_path)
+                # Importar el sprite al proyecto (sin duplicar contenido idéntico)
+                sprite_rel_path = self.asset_store.import_file(sprite_file)
                 
                 self.objects.append({
                     "type": "Sprite2D",
                     "name": name,
-                    "sprite": os.path.join("assets", sprite_name),
+                    "sprite": sprite_rel_path,
                     "x": 100,
                     "y": 100,
                     "rotation": 0,
@@ -917,11 +5468,218 @@ class SparEngineEditor:
                 })
                 
                 self.save_scene()
-                self.update_hierarchy()
-                self.draw_scene()
+                self.update_hierarchy()
+                self.draw_scene()
+                
+            except Exception as e:
+                messagebox.showerror("Error", f"No se pudo copiar el sprite: {e}")
+
+    def create_animated_sprite2d(self):
+        sheet_file = filedialog.askopenfilename(
+            title="Seleccionar Hoja de Sprites",
+            filetypes=[("Image Files", "*.png;*.jpg;*.jpeg;*.bmp;*.gif")]
+        )
+        
+        if sheet_file:
+            name = self.get_unique_name("AnimatedSprite")
+            
+            try:
+                sheet_rel_path = self.asset_store.import_file(sheet_file)
+                # Por defecto, una tira horizontal de fotogramas cuadrados
+                sheet = self.get_tileset_image(sheet_rel_path)
+                frame_size = min(sheet.size) if sheet is not None else Tilemap.DEFAULT_TILE_SIZE
+                frames = AnimatedSprite.grid(*(sheet.size if sheet is not None else (frame_size, frame_size)),
+                                             frame_size, frame_size)
+                
+                self.objects.append({
+                    "type": "AnimatedSprite2D",
+                    "name": name,
+                    "sheet": sheet_rel_path,
+                    "x": 100,
+                    "y": 100,
+                    "rotation": 0,
+                    "scale_x": 1,
+                    "scale_y": 1,
+                    "opacity": 1.0,
+                    "frame_width": frame_size,
+                    "frame_height": frame_size,
+                    "frames": frames,
+                    "clips": {"default": {"frames": list(range(len(frames))), "fps": AnimatedSprite.DEFAULT_FPS,
+                                          "loop": True}},
+                    "clip": "default",
+                    "playing": True
+                })
+                
+                self.save_scene()
+                self.update_hierarchy()
+                self.draw_scene()
+                
+            except Exception as e:
+                messagebox.showerror("Error", f"No se pudo copiar la hoja de sprites: {e}")
+
+    def create_particle_emitter(self):
+        name = self.get_unique_name("ParticleEmitter")
+        obj = {
+            "type": "ParticleEmitter",
+            "name": name,
+            "x": 100,
+            "y": 100
+        }
+        obj.update(ParticleSystem.DEFAULTS)
+        self.objects.append(obj)
+        self.save_scene()
+        self.update_hierarchy()
+        self.draw_scene()
+
+    def toggle_particle_preview(self, enabled):
+        """Simula el emisor activo en el viewport del editor"""
+        if self.particle_preview_id is not None:
+            self.root.after_cancel(self.particle_preview_id)
+            self.particle_preview_id = None
+        self.scene_canvas.delete("particle_preview")
+        self.particle_preview = None
+        
+        obj = self.get_selected_object()
+        if enabled and obj is not None and obj["type"] == "ParticleEmitter":
+            self.particle_preview = (obj, ParticleSystem(), time.perf_counter())
+            self.particle_preview_id = self.root.after(33, self.update_particle_preview)
+
+    def update_particle_preview(self):
+        self.particle_preview_id = None
+        obj, system, last_time = self.particle_preview
+        if obj is not self.get_selected_object():
+            self.toggle_particle_preview(False)
+            return
+        
+        now = time.perf_counter()
+        system.update(obj, self.get_world_position(obj), min(now - last_time, 0.1))
+        self.particle_preview = (obj, system, now)
+        
+        # Las partículas se rasterizan con NumPy en una sola imagen del tamaño de su contorno en pantalla
+        self.scene_canvas.delete("particle_preview")
+        if len(system):
+            left, top, right, bottom = system.bounds(obj)
+            screen_left, screen_top = self.world_to_screen(left, top)
+            screen_right, screen_bottom = self.world_to_screen(right, bottom)
+            
+            # Recortar al área visible del canvas
+            screen_left = max(0, int(screen_left))
+            screen_top = max(0, int(screen_top))
+            screen_right = min(self.scene_canvas.winfo_width(), int(screen_right) + 1)
+            screen_bottom = min(self.scene_canvas.winfo_height(), int(screen_bottom) + 1)
+            if screen_right > screen_left and screen_bottom > screen_top:
+                world_left, world_top = self.screen_to_world(screen_left, screen_top)
+                pixels = system.rasterize(obj, world_left, world_top, screen_right - screen_left,
+                                             screen_bottom - screen_top, self.camera_zoom)
+                self.particle_preview_photo = ImageTk.PhotoImage(Image.fromarray(pixels, "RGBA"))
+                self.scene_canvas.create_image(screen_left, screen_top, image=self.particle_preview_photo,
+                                               anchor=tk.NW, tags=("particle_preview",))
+        
+        self.particle_preview_id = self.root.after(33, self.update_particle_preview)
+
+    def create_tilemap(self):
+        tileset_file = filedialog.askopenfilename(
+            title="Seleccionar Tileset",
+            filetypes=[("Image Files", "*.png;*.jpg;*.jpeg;*.bmp;*.gif")]
+        )
+        
+        if tileset_file:
+            name = self.get_unique_name("Tilemap")
+            
+            try:
+                self.objects.append({
+                    "type": "Tilemap",
+                    "name": name,
+                    "tileset": self.asset_store.import_file(tileset_file),
+                    "x": 100,
+                    "y": 100,
+                    "tile_width": Tilemap.DEFAULT_TILE_SIZE,
+                    "tile_height": Tilemap.DEFAULT_TILE_SIZE,
+                    "map_width": Tilemap.DEFAULT_MAP_SIZE,
+                    "map_height": Tilemap.DEFAULT_MAP_SIZE,
+                    "tiles": Tilemap.empty(Tilemap.DEFAULT_MAP_SIZE, Tilemap.DEFAULT_MAP_SIZE)
+                })
+                
+                self.save_scene()
+                self.update_hierarchy()
+                self.draw_scene()
+                
+            except Exception as e:
+                messagebox.showerror("Error", f"No se pudo copiar el tileset: {e}")
+
+    def change_tileset(self):
+        obj = self.get_selected_object()
+        tileset_file = filedialog.askopenfilename(
+            title="Seleccionar Tileset",
+            filetypes=[("Image Files", "*.png;*.jpg;*.jpeg;*.bmp;*.gif")],
+            initialdir=self.project_path
+        )
+        
+        if tileset_file and obj is not None:
+            try:
+                obj["tileset"] = self.asset_store.import_file(tileset_file)
+                self.save_scene()
+                self.redraw_objects([obj])
+                self.setup_inspector()
+                
+            except Exception as e:
+                messagebox.showerror("Error", f"No se pudo copiar el tileset: {e}")
+
+    def change_sprite_sheet(self):
+        obj = self.get_selected_object()
+        sheet_file = filedialog.askopenfilename(
+            title="Seleccionar Hoja de Sprites",
+            filetypes=[("Image Files", "*.png;*.jpg;*.jpeg;*.bmp;*.gif")],
+            initialdir=self.project_path
+        )
+        
+        if sheet_file and obj is not None:
+            try:
+                obj["sheet"] = self.asset_store.import_file(sheet_file)
+                self.save_scene()
+                self.redraw_objects([obj])
+                self.setup_inspector()
                 
             except Exception as e:
-                messagebox.showerror("Error", f"No se pudo copiar el sprite: {e}")
+                messagebox.showerror("Error", f"No se pudo copiar la hoja de sprites: {e}")
+
+    def get_tileset_image(self, rel_path):
+        """Imagen PIL del tileset o de la hoja de sprites, recargada si el archivo cambió"""
+        if not rel_path:
+            return None
+        path = os.path.join(self.project_path, rel_path)
+        try:
+            mtime = os.path.getmtime(path)
+            cached = self.tileset_images.get(rel_path)
+            if cached is None or cached[0] != mtime:
+                self.tileset_images[rel_path] = (mtime, Image.open(path).convert("RGBA"))
+            return self.tileset_images[rel_path][1]
+        except Exception:
+            return None
+
+    def resize_tilemap(self, columns, rows):
+        obj = self.get_selected_object()
+        if obj is None or obj["type"] != "Tilemap" or columns < 1 or rows < 1:
+            return
+        tiles = Tilemap.resized(Tilemap.decode(obj), columns, rows)
+        self.queue_property_edit(obj, map_width=columns, map_height=rows, tiles=Tilemap.encode(tiles))
+
+    def paint_tile_at(self, obj, screen_x, screen_y):
+        """Pinta (o borra) el tile bajo el cursor en la copia del trazo actual"""
+        world_x, world_y = self.screen_to_world(screen_x, screen_y)
+        origin_x, origin_y = self.get_world_position(obj)
+        tile_width, tile_height = Tilemap.tile_size(obj)
+        column = int((world_x - origin_x) // tile_width)
+        row = int((world_y - origin_y) // tile_height)
+        rows, columns = self.paint_tiles.shape
+        if not (0 <= column < columns and 0 <= row < rows):
+            return
+        
+        value = self.paint_tile + 1 if self.paint_tile >= 0 else 0
+        if self.paint_tiles[row, column] != value:
+            self.paint_tiles[row, column] = value
+            # Se encola el array; flush_property_edits lo codifica una vez por transacción, no por celda
+            self.queue_property_edit(obj, tiles=self.paint_tiles)
 
     def change_sprite(self, obj_index):
         sprite_file = filedialog.askopenfilename(
@@ -931,17 +5689,9 @@ class SparEngineEditor:
         )
         
         if sprite_file and 0 <= obj_index < len(self.objects):
-            # Copiar el sprite al proyecto
-            assets_dir = os.path.join(self.project_path, "assets")
-            os.makedirs(assets_dir, exist_ok=True)
-            
-            sprite_name = os.path.basename(sprite_file)
-            dest_path = os.path.join(assets_dir, sprite_name)
-            
             try:
-                shutil.copy2(sprite_file, dest_path)
-                
-                self.objects[obj_index]["sprite"] = os.path.join("assets", sprite_name)
+                # Importar el sprite al proyecto (sin duplicar contenido idéntico)
+                self.objects[obj_index]["sprite"] = self.asset_store.import_file(sprite_file)
                 self.save_scene()
                 self.draw_scene()
                 self.setup_inspector()  # Actualizar el inspector para mostrar la nueva imagen
@@ -950,57 +5700,276 @@ class SparEngineEditor:
                 messagebox.showerror("Error", f"No se pudo copiar el sprite: {e}")
 
     def start_drag(self, event):
+        self.scene_canvas.focus_set()
+        
+        # En modo pintura los clics pintan sobre el Tilemap activo
+        active = self.get_selected_object()
+        if self.tile_paint_mode and active is not None and active["type"] == "Tilemap":
+            self.flush_property_edits()  # El trazo anterior puede seguir pendiente de aplicar
+            self.paint_tiles = Tilemap.decode(active).copy()
+            self.paint_tile_at(active, event.x, event.y)
+            return
+        
         x, y = self.screen_to_world(event.x, event.y)
+        additive = bool(event.state & 0x0001)  # Shift pulsado
         
         # Buscar el objeto más cercano al punto de clic
         closest_obj = None
         min_dist = float('inf')
+        positions = self.get_world_positions()
         
         for idx, obj in enumerate(self.objects):
-            obj_x, obj_y = self.get_world_position(obj)
+            obj_x, obj_y = positions[obj["name"]]
             dist = math.sqrt((x - obj_x)**2 + (y - obj_y)**2)
             
-            if dist < 30 and dist < min_dist:  # Radio de 30 píxeles
+            if dist < 30 / self.camera_zoom and dist < min_dist:  # Radio de 30 píxeles en pantalla
                 min_dist = dist
                 closest_obj = idx
                 
-        if closest_obj is not None:
-            self.dragging_object = closest_obj
-            obj = self.objects[closest_obj]
-            obj_x, obj_y = self.get_world_position(obj)
-            self.drag_offset = (obj_x - x, obj_y - y)
-            
-            # Seleccionar el objeto
-            self.selected_object_index = closest_obj
-            self.update_hierarchy_selection()
-            self.setup_inspector()
+        if closest_obj is None:
+            # Clic en vacío: empezar una selección por caja
+            self.box_select_start = (event.x, event.y)
+            self.box_select_additive = additive
+            return
+        
+        name = self.objects[closest_obj]["name"]
+        if additive:
+            # Shift+clic añade o quita el objeto de la selección
+            names = self.selected_names ^ {name}
+            self.set_selection(names, name if name in names else None)
+            return
+        
+        # Seleccionar el objeto (si ya estaba seleccionado se arrastra todo el grupo)
+        if name in self.selected_names:
+            self.set_selection(self.selected_names, name)
+        else:
+            self.set_selection([name], name)
+        
+        self.dragging_object = closest_obj
+        self.drag_start = (x, y)
+        self.drag_origins = [(obj, obj["x"], obj["y"]) for obj in self.get_selection_roots()]
 
     def do_drag(self, event):
-        if self.dragging_object is not None:
+        if self.paint_tiles is not None:
+            active = self.get_selected_object()
+            if active is not None and active["type"] == "Tilemap":
+                self.paint_tile_at(active, event.x, event.y)
+        elif self.dragging_object is not None:
             x, y = self.screen_to_world(event.x, event.y)
-            offset_x, offset_y = self.drag_offset
-            
-            obj = self.objects[self.dragging_object]
+            dx = x - self.drag_start[0]
+            dy = y - self.drag_start[1]
             
-            # Si el objeto tiene un padre, ajustamos la posición relativa
-            if "parent" in obj:
-                parent = next((o for o in self.objects if o["name"] == obj["parent"]), None)
-                if parent:
-                    parent_x, parent_y = self.get_world_position(parent)
-                    obj["x"] = (x + offset_x) - parent_x
-                    obj["y"] = (y + offset_y) - parent_y
-                else:
-                    obj["x"] = x + offset_x
-                    obj["y"] = y + offset_y
-            else:
-                obj["x"] = x + offset_x
-                obj["y"] = y + offset_y
-                
-            self.save_scene()
-            self.draw_scene()
+            # El desplazamiento es el mismo en coordenadas locales, tengan padre o no
+            for obj, origin_x, origin_y in self.drag_origins:
+                self.queue_property_edit(obj, x=origin_x + dx, y=origin_y + dy)
+        elif self.box_select_start:
+            x0, y0 = self.box_select_start
+            self.scene_canvas.delete("rubberband")
+            self.scene_canvas.create_rectangle(
+                x0, y0, event.x, event.y,
+                outline=self.themes[self.current_theme]["accent"], dash=(2, 2), tags=("rubberband",)
+            )
 
     def stop_drag(self, event):
+        self.paint_tiles = None
+        if self.box_select_start:
+            x0, y0 = self.screen_to_world(*self.box_select_start)
+            x1, y1 = self.screen_to_world(event.x, event.y)
+            min_x, max_x = sorted((x0, x1))
+            min_y, max_y = sorted((y0, y1))
+            
+            inside = {name for name, (x, y) in self.get_world_positions().items()
+                      if min_x <= x <= max_x and min_y <= y <= max_y}
+            names = self.selected_names | inside if self.box_select_additive else inside
+            
+            self.scene_canvas.delete("rubberband")
+            self.box_select_start = None
+            self.set_selection(names)
+            
         self.dragging_object = None
+        self.drag_origins = []
+
+    def set_selection(self, names, active_name=None, sync_hierarchy=True):
+        """Reemplaza la selección; active_name es el objeto que se muestra en el inspector"""
+        self.selected_names = set(names)
+        
+        if active_name not in self.selected_names:
+            current = self.get_selected_object()
+            active_name = current["name"] if current and current["name"] in self.selected_names else None
+        if active_name is None and self.selected_names:
+            active_name = next(obj["name"] for obj in self.objects if obj["name"] in self.selected_names)
+        
+        self.selected_object_index = next(
+            (i for i, obj in enumerate(self.objects) if obj["name"] == active_name), None)
+        
+        if sync_hierarchy:
+            self.update_hierarchy_selection()
+        self.setup_inspector()
+        self.draw_selection()
+
+    def select_all(self):
+        self.set_selection([obj["name"] for obj in self.objects])
+
+    def get_objects_by_name(self):
+        return {obj["name"]: obj for obj in self.objects}
+
+    def get_world_positions(self):
+        """Posiciones globales de todos los objetos calculadas en una sola pasada"""
+        by_name = self.get_objects_by_name()
+        positions = {}
+        
+        def resolve(obj, depth=0):
+            name = obj["name"]
+            if name not in positions:
+                x, y = obj["x"], obj["y"]
+                parent = by_name.get(obj.get("parent"))
+                if parent is not None and depth < len(by_name):
+                    parent_x, parent_y = resolve(parent, depth + 1)
+                    x += parent_x
+                    y += parent_y
+                positions[name] = (x, y)
+            return positions[name]
+        
+        for obj in self.objects:
+            resolve(obj)
+        return positions
+
+    def get_selection_roots(self):
+        """Objetos seleccionados que no tienen ningún ancestro también seleccionado"""
+        by_name = self.get_objects_by_name()
+        roots = []
+        for obj in self.objects:
+            if obj["name"] not in self.selected_names:
+                continue
+            parent = obj.get("parent")
+            visited = set()
+            while parent in by_name and parent not in self.selected_names and parent not in visited:
+                visited.add(parent)
+                parent = by_name[parent].get("parent")
+            if parent not in self.selected_names:
+                roots.append(obj)
+        return roots
+
+    def transform_selection(self, angle=0.0, scale_x=1.0, scale_y=1.0, dx=0.0, dy=0.0):
+        """Mueve, rota y escala la selección alrededor de su pivote común en una sola operación"""
+        roots = self.get_selection_roots()
+        if not roots:
+            return
+        self.flush_property_edits()
+        
+        # El grupo incluye los descendientes para que se transforme como un bloque rígido
+        group = self.expand_with_descendants(obj["name"] for obj in roots)
+        positions = self.get_world_positions()
+        pivot_x = sum(positions[obj["name"]][0] for obj in roots) / len(roots)
+        pivot_y = sum(positions[obj["name"]][1] for obj in roots) / len(roots)
+        
+        cos_a = math.cos(math.radians(angle))
+        sin_a = math.sin(math.radians(angle))
+        new_positions = {}
+        for name in group:
+            rel_x = (positions[name][0] - pivot_x) * scale_x
+            rel_y = (positions[name][1] - pivot_y) * scale_y
+            new_positions[name] = (pivot_x + rel_x * cos_a - rel_y * sin_a + dx,
+                                   pivot_y + rel_x * sin_a + rel_y * cos_a + dy)
+        
+        for obj in self.objects:
+            name = obj["name"]
+            if name not in group:
+                continue
+            parent = obj.get("parent")
+            parent_x, parent_y = new_positions.get(parent) or positions.get(parent) or (0, 0)
+            obj["x"] = new_positions[name][0] - parent_x
+            obj["y"] = new_positions[name][1] - parent_y
+            if angle:
+                obj["rotation"] = (obj.get("rotation", 0) + angle) % 360
+            if scale_x != 1 or scale_y != 1:
+                obj["scale_x"] = obj.get("scale_x", 1) * scale_x
+                obj["scale_y"] = obj.get("scale_y", 1) * scale_y
+        
+        self.draw_scene()
+        self.setup_inspector()
+        self.schedule_save()
+
+    def ask_move_selection(self):
+        if not self.selected_names:
+            return
+        value = simpledialog.askstring("Mover selección", "Desplazamiento (dx, dy):")
+        if value:
+            try:
+                dx, dy = (float(v) for v in value.split(","))
+            except ValueError:
+                messagebox.showerror("Error", "Formato inválido, usa: dx, dy")
+                return
+            self.transform_selection(dx=dx, dy=dy)
+
+    def ask_rotate_selection(self):
+        if not self.selected_names:
+            return
+        angle = simpledialog.askfloat("Rotar selección", "Ángulo en grados:")
+        if angle:
+            self.transform_selection(angle=angle)
+
+    def ask_scale_selection(self):
+        if not self.selected_names:
+            return
+        factor = simpledialog.askfloat("Escalar selección", "Factor de escala:", minvalue=0.01)
+        if factor:
+            self.transform_selection(scale_x=factor, scale_y=factor)
+
+    def parent_selection_to_active(self):
+        """Emparenta los objetos seleccionados al objeto activo conservando su posición global"""
+        active = self.get_selected_object()
+        if active is None or len(self.selected_names) < 2:
+            return
+        self.flush_property_edits()
+        
+        by_name = self.get_objects_by_name()
+        positions = self.get_world_positions()
+        
+        # Los ancestros del nuevo padre no pueden ser sus hijos (parenting circular)
+        ancestors = set()
+        parent = active.get("parent")
+        while parent in by_name and parent not in ancestors:
+            ancestors.add(parent)
+            parent = by_name[parent].get("parent")
+        
+        parent_x, parent_y = positions[active["name"]]
+        skipped = 0
+        for obj in self.get_selection_roots():
+            if obj is active:
+                continue
+            if obj["name"] in ancestors:
+                skipped += 1
+                continue
+            obj["x"] = positions[obj["name"]][0] - parent_x
+            obj["y"] = positions[obj["name"]][1] - parent_y
+            obj["parent"] = active["name"]
+        
+        self.update_hierarchy()
+        self.update_hierarchy_selection()
+        self.setup_inspector()
+        self.save_scene()
+        self.draw_scene()
+        if skipped:
+            messagebox.showinfo("Parenting", f"{skipped} objeto(s) omitido(s) para evitar parenting circular")
+
+    def unparent_selection(self):
+        """Quita el padre a todos los objetos seleccionados conservando su posición global"""
+        if not self.selected_names:
+            return
+        self.flush_property_edits()
+        
+        positions = self.get_world_positions()
+        for obj in self.objects:
+            if obj["name"] in self.selected_names and "parent" in obj:
+                obj["x"], obj["y"] = positions[obj["name"]]
+                del obj["parent"]
+        
+        self.update_hierarchy()
+        self.update_hierarchy_selection()
+        self.setup_inspector()
+        self.save_scene()
+        self.draw_scene()
 
     def start_camera_drag(self, event):
         self.camera_drag_start = (event.x, event.y)
@@ -1019,29 +5988,39 @@ class SparEngineEditor:
     def stop_camera_drag(self, event):
         self.camera_drag_start = None
 
-    def zoom_camera(self, event):
+    def zoom_camera(self, event, direction=None):
         # Factor de zoom basado en la dirección de la rueda del mouse
-        zoom_factor = 1.1 if event.delta > 0 else 0.9
+        if direction is None:
+            direction = 1 if event.delta > 0 else -1
+        zoom_factor = 1.1 if direction > 0 else 1 / 1.1
+        new_zoom = min(self.MAX_ZOOM, max(self.MIN_ZOOM, self.camera_zoom * zoom_factor))
         
-        # Obtener la posición del mouse en coordenadas del mundo antes del zoom
+        # Mantener fijo el punto del mundo que está bajo el mouse
         mouse_x, mouse_y = self.screen_to_world(event.x, event.y)
+        self.camera_zoom = new_zoom
+        self.camera_offset[0] = event.x - mouse_x * new_zoom
+        self.camera_offset[1] = event.y - mouse_y * new_zoom
         
-        # Aplicar el zoom
-        self.camera_offset[0] = mouse_x - (mouse_x - self.camera_offset[0]) * zoom_factor
-        self.camera_offset[1] = mouse_y - (mouse_y - self.camera_offset[1]) * zoom_factor
-        
+        self.draw_scene()
+
+    def reset_zoom(self):
+        center_x = self.scene_canvas.winfo_width() / 2
+        center_y = self.scene_canvas.winfo_height() / 2
+        world_x, world_y = self.screen_to_world(center_x, center_y)
+        self.camera_zoom = 1.0
+        self.camera_offset = [center_x - world_x, center_y - world_y]
         self.draw_scene()
 
     def screen_to_world(self, screen_x, screen_y):
         return (
-            screen_x - self.camera_offset[0],
-            screen_y - self.camera_offset[1]
+            (screen_x - self.camera_offset[0]) / self.camera_zoom,
+            (screen_y - self.camera_offset[1]) / self.camera_zoom
         )
 
     def world_to_screen(self, world_x, world_y):
         return (
-            world_x + self.camera_offset[0],
-            world_y + self.camera_offset[1]
+            world_x * self.camera_zoom + self.camera_offset[0],
+            world_y * self.camera_zoom + self.camera_offset[1]
         )
 
     def get_world_position(self, obj):
@@ -1058,139 +6037,481 @@ class SparEngineEditor:
         return x, y
 
     def update_hierarchy_selection(self):
-        if self.selected_object_index is not None:
-            obj_name = self.objects[self.selected_object_index]["name"]
-            item_id = self.find_item_by_text(self.hierarchy_tree, obj_name)
-            if item_id:
-                self.hierarchy_tree.selection_set(item_id)
-                self.hierarchy_tree.focus(item_id)
+        items = [self.hierarchy_items[name] for name in self.selected_names if name in self.hierarchy_items]
+        self.hierarchy_tree.selection_set(items)
+        
+        active = self.get_selected_object()
+        if active and active["name"] in self.hierarchy_items:
+            item_id = self.hierarchy_items[active["name"]]
+            self.hierarchy_tree.focus(item_id)
+            self.hierarchy_tree.see(item_id)
 
     def draw_scene(self):
+        if self.viewport_mode == "composite":
+            self.request_composite()
+            self.draw_selection()
+            return
+        
         self.scene_canvas.delete("all")
+        self.canvas_photos = {}
         
         # Dibujar una cuadrícula de fondo
         self.draw_grid()
         
-        # Dibujar todos los objetos
-        for obj in self.objects:
-            if "parent" not in obj:  # Dibujar solo los objetos raíz, los hijos se dibujarán recursivamente
-                self.draw_object(obj)
+        # Dibujar todos los objetos por capa y z (a igualdad, cada padre antes que sus hijos)
+        for obj in render_order(self.objects):
+            self.draw_object_items(obj)
                 
-        # Dibujar selección
-        if self.selected_object_index is not None:
-            obj = self.objects[self.selected_object_index]
-            x, y = self.world_to_screen(*self.get_world_position(obj))
+        self.draw_selection()
+
+    def draw_selection(self):
+        self.scene_canvas.delete("selection")
+        if not self.selected_names:
+            return
+        
+        active = self.get_selected_object()
+        positions = self.get_world_positions()
+        for name in self.selected_names:
+            if name not in positions:
+                continue
+            x, y = self.world_to_screen(*positions[name])
             
-            # Dibujar un rectángulo de selección
+            # Dibujar un rectángulo de selección (más grueso para el objeto activo)
             self.scene_canvas.create_rectangle(
                 x - 30, y - 30, x + 30, y + 30,
-                outline=self.themes[self.current_theme]["accent"], dash=(4, 2), width=2
+                outline=self.themes[self.current_theme]["accent"], dash=(4, 2),
+                width=2 if active and name == active["name"] else 1,
+                tags=("selection",)
             )
 
+    def get_children_map(self):
+        """Agrupa los objetos por el nombre de su padre"""
+        children_map = {}
+        for obj in self.objects:
+            if obj.get("parent"):
+                children_map.setdefault(obj["parent"], []).append(obj)
+        return children_map
+
+    def object_tag(self, obj):
+        """Tag del canvas que agrupa los items dibujados para obj"""
+        return f"obj{id(obj)}"
+
+    def redraw_objects(self, objs):
+        """Redibuja solo los objetos indicados y sus descendientes, manteniendo su orden en el canvas"""
+        if self.viewport_mode == "composite":
+            self.draw_scene()
+            return
+        
+        children_map = self.get_children_map()
+        pending = list(objs)
+        seen = set()
+        while pending:
+            obj = pending.pop()
+            if id(obj) in seen:
+                continue
+            seen.add(id(obj))
+            pending.extend(children_map.get(obj["name"], []))
+            
+            tag = self.object_tag(obj)
+            items = self.scene_canvas.find_withtag(tag)
+            below = self.scene_canvas.find_below(items[0]) if items else ()
+            self.scene_canvas.delete(tag)
+            self.draw_object_items(obj)
+            if below:
+                self.scene_canvas.tag_raise(tag, below[0])
+        
+        self.draw_selection()
+
     def draw_grid(self):
-        # Configuración de la cuadrícula
-        grid_size = 50
+        # Configuración de la cuadrícula (escalada con el zoom, sin llegar a ser demasiado densa)
+        grid_size = ViewportCompositor.GRID_SIZE * self.camera_zoom
+        while grid_size < 8:
+            grid_size *= 2
         width = self.scene_canvas.winfo_width()
         height = self.scene_canvas.winfo_height()
         
         # Calcular las coordenadas iniciales
-        start_x = -self.camera_offset[0] % grid_size
-        start_y = -self.camera_offset[1] % grid_size
+        x = self.camera_offset[0] % grid_size
+        y = self.camera_offset[1] % grid_size
         
         # Dibujar líneas verticales
-        for x in range(int(start_x), width, grid_size):
+        while x < width:
             self.scene_canvas.create_line(
                 x, 0, x, height,
                 fill=self.themes[self.current_theme]["grid"], width=1
             )
+            x += grid_size
         
         # Dibujar líneas horizontales
-        for y in range(int(start_y), height, grid_size):
+        while y < height:
             self.scene_canvas.create_line(
                 0, y, width, y,
                 fill=self.themes[self.current_theme]["grid"], width=1
             )
+            y += grid_size
 
-    def draw_object(self, obj):
+    def collect_memory_report(self):
+        report = {"time": time.time(), "editor": MemoryReport.editor_section(self)}
+        player = self.game_player
+        if player is not None and player.memory_sources is not None:
+            report["runtime"] = MemoryReport.runtime_section(*player.memory_sources)
+        if self.memory_tracker.active:
+            report["tracemalloc"] = self.memory_tracker.summary()
+        return report
+
+    def refresh_project_index(self):
+        """Lleva al índice los cambios de la escena abierta que aún no se han guardado"""
+        if self.current_scene:
+            self.project_index.update_scene(self.current_scene, self.objects)
+
+    def show_usages(self, path):
+        """Ventana con las escenas y objetos que usan un asset o script"""
+        rel_path = os.path.relpath(path, self.project_path)
+        self.refresh_project_index()
+        usages = self.project_index.find_usages(rel_path)
+        
+        window = tk.Toplevel(self.root)
+        window.title(f"Usos de {os.path.basename(path)}")
+        window.geometry("360x320")
+        
+        tree = ttk.Treeview(window, show="tree")
+        tree.pack(fill=tk.BOTH, expand=True)
+        scene_items = {}
+        for scene_name, obj_name in usages:
+            if scene_name not in scene_items:
+                scene_items[scene_name] = tree.insert("", "end", text=scene_name, open=True)
+            tree.insert(scene_items[scene_name], "end", text=obj_name, values=[scene_name])
+        if self.global_script and os.path.normpath(self.global_script) == os.path.normpath(rel_path):
+            tree.insert("", "end", text="Script global")
+        if not tree.get_children():
+            tree.insert("", "end", text="Sin usos")
+        
+        def go_to_usage(event):
+            selection = tree.selection()
+            if not selection or not tree.item(selection[0], "values"):
+                return
+            scene_name = tree.item(selection[0], "values")[0]
+            if scene_name != self.current_scene:
+                self.scene_combo.set(scene_name)
+                self.change_scene()
+            obj_name = tree.item(selection[0], "text")
+            self.set_selection([obj_name], obj_name)
+        
+        tree.bind("<Double-1>", go_to_usage)
+
+    def show_unused_assets(self):
+        """Ventana con los archivos de assets/ que no usa ninguna escena"""
+        if not self.project_index:
+            messagebox.showerror("Error", "Primero selecciona un proyecto.")
+            return
+        self.refresh_project_index()
+        
+        window = tk.Toplevel(self.root)
+        window.title("Assets sin usar")
+        window.geometry("420x360")
+        
+        tree = ttk.Treeview(window, columns=("bytes",))
+        tree.heading("#0", text="Asset")
+        tree.heading("bytes", text="Bytes")
+        tree.column("bytes", width=90, anchor=tk.E)
+        tree.pack(fill=tk.BOTH, expand=True)
+        
+        total = 0
+        for rel_path in self.project_index.unused_assets():
+            size = os.path.getsize(os.path.join(self.project_path, rel_path))
+            total += size
+            tree.insert("", "end", text=rel_path, values=(size,))
+        ttk.Label(window, text=f"{len(tree.get_children())} assets, {total} bytes").pack(fill=tk.X)
+
+    def show_memory_panel(self):
+        """Ventana con la memoria de cachés, superficies y escenas, y snapshots de tracemalloc"""
+        if self.memory_window is not None and self.memory_window.winfo_exists():
+            self.memory_window.lift()
+            return
+        
+        window = self.memory_window = tk.Toplevel(self.root)
+        window.title("Memoria")
+        window.geometry("620x480")
+        
+        tree = ttk.Treeview(window, columns=("bytes", "detalle"))
+        tree.heading("#0", text="Elemento")
+        tree.heading("bytes", text="Bytes")
+        tree.heading("detalle", text="Detalle")
+        tree.column("bytes", width=110, anchor=tk.E)
+        tree.column("detalle", width=200)
+        
+        def fill_tree(parent, data):
+            for key, value in data.items():
+                if isinstance(value, dict):
+                    detail = f"aciertos {value['hit_rate']:.0%}" if value.get("hit_rate") is not None else ""
+                    node = tree.insert(parent, "end", text=key, values=(value.get("bytes", ""), detail))
+                    fill_tree(node, {k: v for k, v in value.items() if k not in ("bytes", "hit_rate")})
+                elif isinstance(value, list):
+                    node = tree.insert(parent, "end", text=key, values=("", f"{len(value)} elementos"))
+                    for item in value:
+                        if isinstance(item, dict):
+                            tree.insert(node, "end", text=item["location"],
+                                        values=(item["size_diff"], f"{item['count_diff']:+d} bloques"))
+                        else:
+                            tree.insert(node, "end", text=str(item))
+                elif isinstance(value, int) and not isinstance(value, bool) and \
+                        key not in ("entries", "hits", "misses", "objects"):
+                    # Los demás enteros son tamaños en bytes
+                    tree.insert(parent, "end", text=key, values=(value, ""))
+                else:
+                    tree.insert(parent, "end", text=key, values=("", value))
+        
+        def refresh():
+            tree.delete(*tree.get_children())
+            fill_tree("", self.collect_memory_report())
+            for item in tree.get_children():
+                tree.item(item, open=True)
+        
+        def take_snapshot():
+            self.memory_tracker.snapshot()
+            refresh()
+        
+        def stop_tracing():
+            self.memory_tracker.stop()
+            refresh()
+        
+        def export_json():
+            path = filedialog.asksaveasfilename(parent=window, defaultextension=".json",
+                                                filetypes=[("JSON", "*.json")], title="Exportar informe de memoria")
+            if path:
+                with open(path, "w") as f:
+                    json.dump(self.collect_memory_report(), f, indent=4)
+        
+        buttons = ttk.Frame(window)
+        buttons.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Button(buttons, text="Actualizar", command=refresh).pack(side=tk.LEFT)
+        ttk.Button(buttons, text="Snapshot tracemalloc", command=take_snapshot).pack(side=tk.LEFT, padx=2)
+        ttk.Button(buttons, text="Detener tracemalloc", command=stop_tracing).pack(side=tk.LEFT, padx=2)
+        ttk.Button(buttons, text="Exportar JSON", command=export_json).pack(side=tk.RIGHT)
+        tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        refresh()
+
+    def set_viewport_mode(self, mode):
+        """Cambia entre dibujar un item por objeto o una imagen compuesta en segundo plano"""
+        self.viewport_mode = mode
+        self.viewport_mode_var.set(mode)
+        self.scene_canvas.delete("all")
+        self.canvas_photos = {}
+        if mode == "composite":
+            if self.compositor is None and self.asset_store:
+                self.compositor = ViewportCompositor(self.asset_store)
+            if self.composite_poll_id is None:
+                self.poll_composite()
+        self.draw_scene()
+
+    def request_composite(self):
+        """Envía al compositor una copia de lo necesario para componer el viewport"""
+        if self.compositor is None:
+            return
+        width = self.scene_canvas.winfo_width()
+        height = self.scene_canvas.winfo_height()
+        if width <= 1 or height <= 1:
+            return
+        
+        # Mismo orden de dibujo que en el modo canvas; solo se copian los objetos que caen en la vista,
+        # así el hilo de fondo no transforma sprites que luego quedarían fuera
+        positions = self.get_world_positions()
+        view_left, view_top = self.screen_to_world(0, 0)
+        view_right, view_bottom = self.screen_to_world(width, height)
+        ordered = []
+        entries = {}
+        for obj in render_order(self.objects):
+            x, y = positions[obj["name"]]
+            bounds = ViewportCompositor.object_bounds(obj, x, y, self.asset_store, entries)
+            if bounds is not None and (bounds[2] < view_left or bounds[0] > view_right
+                                       or bounds[3] < view_top or bounds[1] > view_bottom):
+                continue
+            ordered.append((x, y, dict(obj)))
+        
+        theme = self.themes[self.current_theme]
+        self.composite_generation += 1
+        self.compositor.submit({
+            "generation": self.composite_generation,
+            "size": (width, height),
+            "zoom": self.camera_zoom,
+            "offset": tuple(self.camera_offset),
+            "background": theme["canvas_bg"],
+            "grid": theme["grid"],
+            "objects": ordered
+        })
+
+    def poll_composite(self):
+        """Muestra en el canvas la última imagen compuesta por el hilo de fondo"""
+        if self.viewport_mode != "composite" or self.compositor is None:
+            self.composite_poll_id = None
+            return
+        
+        result = self.compositor.take_result()
+        if result is not None:
+            generation, image = result
+            if self.composite_photo is not None and self.composite_photo.width() == image.width \
+                    and self.composite_photo.height() == image.height:
+                self.composite_photo.paste(image)
+            else:
+                self.composite_photo = ImageTk.PhotoImage(image)
+            
+            if not self.scene_canvas.find_withtag("viewport_image"):
+                self.scene_canvas.create_image(0, 0, image=self.composite_photo, anchor=tk.NW,
+                                               tags=("viewport_image",))
+            else:
+                self.scene_canvas.itemconfigure("viewport_image", image=self.composite_photo)
+            
+            # La imagen queda debajo de la capa de selección
+            self.scene_canvas.tag_lower("viewport_image")
+        
+        self.composite_poll_id = self.root.after(16, self.poll_composite)
+
+    def draw_object_items(self, obj):
         x, y = self.world_to_screen(*self.get_world_position(obj))
+        tags = (self.object_tag(obj),)
+        # Al sacar una imagen de object_images, Tk la borraría aunque un item la siga mostrando
+        photos = self.canvas_photos[tags[0]] = []
         
         if obj["type"] == "EmptyObject":
             # Dibujar un círculo para EmptyObject
             self.scene_canvas.create_oval(
                 x - 15, y - 15, x + 15, y + 15,
-                fill="#ffffff", outline="#aaaaaa"
+                fill="#ffffff", outline="#aaaaaa", tags=tags
             )
             self.scene_canvas.create_text(
                 x, y, text=obj["name"],
-                fill="#000000", font=("Arial", 8)
+                fill="#000000", font=("Arial", 8), tags=tags
+            )
+        elif obj["type"] == "Tilemap":
+            self.draw_tilemap_items(obj, x, y, tags, photos)
+        elif obj["type"] == "ParticleEmitter":
+            # Rombo del color inicial de las partículas
+            self.scene_canvas.create_polygon(
+                x, y - 12, x + 12, y, x, y + 12, x - 12, y,
+                fill=obj.get("color_start", ParticleSystem.DEFAULTS["color_start"]), outline="#aaaaaa", tags=tags
             )
-        elif obj["type"] == "Sprite2D":
+        elif obj["type"] in ("Sprite2D", "AnimatedSprite2D"):
             # Dibujar el sprite o un placeholder si no hay sprite
-            if obj.get("sprite"):
-                sprite_path = os.path.join(self.project_path, obj["sprite"])
-                if os.path.exists(sprite_path):
-                    # Usar imagen en caché o cargarla
-                    if sprite_path not in self.object_images:
-                        try:
-                            img = Image.open(sprite_path)
-                            
-                            # Aplicar rotación y escala
-                            if obj.get("rotation", 0) != 0:
-                                img = img.rotate(-obj["rotation"], expand=True)
-                                
-                            scale_x = obj.get("scale_x", 1)
-                            scale_y = obj.get("scale_y", 1)
-                            if scale_x != 1 or scale_y != 1:
-                                new_width = int(img.width * scale_x)
-                                new_height = int(img.height * scale_y)
-                                img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                                
-                            # Aplicar opacidad
-                            opacity = obj.get("opacity", 1.0)
-                            if opacity < 1.0:
-                                img = self.apply_opacity(img, opacity)
-                                
-                            self.object_images[sprite_path] = ImageTk.PhotoImage(img)
-                        except:
-                            pass
-                    
-                    if sprite_path in self.object_images:
-                        img = self.object_images[sprite_path]
-                        self.scene_canvas.create_image(
-                            x, y, image=img,
-                            anchor=tk.CENTER
-                        )
-                        return
+            img, region = self.get_object_image(obj, x, y)
+            if img is not None:
+                photos.append(img)
+                if region is None:
+                    self.scene_canvas.create_image(
+                        x, y, image=img,
+                        anchor=tk.CENTER, tags=tags
+                    )
+                else:
+                    self.scene_canvas.create_image(x + region[0], y + region[1], image=img, anchor=tk.NW, tags=tags)
+                return
+            if region is not None:
+                return  # Sprite recortado al canvas sin ninguna parte visible
             
             # Dibujar un placeholder si no hay sprite o no se pudo cargar
+            half = 25 * self.camera_zoom
             self.scene_canvas.create_rectangle(
-                x - 25, y - 25, x + 25, y + 25,
-                fill="#888888", outline="#555555"
+                x - half, y - half, x + half, y + half,
+                fill="#888888", outline="#555555", tags=tags
             )
             self.scene_canvas.create_text(
                 x, y, text=obj["name"],
-                fill="#ffffff", font=("Arial", 8)
+                fill="#ffffff", font=("Arial", 8), tags=tags
             )
+
+    def draw_tilemap_items(self, obj, x, y, tags, photos):
+        """Dibuja solo los chunks visibles; los que no cambiaron salen de la caché (photos guarda los mostrados)"""
+        tiles = Tilemap.decode(obj)
+        tile_width, tile_height = Tilemap.tile_size(obj)
+        zoom = self.camera_zoom
+        tileset = self.get_tileset_image(obj.get("tileset"))
+        
+        if tileset is not None:
+            chunk_width = Tilemap.CHUNK_SIZE * tile_width
+            chunk_height = Tilemap.CHUNK_SIZE * tile_height
+            # Rectángulo visible del canvas relativo al origen del mapa
+            left, top = -x / zoom, -y / zoom
+            right = (self.scene_canvas.winfo_width() - x) / zoom
+            bottom = (self.scene_canvas.winfo_height() - y) / zoom
+            for column, row in Tilemap.visible_chunks(tiles, tile_width, tile_height, left, top, right, bottom):
+                key, chunk = self.tile_chunks.get(obj["tileset"], tileset, tiles, column, row,
+                                                  tile_width, tile_height)
+                if chunk is None:
+                    continue
+                
+                # Con mucho zoom solo se escala la parte del chunk que cae en el canvas
+                chunk_left, chunk_top = x + column * chunk_width * zoom, y + row * chunk_height * zoom
+                crop = ViewportCompositor.chunk_crop(chunk, chunk_left, chunk_top, zoom, self.scene_canvas.winfo_width(),
+                                                     self.scene_canvas.winfo_height(), tile_width, tile_height)
+                if crop is not None and (crop[2] <= crop[0] or crop[3] <= crop[1]):
+                    continue
+                photo_key = ("chunk", key, zoom, crop)
+                photo = self.object_images.get(photo_key)
+                if photo is None:
+                    photo = self.object_images[photo_key] = ImageTk.PhotoImage(
+                        ViewportCompositor.scale_chunk(chunk, zoom, crop))
+                    while len(self.object_images) > self.MAX_OBJECT_IMAGES:
+                        self.object_images.popitem(last=False)
+                else:
+                    self.object_images.move_to_end(photo_key)
+                photos.append(photo)
+                
+                if crop is not None:
+                    chunk_left, chunk_top = chunk_left + crop[0] * zoom, chunk_top + crop[1] * zoom
+                self.scene_canvas.create_image(chunk_left, chunk_top, image=photo, anchor=tk.NW, tags=tags)
         
-        # Dibujar hijos recursivamente
-        children = [o for o in self.objects if o.get("parent") == obj["name"]]
-        for child in children:
-            self.draw_object(child)
+        # Contorno del mapa
+        self.scene_canvas.create_rectangle(
+            x, y, x + tiles.shape[1] * tile_width * zoom, y + tiles.shape[0] * tile_height * zoom,
+            outline="#6fbf73", dash=(2, 2), tags=tags
+        )
 
-    def apply_opacity(self, img, opacity):
-        """Aplica opacidad a una imagen PIL"""
-        if img.mode != 'RGBA':
-            img = img.convert('RGBA')
+    def get_object_image(self, obj, x, y):
+        """(PhotoImage del sprite de obj ya transformado o None, region)
+
+        Si el sprite transformado es muy grande solo se renderiza la parte que cae en el canvas con el
+        centro en (x, y); region es ese rectángulo relativo al centro, o None si la imagen está entera.
+        """
+        rel_path = object_image_path(obj)
+        if not rel_path:
+            return None, None
+        sprite_path = os.path.join(self.project_path, rel_path)
+        if not os.path.exists(sprite_path):
+            return None, None
         
-        alpha = img.split()[3]
-        alpha = alpha.point(lambda p: int(p * opacity))
+        # La escala en pantalla incluye el zoom de la cámara
+        scale_x = obj.get("scale_x", 1) * self.camera_zoom
+        scale_y = obj.get("scale_y", 1) * self.camera_zoom
+        rotation = obj.get("rotation", 0)
+        opacity = obj.get("opacity", 1.0)
+        crop = AnimatedSprite.preview_rect(obj) if obj["type"] == "AnimatedSprite2D" else None
+        if rel_path not in self.asset_store.manifest["by_path"]:
+            self.asset_store.ensure_variants(rel_path)  # clip_region necesita su tamaño
+        region = self.asset_store.clip_region(rel_path, scale_x, scale_y, crop, x, y,
+                                              self.scene_canvas.winfo_width(), self.scene_canvas.winfo_height())
+        if region is not None and (region[2] <= region[0] or region[3] <= region[1]):
+            return None, region
         
-        img.putalpha(alpha)
-        return img
+        # La caché depende también de la transformación aplicada
+        key = (sprite_path, scale_x, scale_y, rotation, opacity, crop, region)
+        if key in self.object_images:
+            self.object_images.move_to_end(key)
+            return self.object_images[key], region
+        
+        try:
+            self.asset_store.ensure_variants(rel_path)
+            img = self.asset_store.render_sprite(rel_path, scale_x, scale_y, rotation, opacity, crop, region)
+            self.object_images[key] = ImageTk.PhotoImage(img)
+        except:
+            return None, None
+        
+        while len(self.object_images) > self.MAX_OBJECT_IMAGES:
+            self.object_images.popitem(last=False)
+        return self.object_images[key], region
 
     def play_simulation(self):
         if self.running_simulation:
             self.running_simulation = False
+            if self.game_player:
+                self.game_player.stop()
             self.play_btn.config(text="▶ Play")
         else:
             if not self.project_path:
@@ -1201,136 +6522,89 @@ class SparEngineEditor:
             self.play_btn.config(text="■ Stop")
             
             # Guardar la escena antes de ejecutar
+            self.flush_pending_save()
             self.save_scene()
             
+            width, height = map(int, self.resolution_combo.get().split("x"))
+            scene_manager = SceneManager(self.project_path, self.asset_store, self.prefabs, self.scene_cache,
+                                         InputBus())
+            self.game_player = GamePlayer(scene_manager, (width, height),
+                                          os.path.join(self.project_path, AssetStore.CACHE_DIR),
+                                          self.pygame_bg_color, self.global_script, layers=self.layer_settings)
+            
             # Ejecutar en un hilo separado
             self.simulation_thread = threading.Thread(target=self.run_simulation)
             self.simulation_thread.start()
 
-    def run_simulation(self):
-        pygame.init()
-        width, height = map(int, self.resolution_combo.get().split("x"))
-        screen = pygame.display.set_mode((width, height))
-        pygame.display.set_caption("SparEngine Game")
-        
-        clock = pygame.time.Clock()
+    def export_project(self):
+        if not self.project_path:
+            messagebox.showerror("Error", "Primero selecciona un proyecto.")
+            return
+        out_dir = filedialog.askdirectory(title="Carpeta de exportación")
+        if not out_dir:
+            return
+        if os.path.abspath(out_dir).startswith(os.path.abspath(self.project_path) + os.sep):
+            messagebox.showerror("Error", "La exportación no puede ir dentro del proyecto.")
+            return
         
-        # Cargar el script global si existe
-        global_module = None
-        if self.global_script:
-            global_script_path = os.path.join(self.project_path, self.global_script)
-            if os.path.exists(global_script_path):
-                try:
-                    spec = importlib.util.spec_from_file_location("global_script", global_script_path)
-                    global_module = importlib.util.module_from_spec(spec)
-                    spec.loader.exec_module(global_module)
-                    
-                    # Llamar a la función de inicialización si existe
-                    if hasattr(global_module, "init"):
-                        global_module.init(self.objects)
-                except Exception as e:
-                    print(f"Error al cargar script global: {e}")
+        self.flush_pending_save()
+        self.save_scene()
+        resolution = tuple(map(int, self.resolution_combo.get().split("x")))
+        try:
+            game = export_game(self.project_path, out_dir, self.current_scene, resolution, self.pygame_bg_color)
+        except Exception as e:
+            messagebox.showerror("Error", f"No se pudo exportar el juego: {e}")
+            return
+        messagebox.showinfo("Exportar juego", f"Juego exportado en {out_dir}\n"
+                                              f"{len(game['scenes'])} escenas, {len(game['assets'])} assets.\n"
+                                              f"Para jugar: python play.py")
 
-        # Cargar scripts de los objetos y sprites
-        object_sprites = {}
-        object_modules = {}
+    def run_simulation(self):
+        recording = None
+        if self.record_input.get():
+            recording = InputRecording(self.current_scene or "", resolution=self.game_player.resolution)
         
-        for obj in self.objects:
-            # Cargar sprite si es un Sprite2D
-            if obj["type"] == "Sprite2D" and obj.get("sprite"):
-                sprite_path = os.path.join(self.project_path, obj["sprite"])
-                if os.path.exists(sprite_path):
-                    try:
-                        object_sprites[obj["name"]] = pygame.image.load(sprite_path).convert_alpha()
-                    except:
-                        pass
-            
-            # Cargar script si tiene uno
-            if obj.get("script"):
-                script_path = os.path.join(self.project_path, obj["script"])
-                if os.path.exists(script_path):
-                    try:
-                        spec = importlib.util.spec_from_file_location(obj["name"], script_path)
-                        module = importlib.util.module_from_spec(spec)
-                        spec.loader.exec_module(module)
-                        object_modules[obj["name"]] = module
-                    except Exception as e:
-                        print(f"Error al cargar script de {obj['name']}: {e}")
-
-        while self.running_simulation:
-            events = pygame.event.get()
-            for event in events:
-                if event.type == pygame.QUIT:
-                    self.running_simulation = False
-
-            # Ejecutar update global si existe
-            if global_module and hasattr(global_module, "update"):
-                try:
-                    global_module.update(self.objects)
-                except Exception as e:
-                    print(f"Error en update global: {e}")
-
-            # Ejecutar updates de los objetos
-            for obj in self.objects:
-                if obj["name"] in object_modules and hasattr(object_modules[obj["name"]], "update"):
-                    try:
-                        object_modules[obj["name"]].update(obj, events)
-                    except Exception as e:
-                        print(f"Error en update de {obj['name']}: {e}")
-
-            # Dibujar con el color de fondo personalizado
-            screen.fill(self.pygame_bg_color)
-            
-            # Dibujar objetos
-            for obj in self.objects:
-                if "parent" not in obj:  # Dibujar solo objetos raíz
-                    self.draw_pygame_object(screen, obj, object_sprites)
-            
-            pygame.display.flip()
-            clock.tick(60)
+        # Los scripts trabajan sobre los objetos del editor
+        self.game_player.run(self.current_scene or "", self.objects, recording=recording)
         
-        pygame.quit()
+        if recording is not None:
+            path = os.path.join(self.project_path, AssetStore.CACHE_DIR, "recordings",
+                                f"{self.current_scene or 'escena'}-{time.strftime('%Y%m%d-%H%M%S')}.rec")
+            recording.save(path)
+            print(f"Grabación guardada en {path} ({len(recording)} fotogramas, "
+                  f"estado final {self.game_player.state_hash[:12]})")
+        self.game_player = None
         self.running_simulation = False
         self.play_btn.config(text="▶ Play")
 
-    def draw_pygame_object(self, screen, obj, object_sprites):
-        # Calcular posición global (teniendo en cuenta parenting)
-        x, y = self.get_world_position(obj)
-        
-        if obj["type"] == "Sprite2D" and obj["name"] in object_sprites:
-            sprite = object_sprites[obj["name"]]
-            
-            # Aplicar escala
-            scale_x = obj.get("scale_x", 1)
-            scale_y = obj.get("scale_y", 1)
-            if scale_x != 1 or scale_y != 1:
-                new_width = int(sprite.get_width() * scale_x)
-                new_height = int(sprite.get_height() * scale_y)
-                sprite = pygame.transform.scale(sprite, (new_width, new_height))
-            
-            # Aplicar rotación
-            rotation = obj.get("rotation", 0)
-            if rotation != 0:
-                sprite = pygame.transform.rotate(sprite, -rotation)
-            
-            # Aplicar opacidad
-            opacity = obj.get("opacity", 1.0)
-            if opacity < 1.0:
-                sprite.fill((255, 255, 255, int(255 * opacity)), None, pygame.BLEND_RGBA_MULT)
-            
-            # Dibujar
-            sprite_rect = sprite.get_rect(center=(x, y))
-            screen.blit(sprite, sprite_rect)
-        else:
-            # Dibujar placeholder
-            pygame.draw.rect(screen, (100, 100, 100), (x - 25, y - 25, 50, 50))
-        
-        # Dibujar hijos recursivamente
-        children = [o for o in self.objects if o.get("parent") == obj["name"]]
-        for child in children:
-            self.draw_pygame_object(screen, child, object_sprites)
-
 if __name__ == "__main__":
-    root = tk.Tk()
-    editor = SparEngineEditor(root)
-    root.mainloop()
+    parser = argparse.ArgumentParser(description="SparEngine")
+    parser.add_argument("--memory-report", metavar="PROYECTO",
+                        help="carga una escena sin ventana y escribe su informe de memoria en JSON")
+    parser.add_argument("--scene", help="escena del informe o escena inicial del juego exportado (por defecto la primera)")
+    parser.add_argument("--export", metavar="PROYECTO", help="exporta el proyecto como juego independiente en --out")
+    parser.add_argument("--out", help="archivo JSON de salida (por defecto la salida estándar) o carpeta de exportación")
+    parser.add_argument("--tracemalloc", action="store_true", help="incluir la diferencia de tracemalloc")
+    parser.add_argument("--replay", nargs=2, metavar=("PROYECTO", "GRABACION"),
+                        help="reproduce una grabación sin ventana y escribe sus tiempos y hash final en JSON")
+    parser.add_argument("--frame-times", action="store_true", help="incluir el tiempo de cada fotograma en --replay")
+    args = parser.parse_args()
+    
+    if args.export:
+        if not args.out:
+            parser.error("--export necesita --out")
+        export_game(args.export, args.out, args.scene, report=print)
+    elif args.memory_report or args.replay:
+        if args.replay:
+            report = headless_replay(*args.replay, frame_times=args.frame_times)
+        else:
+            report = headless_memory_report(args.memory_report, args.scene, args.tracemalloc)
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(report, f, indent=4)
+        else:
+            print(json.dumps(report, indent=4))
+    else:
+        root = tk.Tk()
+        editor = SparEngineEditor(root)
+        root.mainloop()